@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+
+from tud_rl.agents.discrete import DQNAgent
+from tud_rl.common.buffer import UniformReplayBuffer
+from tud_rl.common.configparser import ConfigFile
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "tud_rl", "configs", "discrete_actions", "mountaincar.yaml")
+
+
+def _config(buffer_dir, prior_buffer):
+    c = ConfigFile(CONFIG)
+    c.mode           = "train"
+    c.device         = "cpu"
+    c.state_shape    = 2
+    c.num_actions    = 3
+    c.buffer_length  = 16
+    c.buffer_storage = "memmap"
+    c.buffer_dir     = str(buffer_dir)
+    c.prior_buffer   = str(prior_buffer)
+    return c
+
+
+def _prior(buffer_dir):
+    buf = UniformReplayBuffer(state_type="feature", state_shape=2, buffer_length=16, batch_size=4, device="cpu",
+                              disc_actions=True, storage="memmap", buffer_dir=str(buffer_dir))
+    for i in range(5):
+        buf.add(np.full(2, i + 1.0), 1, float(i + 1), np.full(2, i + 2.0), False)
+    buf.flush()
+    return buf
+
+
+def test_prior_buffer_in_buffer_dir_is_rejected(tmp_path):
+    _prior(tmp_path / "buffer")
+
+    with pytest.raises(AssertionError, match="prior_buffer"):
+        DQNAgent(_config(tmp_path / "buffer", tmp_path / "buffer" / ".." / "buffer"), "DQN")
+
+    # the prior files are left untouched
+    r = np.load(tmp_path / "buffer" / "r.npy")
+    assert r[:5, 0].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_prior_buffer_is_reopened(tmp_path):
+    from tud_rl.common.buffer_checkpoint import load_prior_buffer
+
+    _prior(tmp_path / "prior")
+    agent = DQNAgent(_config(tmp_path / "buffer", tmp_path / "prior"), "DQN")
+    buf = load_prior_buffer(agent.replay_buffer, str(tmp_path / "prior"))
+
+    assert buf.size == 5
+    assert buf.r[:5, 0].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
@@ -41,6 +41,10 @@ parser.add_argument(
     "-cw", "--critic_weights", type=str, default=None,
     help="Weights (critic) for visualization in continuous action spaces. Example: `critic_weights.pth`.")
 
+parser.add_argument(
+    "-r", "--resume", type=str, default=None,
+    help="Run directory of an interrupted training, which is continued from its last checkpoint.")
+
 args = parser.parse_args()
 
 agent_name = args.agent_name
@@ -71,6 +75,11 @@ if args.actor_weights is not None:
 if args.critic_weights is not None:
     config.overwrite(critic_weights=args.critic_weights)
 
+# continue an interrupted run
+if args.resume is not None:
+    config.config_dict["resume"] = args.resume
+    config.resume = args.resume
+
 # handle maximum episode steps
 config.max_episode_handler()
 
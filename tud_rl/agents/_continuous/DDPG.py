@@ -5,7 +5,6 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-import tud_rl.common.buffer as buffer
 import tud_rl.common.nets as nets
 from tud_rl.agents.base import BaseAgent
 from tud_rl.common.configparser import ConfigFile
@@ -36,13 +35,7 @@ class DDPGAgent(BaseAgent):
 
         # replay buffer
         if self.mode == "train":
-            self.replay_buffer = buffer.UniformReplayBuffer(state_type    = self.state_type, 
-                                                            state_shape   = self.state_shape, 
-                                                            buffer_length = self.buffer_length,
-                                                            batch_size    = self.batch_size,
-                                                            device        = self.device,
-                                                            disc_actions  = False,
-                                                            action_dim    = self.num_actions)
+            self.replay_buffer = self._init_replay_buffer(disc_actions=False, action_dim=self.num_actions)
         # init actor and critic
         if self.state_type == "feature":
             self.actor = nets.MLP(in_size   = self.state_shape,
@@ -113,11 +106,28 @@ class DDPGAgent(BaseAgent):
         # forward pass
         return self.actor(s)
 
+    @torch.no_grad()
+    def select_actions(self, s):
+        """Batched version of select_action() for the states of several envs.
+        Arg s:   np.array with shape (n_envs, state_shape)
+        returns: np.array with shape (n_envs, num_actions)
+        """
+        a = self.actor(torch.tensor(s, dtype=torch.float32).to(self.device))
+
+        if self.mode == "train":
+            a += torch.tensor(self.noise.sample(len(s))).to(self.device)
+
+        return torch.clamp(a, -1, 1).cpu().numpy()
+
     def memorize(self, s, a, r, s2, d):
         """Stores current transition in replay buffer."""
         self.replay_buffer.add(s, a, r, s2, d)
 
-    def _compute_target(self, r, s2, d):
+    def memorize_batch(self, s, a, r, s2, d):
+        """Stores transitions stacked along the first axis in replay buffer."""
+        self.replay_buffer.add_batch(s, a, r, s2, d)
+
+    def _compute_target(self, r, s2, d, g):
         with torch.no_grad():
             target_a = self.target_actor(s2)
 
@@ -125,10 +135,14 @@ class DDPGAgent(BaseAgent):
             Q_next = self.target_critic(torch.cat([s2, target_a], dim=1))
 
             # target
-            y = r + self.gamma * Q_next * (1 - d)
+            y = r + g * Q_next * (1 - d)
         return y
 
-    def _compute_loss(self, Q, y, reduction="mean"):
+    def _compute_loss(self, Q, y, reduction="mean", weights=None):
+        # importance-sampling weights from prioritized replay
+        if weights is not None:
+            return torch.mean(weights * self._compute_loss(Q, y, reduction="none"))
+
         if self.loss == "MSELoss":
             return F.mse_loss(Q, y, reduction=reduction)
 
@@ -141,7 +155,7 @@ class DDPGAgent(BaseAgent):
         batch = self.replay_buffer.sample()
         
         # unpack batch
-        s, a, r, s2, d = batch
+        s, a, r, s2, d, g, w, ind = self._unpack_batch(batch)
         sa = torch.cat([s, a], dim=1)
 
         #-------- train critic --------
@@ -152,10 +166,10 @@ class DDPGAgent(BaseAgent):
         Q = self.critic(sa)
  
         # targets
-        y = self._compute_target(r, s2, d)
+        y = self._compute_target(r, s2, d, g)
 
         # loss
-        critic_loss = self._compute_loss(Q, y)
+        critic_loss = self._compute_loss(Q, y, weights=w)
         
         # compute gradients
         critic_loss.backward()
@@ -211,6 +225,13 @@ class DDPGAgent(BaseAgent):
         #------- Update target networks -------
         self.polyak_update()
 
+        #------- TD errors for prioritized replay -------
+        td_err = (y - Q).detach().abs()
+
+        if self.buffer_type == "prioritized":
+            self.replay_buffer.update_priorities(ind, td_err)
+        return td_err
+
 
     @torch.no_grad()
     def polyak_update(self):
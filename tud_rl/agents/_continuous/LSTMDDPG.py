@@ -5,7 +5,6 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-import tud_rl.common.buffer as buffer
 import tud_rl.common.nets as nets
 from tud_rl import logger
 from tud_rl.agents.base import BaseAgent
@@ -35,22 +34,14 @@ class LSTMDDPGAgent(BaseAgent):
         if self.state_type == "image":
             raise NotImplementedError("Currently, image input is not supported for continuous action spaces.")
 
+        assert self.n_steps == 1, "N-step returns are currently not available for LSTM-based agents."
+
         if self.net_struc_actor is not None or self.net_struc_critic is not None:
             logger.warning("The net structure cannot be controlled via the config-spec for LSTM-based agents.")
 
         # noise
         self.noise = Gaussian_Noise(action_dim = self.num_actions)
 
-        # replay buffer
-        if self.mode == "train":
-            self.replay_buffer = buffer.UniformReplayBuffer_LSTM(state_type     = self.state_type, 
-                                                                 state_shape    = self.state_shape, 
-                                                                 buffer_length  = self.buffer_length,
-                                                                 batch_size     = self.batch_size,
-                                                                 device         = self.device,
-                                                                 disc_actions   = False,
-                                                                 action_dim     = self.num_actions,
-                                                                 history_length = self.history_length)
         # init actor and critic
         if self.state_type == "feature":
             self.actor = nets.LSTM_Actor(state_shape      = self.state_shape,
@@ -62,6 +53,11 @@ class LSTMDDPGAgent(BaseAgent):
                                                action_dim       = self.num_actions,
                                                use_past_actions = self.use_past_actions).to(self.device)
 
+        # replay buffer, created after the nets since it may store their recurrent states
+        if self.mode == "train" and init_critic:
+            self.replay_buffer = self._init_lstm_buffer(disc_actions=False, action_dim=self.num_actions, 
+                                                        hidden_nets={"actor": self.actor, "critic": self.critic})
+
         # number of parameters for actor and critic
         if init_critic:
             self.n_params = self._count_params(self.actor), self._count_params(self.critic)
@@ -108,6 +104,13 @@ class LSTMDDPGAgent(BaseAgent):
         
         returns: np.array with shape (action_dim,)
         """
+        # stored recurrent states: the memory is the actor state over the whole episode instead of the history
+        if self.store_hidden:
+            hidden   = self._act_hidden(self.actor, s_hist, a_hist, hist_len)
+            hist_len = 0
+        else:
+            hidden = None
+
         # reshape arguments and convert to tensors
         s = torch.tensor(s, dtype=torch.float32).view(1, self.state_shape).to(self.device)
         s_hist = torch.tensor(s_hist, dtype=torch.float32).view(1, self.history_length, self.state_shape).to(self.device)
@@ -116,7 +119,7 @@ class LSTMDDPGAgent(BaseAgent):
         hist_len = torch.tensor(hist_len).to(self.device)
 
         # forward pass
-        a, _ = self.actor(s, s_hist, a_hist, hist_len)
+        a, _ = self.actor(s, s_hist, a_hist, hist_len, hidden=hidden)
         
         # add noise
         if self.mode == "train":
@@ -125,16 +128,42 @@ class LSTMDDPGAgent(BaseAgent):
         # clip actions in [-1,1]
         return torch.clamp(a, -1, 1).cpu().numpy().reshape(self.num_actions)
 
+    @torch.no_grad()
+    def select_actions(self, s, s_hist, a_hist, hist_len):
+        """Batched version of select_action() for the states and histories of several envs.
+        s:        np.array with shape (n_envs, state_shape)
+        s_hist:   np.array with shape (n_envs, history_length, state_shape)
+        a_hist:   np.array with shape (n_envs, history_length, action_dim)
+        hist_len: np.array with shape (n_envs,)
+        
+        returns: np.array with shape (n_envs, action_dim)
+        """
+        s = torch.tensor(s, dtype=torch.float32).view(-1, self.state_shape).to(self.device)
+        s_hist = torch.tensor(s_hist, dtype=torch.float32).view(-1, self.history_length, self.state_shape).to(self.device)
+        if a_hist is not None:
+            a_hist = torch.tensor(a_hist, dtype=torch.float32).view(-1, self.history_length, self.num_actions).to(self.device)
+        hist_len = torch.tensor(hist_len).to(self.device)
+
+        # forward pass
+        a, _ = self.actor(s, s_hist, a_hist, hist_len)
+
+        # add noise
+        if self.mode == "train":
+            a += torch.tensor(self.noise.sample(len(s))).to(self.device)
+
+        return torch.clamp(a, -1, 1).cpu().numpy()
+
     def memorize(self, s, a, r, s2, d):
         """Stores current transition in replay buffer."""
-        self.replay_buffer.add(s, a, r, s2, d)
+        self._memorize_lstm(s, a, r, s2, d, hidden_nets={"actor": self.actor, "critic": self.critic})
 
-    def _compute_target(self, s2_hist, a2_hist, hist_len2, r, s2, d):
+    def _compute_target(self, s2_hist, a2_hist, hist_len2, r, s2, d, h2_actor=None, h2_critic=None):
         with torch.no_grad():
-            target_a, _ = self.target_actor(s=s2, s_hist=s2_hist, a_hist=a2_hist, hist_len=hist_len2)
+            target_a, _ = self.target_actor(s=s2, s_hist=s2_hist, a_hist=a2_hist, hist_len=hist_len2, hidden=h2_actor)
                         
             # next Q-estimate
-            Q_next = self.target_critic(s=s2, a=target_a, s_hist=s2_hist, a_hist=a2_hist, hist_len=hist_len2, log_info=False)
+            Q_next = self.target_critic(s=s2, a=target_a, s_hist=s2_hist, a_hist=a2_hist, hist_len=hist_len2, log_info=False,
+                                        hidden=h2_critic)
 
             # target
             y = r + self.gamma * Q_next * (1 - d)
@@ -153,17 +182,23 @@ class LSTMDDPGAgent(BaseAgent):
         batch = self.replay_buffer.sample()
 
         # unpack batch
-        s_hist, a_hist, hist_len, s2_hist, a2_hist, hist_len2, s, a, r, s2, d = batch
+        s_hist, a_hist, hist_len, s2_hist, a2_hist, hist_len2, s, a, r, s2, d = batch[:11]
+
+        # recurrent states before the histories, None without stored states
+        h_actor   = self._initial_hidden(batch, self.actor, "actor")
+        h_critic  = self._initial_hidden(batch, self.critic, "critic")
+        h2_actor  = self._initial_hidden(batch, self.target_actor, "actor", nxt=True)
+        h2_critic = self._initial_hidden(batch, self.target_critic, "critic", nxt=True)
 
         #-------- train critic --------
         # clear gradients
         self.critic_optimizer.zero_grad()
         
         # Q-estimates
-        Q, critic_net_info = self.critic(s=s, a=a, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len, log_info=True)
+        Q, critic_net_info = self.critic(s=s, a=a, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len, log_info=True, hidden=h_critic)
  
         # calculate targets
-        y = self._compute_target(s2_hist, a2_hist, hist_len2, r, s2, d)
+        y = self._compute_target(s2_hist, a2_hist, hist_len2, r, s2, d, h2_actor, h2_critic)
 
         # calculate loss
         critic_loss = self._compute_loss(Q, y)
@@ -194,10 +229,10 @@ class LSTMDDPGAgent(BaseAgent):
         self.actor_optimizer.zero_grad()
         
         # get current actions via actor
-        curr_a, act_net_info = self.actor(s=s, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len)
+        curr_a, act_net_info = self.actor(s=s, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len, hidden=h_actor)
         
         # compute loss, which is negative Q-values from critic
-        actor_loss = -self.critic(s=s, a=curr_a, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len, log_info=False).mean()
+        actor_loss = -self.critic(s=s, a=curr_a, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len, log_info=False, hidden=h_critic).mean()
 
         # compute gradients
         actor_loss.backward()
@@ -23,6 +23,8 @@ class LSTMRecTD3Agent(LSTMTD3Agent):
         self.critic_weights = c.critic_weights
         self.mode = c.mode
 
+        assert not self.store_hidden, "Stored recurrent states are currently not available for LSTMRecTD3."
+
         # overwrite nets (Note: 'num_obs_OS' is specific for the HHOS envs.)
         self.num_obs_OS = getattr(c.Agent, agent_name)["num_obs_OS"]
         self.num_obs_TS = getattr(c.Agent, agent_name)["num_obs_TS"]
@@ -24,6 +24,11 @@ class LSTMTD3Agent(LSTMDDPGAgent):
                                                   action_dim       = self.num_actions,
                                                   use_past_actions = self.use_past_actions).to(self.device)
 
+        # replay buffer, created after the nets since it may store their recurrent states
+        if self.mode == "train":
+            self.replay_buffer = self._init_lstm_buffer(disc_actions=False, action_dim=self.num_actions, 
+                                                        hidden_nets={"actor": self.actor, "critic": self.critic})
+
         # number of parameters for actor and critic
         self.n_params = self._count_params(self.actor), self._count_params(self.critic)
 
@@ -47,9 +52,9 @@ class LSTMTD3Agent(LSTMDDPGAgent):
         else:
             self.critic_optimizer = optim.RMSprop(self.critic.parameters(), lr=self.lr_critic, alpha=0.95, centered=True, eps=0.01)
 
-    def _compute_target(self, s2_hist, a2_hist, hist_len2, r, s2, d):
+    def _compute_target(self, s2_hist, a2_hist, hist_len2, r, s2, d, h2_actor=None, h2_critic=None):
         with torch.no_grad():
-            target_a, _ = self.target_actor(s=s2, s_hist=s2_hist, a_hist=a2_hist, hist_len=hist_len2)
+            target_a, _ = self.target_actor(s=s2, s_hist=s2_hist, a_hist=a2_hist, hist_len=hist_len2, hidden=h2_actor)
             
             # target policy smoothing
             eps = torch.randn_like(target_a) * self.tgt_noise
@@ -58,7 +63,8 @@ class LSTMTD3Agent(LSTMDDPGAgent):
             target_a = torch.clamp(target_a, -1, 1)
             
             # Q-value of next state-action pair
-            Q_next1, Q_next2, _ = self.target_critic(s=s2, a=target_a, s_hist=s2_hist, a_hist=a2_hist, hist_len=hist_len2)
+            Q_next1, Q_next2, _ = self.target_critic(s=s2, a=target_a, s_hist=s2_hist, a_hist=a2_hist, hist_len=hist_len2,
+                                                     hidden=h2_critic)
             Q_next = torch.min(Q_next1, Q_next2)
 
             # target
@@ -71,17 +77,23 @@ class LSTMTD3Agent(LSTMDDPGAgent):
         batch = self.replay_buffer.sample()
 
         # unpack batch
-        s_hist, a_hist, hist_len, s2_hist, a2_hist, hist_len2, s, a, r, s2, d = batch
+        s_hist, a_hist, hist_len, s2_hist, a2_hist, hist_len2, s, a, r, s2, d = batch[:11]
+
+        # recurrent states before the histories, None without stored states
+        h_actor   = self._initial_hidden(batch, self.actor, "actor")
+        h_critic  = self._initial_hidden(batch, self.critic, "critic")
+        h2_actor  = self._initial_hidden(batch, self.target_actor, "actor", nxt=True)
+        h2_critic = self._initial_hidden(batch, self.target_critic, "critic", nxt=True)
 
         #-------- train critic --------
         # clear gradients
         self.critic_optimizer.zero_grad()
         
         # Q-estimates
-        Q1, Q2, critic_net_info = self.critic(s=s, a=a, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len)
+        Q1, Q2, critic_net_info = self.critic(s=s, a=a, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len, hidden=h_critic)
  
         # calculate targets
-        y = self._compute_target(s2_hist, a2_hist, hist_len2, r, s2, d)
+        y = self._compute_target(s2_hist, a2_hist, hist_len2, r, s2, d, h2_actor, h2_critic)
 
         # calculate loss
         critic_loss = self._compute_loss(Q1, y) + self._compute_loss(Q2, y)
@@ -114,10 +126,10 @@ class LSTMTD3Agent(LSTMDDPGAgent):
             self.actor_optimizer.zero_grad()
             
             # get current actions via actor
-            curr_a, act_net_info = self.actor(s=s, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len)
+            curr_a, act_net_info = self.actor(s=s, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len, hidden=h_actor)
             
             # compute loss, which is negative Q-values from critic
-            actor_loss = -self.critic.single_forward(s=s, a=curr_a, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len).mean()
+            actor_loss = -self.critic.single_forward(s=s, a=curr_a, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len, hidden=h_critic).mean()
 
             # compute gradients
             actor_loss.backward()
@@ -36,6 +36,10 @@ class MADDPGAgent(BaseAgent):
         if self.state_type == "image":
             raise NotImplementedError("Currently, image input is not supported for MADDPG.")
 
+        assert self.buffer_type == "uniform", "Prioritized replay is currently not available for MADDPG."
+        assert self.n_steps == 1, "N-step returns are currently not available for MADDPG."
+        assert self.n_envs == 1, "Vectorized envs are currently not available for MADDPG."
+
         # noise
         self.noise = Gaussian_Noise(action_dim = self.num_actions)
 
@@ -47,7 +51,10 @@ class MADDPGAgent(BaseAgent):
                                                                       buffer_length = self.buffer_length,
                                                                       batch_size    = self.batch_size,
                                                                       device        = self.device,
-                                                                      action_dim    = self.num_actions)
+                                                                      action_dim    = self.num_actions,
+                                                                      storage       = self.buffer_storage,
+                                                                      buffer_dir    = self.buffer_dir,
+                                                                      compact       = self.buffer_compact)
         # init N actors and N critics
         if self.state_type == "feature":
 
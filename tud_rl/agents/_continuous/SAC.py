@@ -6,7 +6,6 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-import tud_rl.common.buffer as buffer
 import tud_rl.common.nets as nets
 from tud_rl.agents.base import BaseAgent
 from tud_rl.common.configparser import ConfigFile
@@ -55,13 +54,7 @@ class SACAgent(BaseAgent):
 
         # replay buffer
         if self.mode == "train":
-            self.replay_buffer = buffer.UniformReplayBuffer(state_type    = self.state_type, 
-                                                            state_shape   = self.state_shape, 
-                                                            buffer_length = self.buffer_length,
-                                                            batch_size    = self.batch_size,
-                                                            device        = self.device,
-                                                            disc_actions  = False,
-                                                            action_dim    = self.num_actions)
+            self.replay_buffer = self._init_replay_buffer(disc_actions=False, action_dim=self.num_actions)
         # init actor and critic
         if self.state_type == "feature":
             self.actor = nets.GaussianActor(state_shape = self.state_shape,
@@ -73,7 +66,8 @@ class SACAgent(BaseAgent):
                                               net_struc = self.net_struc_critic).to(self.device)
 
         # number of parameters for actor and critic
-        self.n_params = self._count_params(self.actor), self._count_params(self.critic)
+        if init_critic:
+            self.n_params = self._count_params(self.actor), self._count_params(self.critic)
 
         # load prior weights if available
         if self.actor_weights is not None and self.critic_weights is not None:
@@ -120,11 +114,25 @@ class SACAgent(BaseAgent):
         # reshape actions
         return a.cpu().numpy().reshape(self.num_actions)
 
+    @torch.no_grad()
+    def select_actions(self, s):
+        """Batched version of select_action() for the states of several envs.
+        Arg s:   np.array with shape (n_envs, state_shape)
+        returns: np.array with shape (n_envs, action_dim)
+        """
+        s = torch.tensor(s, dtype=torch.float32).view(-1, self.state_shape).to(self.device)
+        a, _ = self.actor(s, deterministic=self.mode != "train", with_logprob=False)
+        return a.cpu().numpy()
+
     def memorize(self, s, a, r, s2, d):
         """Stores current transition in replay buffer."""
         self.replay_buffer.add(s, a, r, s2, d)
 
-    def _compute_target(self, r, s2, d):
+    def memorize_batch(self, s, a, r, s2, d):
+        """Stores transitions stacked along the first axis in replay buffer."""
+        self.replay_buffer.add_batch(s, a, r, s2, d)
+
+    def _compute_target(self, r, s2, d, g):
         with torch.no_grad():
             # target actions come from current policy (no target actor)
             target_a, target_logp_a = self.actor(s2, deterministic=False, with_logprob=True)
@@ -134,10 +142,14 @@ class SACAgent(BaseAgent):
             Q_next = torch.min(Q_next1, Q_next2)
 
             # target
-            y = r + self.gamma * (1 - d) * (Q_next - self.temperature * target_logp_a)
+            y = r + g * (1 - d) * (Q_next - self.temperature * target_logp_a)
         return y
 
-    def _compute_loss(self, Q, y, reduction="mean"):
+    def _compute_loss(self, Q, y, reduction="mean", weights=None):
+        # importance-sampling weights from prioritized replay
+        if weights is not None:
+            return torch.mean(weights * self._compute_loss(Q, y, reduction="none"))
+
         if self.loss == "MSELoss":
             return F.mse_loss(Q, y, reduction=reduction)
 
@@ -150,7 +162,7 @@ class SACAgent(BaseAgent):
         batch = self.replay_buffer.sample()
         
         # unpack batch
-        s, a, r, s2, d = batch
+        s, a, r, s2, d, g, w, ind = self._unpack_batch(batch)
         sa = torch.cat([s, a], dim=1)
 
         # get current temperature
@@ -165,10 +177,10 @@ class SACAgent(BaseAgent):
         Q1, Q2 = self.critic(sa)
  
         # calculate targets
-        y = self._compute_target(r, s2, d)
+        y = self._compute_target(r, s2, d, g)
 
         # calculate loss
-        critic_loss = self._compute_loss(Q1, y) + self._compute_loss(Q2, y)
+        critic_loss = self._compute_loss(Q1, y, weights=w) + self._compute_loss(Q2, y, weights=w)
  
         # compute gradients
         critic_loss.backward()
@@ -243,6 +255,13 @@ class SACAgent(BaseAgent):
         #------- Update target network -------
         self.polyak_update()
 
+        #------- TD errors for prioritized replay -------
+        td_err = 0.5 * ((y - Q1).detach().abs() + (y - Q2).detach().abs())
+
+        if self.buffer_type == "prioritized":
+            self.replay_buffer.update_priorities(ind, td_err)
+        return td_err
+
     @torch.no_grad()
     def polyak_update(self):
         """Soft update of target network weights."""
@@ -47,7 +47,7 @@ class TD3Agent(DDPGAgent):
         else:
             self.critic_optimizer = optim.RMSprop(self.critic.parameters(), lr=self.lr_critic, alpha=0.95, centered=True, eps=0.01)
 
-    def _compute_target(self, r, s2, d):
+    def _compute_target(self, r, s2, d, g):
         with torch.no_grad():
             target_a = self.target_actor(s2)
 
@@ -62,7 +62,7 @@ class TD3Agent(DDPGAgent):
             Q_next = torch.min(Q_next1, Q_next2)
 
             # target
-            y = r + self.gamma * Q_next * (1 - d)
+            y = r + g * Q_next * (1 - d)
         return y
 
     def train(self):
@@ -71,7 +71,7 @@ class TD3Agent(DDPGAgent):
         batch = self.replay_buffer.sample()
         
         # unpack batch
-        s, a, r, s2, d = batch
+        s, a, r, s2, d, g, w, ind = self._unpack_batch(batch)
         sa = torch.cat([s, a], dim=1)
 
         #-------- train critics --------
@@ -82,10 +82,10 @@ class TD3Agent(DDPGAgent):
         Q1, Q2 = self.critic(sa)
  
         # targets
-        y = self._compute_target(r, s2, d)
+        y = self._compute_target(r, s2, d, g)
 
         # loss
-        critic_loss = self._compute_loss(Q1, y) + self._compute_loss(Q2, y)
+        critic_loss = self._compute_loss(Q1, y, weights=w) + self._compute_loss(Q2, y, weights=w)
         
         # compute gradients
         critic_loss.backward()
@@ -144,3 +144,10 @@ class TD3Agent(DDPGAgent):
             self.polyak_update()
         
         self.pol_upd_cnt += 1
+
+        #------- TD errors for prioritized replay -------
+        td_err = 0.5 * ((y - Q1).detach().abs() + (y - Q2).detach().abs())
+
+        if self.buffer_type == "prioritized":
+            self.replay_buffer.update_priorities(ind, td_err)
+        return td_err
@@ -18,6 +18,7 @@ class TQCAgent(SACAgent):
         self.top_qs_to_drop = getattr(c.Agent, agent_name)["top_qs_to_drop"]
         self.n_qs           = getattr(c.Agent, agent_name)["n_qs"]
         self.n_critics      = getattr(c.Agent, agent_name)["n_critics"]
+        self.indep_critics  = getattr(c.Agent, agent_name).get("independent_critics", False)
 
         # calculate total number of quantiles in use
         self.total_qs = self.n_critics * self.n_qs
@@ -31,7 +32,8 @@ class TQCAgent(SACAgent):
             self.critic = nets.TQC_Critics(state_shape = self.state_shape,
                                            action_dim  = self.num_actions,
                                            n_quantiles = self.n_qs,
-                                           n_critics   = self.n_critics).to(self.device)
+                                           n_critics   = self.n_critics,
+                                           independent = self.indep_critics).to(self.device)
 
         # number of parameters for actor and critic
         self.n_params = self._count_params(self.actor), self._count_params(self.critic)
@@ -53,7 +55,7 @@ class TQCAgent(SACAgent):
         else:
             self.critic_optimizer = optim.RMSprop(self.critic.parameters(), lr=self.lr_critic, alpha=0.95, centered=True, eps=0.01)
 
-    def _compute_target(self, r, s2, d):
+    def _compute_target(self, r, s2, d, g):
         with torch.no_grad():
             # target actions come from current policy (no target actor)
             next_new_action, next_log_pi = self.actor(s2, deterministic=False, with_logprob=True)
@@ -68,10 +70,10 @@ class TQCAgent(SACAgent):
             sorted_z_part = sorted_z[:,:self.total_qs - self.top_qs_to_drop]
 
             # targets from the target distribution - Eq.(12)
-            y = r + (1-d) * self.gamma * (sorted_z_part - self.temperature * next_log_pi)
+            y = r + (1-d) * g * (sorted_z_part - self.temperature * next_log_pi)
         return y
 
-    def _quantile_huber_loss(self, quantiles, y):
+    def _quantile_huber_loss(self, quantiles, y, weights=None):
         """Compute the quantile Huber loss to approximate the 1-Wasserstein distance between quantiles."""
 
         pairwise_delta = y[:,None,None,:] - quantiles[:,:,:,None] # Reshape to
@@ -84,8 +86,12 @@ class TQCAgent(SACAgent):
 
         n_quantiles = quantiles.shape[2]
         tau = torch.arange(n_quantiles, device=self.device).float() / n_quantiles + 1/2 / n_quantiles
-        loss = (torch.abs(tau[None,None,:,None] - (pairwise_delta < 0).float()) * huber_loss).mean()
-        return loss
+        loss = torch.abs(tau[None,None,:,None] - (pairwise_delta < 0).float()) * huber_loss
+
+        # importance-sampling weights from prioritized replay
+        if weights is not None:
+            return (weights[:,0] * loss.mean(dim=(1,2,3))).mean()
+        return loss.mean()
 
     def train(self):
         """Samples from replay_buffer, updates actor, critic and their target networks."""        
@@ -93,7 +99,7 @@ class TQCAgent(SACAgent):
         batch = self.replay_buffer.sample()
         
         # unpack batch
-        s, a, r, s2, d = batch
+        s, a, r, s2, d, g, w, ind = self._unpack_batch(batch)
 
         # get current temperature
         if self.temp_tuning:
@@ -108,10 +114,10 @@ class TQCAgent(SACAgent):
         current_z = self.critic(s, a)
  
         # calculate targets
-        y = self._compute_target(r, s2, d)
+        y = self._compute_target(r, s2, d, g)
 
         # calculate loss
-        critic_loss = self._quantile_huber_loss(current_z, y)
+        critic_loss = self._quantile_huber_loss(current_z, y, weights=w)
  
         # compute gradients
         critic_loss.backward()
@@ -185,6 +191,13 @@ class TQCAgent(SACAgent):
         #------- Update target network -------
         self.polyak_update()
 
+        #------- TD errors for prioritized replay -------
+        td_err = (y.mean(dim=1, keepdim=True) - current_z.detach().mean(dim=(1,2)).unsqueeze(1)).abs()
+
+        if self.buffer_type == "prioritized":
+            self.replay_buffer.update_priorities(ind, td_err)
+        return td_err
+
 
     @torch.no_grad()
     def polyak_update(self):
@@ -18,21 +18,20 @@ class ACCDDQNAgent(DQNAgent):
 
         # checks
         assert self.AC_K <= self.num_actions, "ACC-K cannot exceed number of actions."
+        assert self.buffer_type == "uniform", "Prioritized replay is currently not available for ACCDDQN."
 
-        # init two nets
-        self.DQN = nn.ModuleList().to(self.device)
-
+        # init two nets, evaluated in one batched forward pass
         if self.state_type == "image":
-            for _ in range(2):
-                self.DQN.append(nets.MinAtar_DQN(in_channels = self.state_shape[0],
+            self.DQN = nets.MinAtar_EnsembleDQN(in_channels = self.state_shape[0],
                                                 height      = self.state_shape[1],
                                                 width       = self.state_shape[2],
-                                                num_actions = self.num_actions).to(self.device))
+                                                num_actions = self.num_actions,
+                                                N           = 2).to(self.device)
         elif self.state_type == "feature":
-            for _ in range(2):
-                self.DQN.append(nets.MLP(in_size   = self.state_shape,
-                                         out_size  = self.num_actions, 
-                                         net_struc = self.net_struc).to(self.device))
+            self.DQN = nets.FC_EnsembleDQN(state_shape = self.state_shape,
+                                           num_actions = self.num_actions,
+                                           net_struc   = self.net_struc,
+                                           N           = 2).to(self.device)
 
         # number of parameters of net
         self.n_params = self._count_params(self.DQN)
@@ -45,7 +44,7 @@ class ACCDDQNAgent(DQNAgent):
         if self.optimizer == "Adam":
             self.DQN_optimizer = optim.Adam(self.DQN.parameters(), lr=self.lr)
         else:
-            self.DQN_A_optimizer = optim.RMSprop(self.DQN.parameters(), lr=self.lr, alpha=0.95, centered=True, eps=0.01)
+            self.DQN_optimizer = optim.RMSprop(self.DQN.parameters(), lr=self.lr, alpha=0.95, centered=True, eps=0.01)
 
     @torch.no_grad()
     def _greedy_action(self, s, with_Q=False):
@@ -61,7 +60,7 @@ class ACCDDQNAgent(DQNAgent):
         s = torch.tensor(s, dtype=torch.float32).unsqueeze(0).to(self.device)
 
         # forward pass
-        q = self.DQN[0](s).to(self.device) + self.DQN[1](s).to(self.device)
+        q = self.DQN(s).sum(dim=0)
 
         # greedy
         a = torch.argmax(q).item()
@@ -70,6 +69,12 @@ class ACCDDQNAgent(DQNAgent):
             return a, 0.5 * q[0][a].item()
         return a
 
+    @torch.no_grad()
+    def _greedy_actions(self, s):
+        """Selects greedy actions for states stacked along the first axis."""
+        s = torch.tensor(s, dtype=torch.float32).to(self.device)
+        return torch.argmax(self.DQN(s).sum(dim=0), dim=1).cpu().numpy()
+
 
     def train(self):
         """Samples from replay_buffer and updates DQN."""        
@@ -78,7 +83,7 @@ class ACCDDQNAgent(DQNAgent):
         batch = self.replay_buffer.sample()
         
         # unpack batch
-        s, a, r, s2, d = batch
+        s, a, r, s2, d, g, _, _ = self._unpack_batch(batch)
 
         #-------- train both nets --------
         # Note: The description of the training process is not completely clear, see Section 'Deep Version' of Jiang et. al (2021).
@@ -88,31 +93,19 @@ class ACCDDQNAgent(DQNAgent):
         # clear gradients
         self.DQN_optimizer.zero_grad()
         
-        # Q-values
-        QA = self.DQN[0](s)
-        QA = torch.gather(input=QA, dim=1, index=a)
-
-        QB = self.DQN[1](s)
-        QB = torch.gather(input=QB, dim=1, index=a)
+        # Q-values of both nets
+        QA, QB = torch.gather(input=self.DQN(s), dim=2, index=a.expand(2, -1, -1))
  
         # targets
         with torch.no_grad():
+            QA_v2, QB_v2 = self.DQN(s2)
 
             # compute candidate set based on QB
-            QB_v2 = self.DQN[1](s2)
             M_K = torch.argsort(QB_v2, dim=1, descending=True)[:, :self.AC_K]
 
-            # get a_star_K
-            QA_v2 = self.DQN[0](s2)
-            a_star_K = torch.empty((self.batch_size, 1), dtype=torch.int64).to(self.device)
-
-            for bat_idx in range(self.batch_size):
-                
-                # get best action of the candidate set
-                act_idx = torch.argmax(QA_v2[bat_idx][M_K[bat_idx]])
-
-                # store its index
-                a_star_K[bat_idx] = M_K[bat_idx][act_idx]
+            # get a_star_K, the best action of the candidate set according to QA
+            act_idx  = torch.argmax(torch.gather(QA_v2, dim=1, index=M_K), dim=1, keepdim=True)
+            a_star_K = torch.gather(M_K, dim=1, index=act_idx)
 
             # evaluate a_star_K on B
             Q_next = torch.gather(QB_v2, dim=1, index=a_star_K)
@@ -122,7 +115,7 @@ class ACCDDQNAgent(DQNAgent):
             Q_next = torch.min(Q_next, ME)
 
             # target
-            y = r + self.gamma * Q_next * (1 - d)
+            y = r + g * Q_next * (1 - d)
 
         # calculate loss
         loss = self._compute_loss(QA, y) + self._compute_loss(QB, y)
@@ -1,6 +1,7 @@
 import scipy.stats
 import torch
 import tud_rl.common.buffer as buffer
+from tud_rl import logger
 from tud_rl.agents._discrete.KEBootDQN import KEBootDQNAgent
 from tud_rl.common.configparser import ConfigFile
 from tud_rl.common.helper_fnc import get_MC_ret_from_rew
@@ -20,6 +21,13 @@ class AdaKEBootDQNAgent(KEBootDQNAgent):
         # checks
         assert self.kernel == "test", "Currently, AdaKEBootDQN is only available for adjusting the significance level of the TE."
         assert "MinAtar" in c.Env.name, "Currently, AdaKEBootDQN is only available for MinAtar environments."
+        assert self.n_envs == 1 and self.n_actors == 0, "AdaKEBootDQN stores env copies and needs a single env in the training process."
+        assert self.buffer_storage != "memmap", "AdaKEBootDQN stores env copies, which cannot be memory-mapped."
+
+        # the env copies live outside the storage arrays, which incremental checkpoints cannot track
+        if self.buffer_ckpt == "incremental":
+            logger.warning("Replay buffers with env copies are checkpointed via pickle instead of incrementally.")
+            self.buffer_ckpt = "pickle"
 
         # bounds
         if self.kernel == "test":
@@ -35,7 +43,11 @@ class AdaKEBootDQNAgent(KEBootDQNAgent):
                                                                     batch_size    = self.batch_size, 
                                                                     device        = self.device,
                                                                     K             = self.K, 
-                                                                    mask_p        = self.mask_p)
+                                                                    mask_p        = self.mask_p,
+                                                                    storage       = self.buffer_storage,
+                                                                    buffer_dir    = self.buffer_dir,
+                                                                    compact       = self.buffer_compact,
+                                                                    image_storage = self.image_storage)
 
     def _set_g(self):
         """Sets the kernel function depending on the current kernel param."""
@@ -22,6 +22,10 @@ class BootDQNAgent(DQNAgent):
         self.grad_rescale = getattr(c.Agent, agent_name)["grad_rescale"]
         
         c.overwrite(grad_rescale=self.grad_rescale)      # for correct logging
+
+        # checks
+        assert self.buffer_type == "uniform", "Prioritized replay is currently not available for BootDQN."
+        assert self.n_steps == 1, "N-step returns are currently not available for BootDQN."
        
         # replay buffer with masks
         if self.mode == "train":
@@ -31,7 +35,11 @@ class BootDQNAgent(DQNAgent):
                                                                     batch_size    = self.batch_size, 
                                                                     device        = self.device,
                                                                     K             = self.K, 
-                                                                    mask_p        = self.mask_p)
+                                                                    mask_p        = self.mask_p,
+                                                                    storage       = self.buffer_storage,
+                                                                    buffer_dir    = self.buffer_dir,
+                                                                    compact       = self.buffer_compact,
+                                                                    image_storage = self.image_storage)
         # init BootDQN
         if self.state_type == "image":
             self.DQN = nets.MinAtar_BootDQN(in_channels = self.state_shape[0],
@@ -65,12 +73,16 @@ class BootDQNAgent(DQNAgent):
         else:
             self.DQN_optimizer = optim.RMSprop(self.DQN.parameters(), lr=self.lr, alpha=0.95, centered=True, eps=0.01)
         
-        # init active head
+        # init active head, one per env in vectorized training
         self.reset_active_head()
+        self.active_heads = np.random.choice(self.K, size=self.n_envs) if self.n_envs > 1 else None
 
 
-    def reset_active_head(self):
-        self.active_head = np.random.choice(self.K)
+    def reset_active_head(self, env=None):
+        if env is None:
+            self.active_head = np.random.choice(self.K)
+        else:
+            self.active_heads[env] = np.random.choice(self.K)
 
 
     @torch.no_grad()
@@ -91,6 +103,23 @@ class BootDQNAgent(DQNAgent):
         return a
 
 
+    @torch.no_grad()
+    def select_actions(self, s):
+        """Greedy action selection for the states of several envs using the active head of each env (train) or majority
+        vote (test).
+        s:       np.array with shape (n_envs, in_channels, height, width)
+
+        returns: np.array with shape (n_envs,)
+        """
+        if self.mode != "train":
+            return super(DQNAgent, self).select_actions(s)
+
+        # push through all heads and pick the active head per env
+        q = torch.stack(self.DQN(torch.tensor(s, dtype=torch.float32).to(self.device)))
+        q = q[torch.as_tensor(self.active_heads), torch.arange(len(s))]
+        return torch.argmax(q, dim=1).cpu().numpy()
+
+
     @torch.no_grad()
     def _greedy_action(self, s, active_head=None, with_Q=False):
         """Selects a greedy action via majority vote of the bootstrap heads or a single bootstrap head.
@@ -6,7 +6,6 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-import tud_rl.common.buffer as buffer
 import tud_rl.common.nets as nets
 from tud_rl.agents.base import BaseAgent
 from tud_rl.common.configparser import ConfigFile
@@ -39,12 +38,7 @@ class DQNAgent(BaseAgent):
 
         # replay buffer
         if self.mode == "train":
-            self.replay_buffer = buffer.UniformReplayBuffer(state_type    = self.state_type, 
-                                                            state_shape   = self.state_shape, 
-                                                            buffer_length = self.buffer_length,
-                                                            batch_size    = self.batch_size,
-                                                            device        = self.device,
-                                                            disc_actions  = True)
+            self.replay_buffer = self._init_replay_buffer(disc_actions=True)
         # init DQN
         if init_DQN:
             if self.state_type == "image":
@@ -85,6 +79,11 @@ class DQNAgent(BaseAgent):
         self.replay_buffer.add(s, a, r, s2, d)
 
 
+    def memorize_batch(self, s, a, r, s2, d):
+        """Stores transitions stacked along the first axis in replay buffer."""
+        self.replay_buffer.add_batch(s, a, r, s2, d)
+
+
     @torch.no_grad()
     def select_action(self, s):
         """Epsilon-greedy based action selection for a given state.
@@ -129,15 +128,44 @@ class DQNAgent(BaseAgent):
         return a
 
 
-    def _compute_target(self, r, s2, d):
+    @torch.no_grad()
+    def select_actions(self, s):
+        """Epsilon-greedy based action selection for the states of several envs.
+
+        Arg s:   np.array with shape (n_envs, in_channels, height, width) or, for feature input, (n_envs, state_shape)
+        returns: np.array with shape (n_envs,)
+        """
+
+        # get current epsilon, the schedule advances once per env
+        curr_epsilon = self.exploration.get_epsilon(self.mode, n=len(s))
+
+        # greedy, replaced by random actions with probability epsilon
+        a = self._greedy_actions(s)
+        rnd = np.random.binomial(1, curr_epsilon, size=len(s)) == 1
+        a[rnd] = np.random.randint(low=0, high=self.num_actions, size=rnd.sum(), dtype=int)
+        return a
+
+
+    @torch.no_grad()
+    def _greedy_actions(self, s):
+        """Selects greedy actions for states stacked along the first axis. Returns np.array with shape (len(s),)."""
+        s = torch.tensor(s, dtype=torch.float32).to(self.device)
+        return torch.argmax(self.DQN(s), dim=1).cpu().numpy()
+
+
+    def _compute_target(self, r, s2, d, g):
         with torch.no_grad():
             Q_next = self.target_DQN(s2)
             Q_next = torch.max(Q_next, dim=1).values.reshape(self.batch_size, 1)
-            y = r + self.gamma * Q_next * (1 - d)
+            y = r + g * Q_next * (1 - d)
         return y
 
 
-    def _compute_loss(self, Q, y, reduction="mean"):
+    def _compute_loss(self, Q, y, reduction="mean", weights=None):
+        # importance-sampling weights from prioritized replay
+        if weights is not None:
+            return torch.mean(weights * self._compute_loss(Q, y, reduction="none"))
+
         if self.loss == "MSELoss":
             return F.mse_loss(Q, y, reduction=reduction)
 
@@ -150,7 +178,7 @@ class DQNAgent(BaseAgent):
         batch = self.replay_buffer.sample()
         
         # unpack batch
-        s, a, r, s2, d = batch
+        s, a, r, s2, d, g, w, ind = self._unpack_batch(batch)
 
         #-------- train DQN --------
         # clear gradients
@@ -161,10 +189,10 @@ class DQNAgent(BaseAgent):
         Q = torch.gather(input=Q, dim=1, index=a)
  
         # targets
-        y = self._compute_target(r, s2, d)
+        y = self._compute_target(r, s2, d, g)
 
         # loss
-        loss = self._compute_loss(Q=Q, y=y)
+        loss = self._compute_loss(Q=Q, y=y, weights=w)
         
         # compute gradients
         loss.backward()
@@ -185,6 +213,13 @@ class DQNAgent(BaseAgent):
 
         #------- Update target networks -------
         self._target_update()
+
+        #------- TD errors for prioritized replay -------
+        td_err = (y - Q).detach().abs()
+
+        if self.buffer_type == "prioritized":
+            self.replay_buffer.update_priorities(ind, td_err)
+        return td_err
     
 
     @torch.no_grad()
@@ -2,12 +2,11 @@ import copy
 import math
 
 import torch
-import torch.nn as nn
-import torch.optim as optim
 
 import tud_rl.common.nets as nets
 from tud_rl.agents._discrete.DQN import DQNAgent
 from tud_rl.common.configparser import ConfigFile
+from tud_rl.common.ensemble_optim import EnsembleAdam, EnsembleRMSprop
 from tud_rl.common.logging_func import *
 
 
@@ -19,20 +18,23 @@ class EnsembleDQNAgent(DQNAgent):
         self.N           = getattr(c.Agent, agent_name)["N"]
         self.N_to_update = getattr(c.Agent, agent_name)["N_to_update"]
 
-        # init EnsembleDQN
-        self.DQN = nn.ModuleList().to(self.device)
+        # checks
+        assert self.buffer_type == "uniform", "Prioritized replay is currently not available for EnsembleDQN."
 
-        for _ in range(self.N):
-            if self.state_type == "image":
-                self.DQN.append(nets.MinAtar_DQN(in_channels = self.state_shape[0],
-                                                 height      = self.state_shape[1],
-                                                 width       = self.state_shape[2],
-                                                 num_actions = self.num_actions).to(self.device))
+        # init EnsembleDQN, all members are evaluated in one batched forward pass
+        if self.state_type == "image":
+            self.DQN = nets.MinAtar_EnsembleDQN(in_channels = self.state_shape[0],
+                                                height      = self.state_shape[1],
+                                                width       = self.state_shape[2],
+                                                num_actions = self.num_actions,
+                                                N           = self.N).to(self.device)
+
+        elif self.state_type == "feature":
+            self.DQN = nets.FC_EnsembleDQN(state_shape = self.state_shape,
+                                           num_actions = self.num_actions,
+                                           net_struc   = self.net_struc,
+                                           N           = self.N).to(self.device)
 
-            elif self.state_type == "feature":
-                self.DQN.append(nets.MLP(in_size   = self.state_shape,
-                                         out_size  = self.num_actions, 
-                                         net_struc = self.net_struc).to(self.device))
         # parameter number of net
         self.n_params = self._count_params(self.DQN)
 
@@ -48,11 +50,11 @@ class EnsembleDQNAgent(DQNAgent):
         for p in self.target_DQN.parameters():
             p.requires_grad = False
 
-        # define optimizer
+        # define optimizer, which keeps a separate state for each member and only steps the updated ones
         if self.optimizer == "Adam":
-            self.DQN_optimizer = optim.Adam(self.DQN.parameters(), lr=self.lr)
+            self.DQN_optimizer = EnsembleAdam(self.DQN.parameters(), lr=self.lr)
         else:
-            self.DQN_optimizer = optim.RMSprop(self.DQN.parameters(), lr=self.lr, alpha=0.95, centered=True, eps=0.01)
+            self.DQN_optimizer = EnsembleRMSprop(self.DQN.parameters(), lr=self.lr, alpha=0.95, centered=True, eps=0.01)
 
     def _ensemble_reduction(self, q_ens):
         """
@@ -74,12 +76,11 @@ class EnsembleDQNAgent(DQNAgent):
         # reshape obs (namely, to torch.Size([1, in_channels, height, width]) or torch.Size([1, state_shape]))
         s = torch.tensor(s, dtype=torch.float32).unsqueeze(0).to(self.device)
 
-        # forward through ensemble
-        q_ens = [net(s).to(self.device) for net in self.DQN] # list of torch.Size([batch_size, num_actions])
-        q_ens = torch.stack(q_ens).to(self.device)                   # torch.Size([N, batch_size, num_actions])   
+        # forward through ensemble, torch.Size([N, batch_size, num_actions])
+        q_ens = self.DQN(s)
 
         # reduction over ensemble
-        q = self._ensemble_reduction(q_ens).to(self.device)
+        q = self._ensemble_reduction(q_ens)
 
         # greedy
         a = torch.argmax(q).item()
@@ -89,66 +90,106 @@ class EnsembleDQNAgent(DQNAgent):
         return a
 
 
-    def _compute_target(self, r, s2, d):
+    @torch.no_grad()
+    def _greedy_actions(self, s):
+        """Selects greedy actions for states stacked along the first axis by maximizing over the reduced ensemble."""
+        s = torch.tensor(s, dtype=torch.float32).to(self.device)
+        q_ens = self.DQN(s)
+        return torch.argmax(self._ensemble_reduction(q_ens), dim=1).cpu().numpy()
+
+
+    def _compute_target(self, r, s2, d, g):
         with torch.no_grad():
 
             # forward through ensemble
-            Q_next_ens = [net(s2).to(self.device) for net in self.target_DQN]
-            Q_next_ens = torch.stack(Q_next_ens).to(self.device)
-            
+            Q_next_ens = self.target_DQN(s2)
+
             # reduction over ensemble
             Q_next = self._ensemble_reduction(Q_next_ens)
 
             # maximization and target
-            Q_next = torch.max(Q_next, dim=1).values.reshape(self.batch_size, 1)
-            y = r + self.gamma * Q_next * (1 - d)
+            Q_next = torch.max(Q_next, dim=1).values.reshape(-1, 1)
+            y = r + g * Q_next * (1 - d)
         return y
 
 
+    def _sample_members(self, n):
+        """Samples 'n' batches, stacked along a new first axis. Each batch is copied before the next one is drawn, since
+        the torch storage of the buffer reuses its output tensors."""
+        if n == 1:
+            s, a, r, s2, d, g, _, _ = self._unpack_batch(self.replay_buffer.sample())
+            return tuple(x.unsqueeze(0) if torch.is_tensor(x) else x for x in (s, a, r, s2, d, g))
+
+        stacked = None
+
+        for j in range(n):
+            s, a, r, s2, d, g, _, _ = self._unpack_batch(self.replay_buffer.sample())
+            batch = (s, a, r, s2, d) + ((g,) if torch.is_tensor(g) else ())
+
+            if stacked is None:
+                stacked = [x.new_empty((n, *x.shape)) for x in batch]
+            for out, x in zip(stacked, batch):
+                out[j] = x
+
+        return (*stacked[:5], stacked[5] if len(stacked) == 6 else self.gamma)
+
+
+    def _clip_member_grads(self, max_norm):
+        """Clips the gradient norm of each ensemble member separately. All parameters hold the members along the first axis."""
+        grads = [p.grad for p in self.DQN.parameters()]
+        norms = torch.sqrt(sum(grad.reshape(self.N, -1).pow(2).sum(dim=1) for grad in grads))
+        scale = torch.clamp(max_norm / (norms + 1e-6), max=1.0)
+
+        for grad in grads:
+            grad.mul_(scale.view(-1, *[1] * (grad.dim() - 1)))
+
+
     def train(self):
-        """Samples from replay_buffer, updates critic and the target networks.""" 
+        """Samples one batch for each of 'N_to_update' randomly chosen ensemble members, updates them in one backward pass
+        and updates the target networks.""" 
        
         #-------- train EnsembleDQN --------
         # clear gradients
         self.DQN_optimizer.zero_grad(set_to_none=True)
-        
-        for _ in range(self.N_to_update):
-            
-            # ensemble member to update
-            i = np.random.choice(self.N)
 
-            # sample batch
-            batch = self.replay_buffer.sample()
-        
-            # unpack batch
-            s, a, r, s2, d = batch
-            
-            # Q estimates
-            Q = self.DQN[i](s)
-            Q = torch.gather(input=Q, dim=1, index=a)
- 
-            # targets
-            y = self._compute_target(r, s2, d)
-
-            # loss
-            loss = self._compute_loss(Q=Q, y=y)
-            
-            # compute gradients
-            loss.backward()
-
-            # gradient scaling and clipping
-            if self.grad_rescale:
-                for p in self.DQN[i].parameters():
-                    p.grad *= 1 / math.sqrt(2)
-            if self.grad_clip:
-                nn.utils.clip_grad_norm_(self.DQN[i].parameters(), max_norm=10)
-            
-            # perform optimizing step
-            self.DQN_optimizer.step()
-            
-            # log critic training
-            self.logger.store(Loss=loss.detach().cpu().numpy().item())
-            self.logger.store(Q_val=Q.detach().mean().cpu().numpy().item())
+        # ensemble members to update, drawn with replacement
+        members = np.random.choice(self.N, size=self.N_to_update)
+
+        # sample a batch per member, shapes are (N_to_update, batch_size, ...)
+        s, a, r, s2, d, g = self._sample_members(self.N_to_update)
+
+        # Q estimates of each member on its batch, a single member is selected without gathering its parameters
+        if self.N_to_update == 1:
+            Q = self.DQN(s[0], member=int(members[0])).unsqueeze(0)
+        else:
+            Q = self.DQN(s, member=torch.as_tensor(members, device=self.device))
+        Q = torch.gather(input=Q, dim=2, index=a)
+
+        # targets of the whole target ensemble, computed for all batches at once
+        y = self._compute_target(r.flatten(0, 1), s2.flatten(0, 1), d.flatten(0, 1),
+                                 g.flatten(0, 1) if torch.is_tensor(g) else g).view_as(Q)
+
+        # loss per member, their sum yields the gradients of the separate losses
+        loss = self._compute_loss(Q=Q, y=y, reduction="none").mean(dim=(1, 2))
+
+        # compute gradients
+        loss.sum().backward()
+
+        # gradient scaling and clipping
+        if self.grad_rescale:
+            for p in self.DQN.parameters():
+                p.grad *= 1 / math.sqrt(2)
+        if self.grad_clip:
+            self._clip_member_grads(max_norm=10)
+
+        # perform optimizing step, a member drawn several times is stepped once with the sum of its gradients
+        members = np.unique(members)
+        self.DQN_optimizer.step(int(members[0]) if len(members) == 1 else torch.as_tensor(members, device=self.device))
+
+        # log critic training
+        for loss_i, Q_i in zip(loss.detach().cpu().tolist(), Q.detach().mean(dim=(1, 2)).cpu().tolist()):
+            self.logger.store(Loss=loss_i)
+            self.logger.store(Q_val=Q_i)
 
         #------- Update target networks -------
         self._target_update()
@@ -6,7 +6,6 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-import tud_rl.common.buffer as buffer
 import tud_rl.common.nets as nets
 from tud_rl import logger
 from tud_rl.agents.base import BaseAgent
@@ -38,6 +37,8 @@ class LSTMRecDQNAgent(BaseAgent):
         assert not (self.mode == "test" and (self.dqn_weights is None)), "Need prior weights in test mode."
 
         assert self.state_type == "feature", "LSTMRecDQN is currently based on features."
+        assert self.n_steps == 1, "N-step returns are currently not available for LSTM-based agents."
+        assert not self.store_hidden, "Stored recurrent states are currently not available for LSTMRecDQN."
 
         if self.net_struc is not None:
             logger.warning("The net structure cannot be controlled via the config-spec for LSTM-based agents.")
@@ -50,13 +51,7 @@ class LSTMRecDQNAgent(BaseAgent):
                                                     eps_decay_steps = self.eps_decay_steps)
         # replay buffer
         if self.mode == "train":
-            self.replay_buffer = buffer.UniformReplayBuffer_LSTM(state_type     = self.state_type, 
-                                                                 state_shape    = self.state_shape, 
-                                                                 buffer_length  = self.buffer_length,
-                                                                 batch_size     = self.batch_size,
-                                                                 device         = self.device,
-                                                                 disc_actions   = True,
-                                                                 history_length = self.history_length)
+            self.replay_buffer = self._init_lstm_buffer(disc_actions=True)
         # init DQN
         if init_DQN:
             if self.state_type == "feature":
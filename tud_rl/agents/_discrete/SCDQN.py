@@ -10,7 +10,7 @@ class SCDQNAgent(DQNAgent):
         # attributes and hyperparameters
         self.sc_beta = getattr(c.Agent, agent_name)["sc_beta"]
 
-    def _compute_target(self, r, s2, d):
+    def _compute_target(self, r, s2, d, g):
         with torch.no_grad():
             tgt_s2 = self.target_DQN(s2)
 
@@ -18,6 +18,6 @@ class SCDQNAgent(DQNAgent):
             a2 = torch.argmax(target_Q_beta, dim=1).reshape(self.batch_size, 1)
             
             Q_next = torch.gather(input=tgt_s2, dim=1, index=a2)
-            y = r + self.gamma * Q_next * (1 - d)
+            y = r + g * Q_next * (1 - d)
 
         return y
@@ -1,10 +1,20 @@
+import copy
+import os
 from abc import ABC, abstractmethod
 from typing import Tuple, Union
 
 import numpy as np
 import torch
 
+import tud_rl.common.buffer as buffer
+from tud_rl import logger
 from tud_rl.common.configparser import ConfigFile
+from tud_rl.common.exploration import Gaussian_Noise, LinearDecayEpsilonGreedy, OU_Noise
+from tud_rl.common.timing import PhaseTimer
+
+# settings of the execution of training, which may differ when a run is resumed
+RUN_SETTINGS = ["n_envs", "n_actors", "weight_sync_every", "eval_workers", "prefetch_batches", "state_ckpt",
+                "phase_timing"]
 
 
 class _Agent(ABC):
@@ -55,25 +65,45 @@ class BaseAgent(_Agent):
     def __init__(self, c: ConfigFile, agent_name: str):
 
         # attributes and hyperparameters
-        self.name             = agent_name
-        self.num_actions      = c.num_actions
-        self.mode             = c.mode
-        self.state_shape      = c.state_shape
-        self.state_type       = c.Env.state_type
-        self.gamma            = c.gamma
-        self.optimizer        = c.optimizer
-        self.loss             = c.loss
-        self.buffer_length    = c.buffer_length
-        self.grad_clip        = c.grad_clip
-        self.grad_rescale     = c.grad_rescale
-        self.act_start_step   = c.act_start_step
-        self.upd_start_step   = c.upd_start_step       
-        self.upd_every        = c.upd_every  # used in training files, purely for logging here
-        self.batch_size       = c.batch_size
-        self.device           = c.device
-        self.seed             = c.seed
-        self.needs_history    = False # whether history is needed
-        self.is_multi         = False # whether agent contains multiple agents, e.g., for MADDPG
+        self.name              = agent_name
+        self.num_actions       = c.num_actions
+        self.mode              = c.mode
+        self.state_shape       = c.state_shape
+        self.state_type        = c.Env.state_type
+        self.gamma             = c.gamma
+        self.optimizer         = c.optimizer
+        self.loss              = c.loss
+        self.buffer_length     = c.buffer_length
+        self.grad_clip         = c.grad_clip
+        self.grad_rescale      = c.grad_rescale
+        self.act_start_step    = c.act_start_step
+        self.upd_start_step    = c.upd_start_step       
+        self.upd_every         = c.upd_every  # used in training files, purely for logging here
+        self.batch_size        = c.batch_size
+        self.device            = c.device
+        self.seed              = c.seed
+        self.buffer_type       = getattr(c, "buffer_type", "uniform")
+        self.buffer_storage    = getattr(c, "buffer_storage", "numpy")
+        self.buffer_dir        = getattr(c, "buffer_dir", None)
+        self.buffer_ckpt       = getattr(c, "buffer_checkpoint", "incremental")
+        self.buffer_compact    = getattr(c, "buffer_compact", False)
+        self.image_storage     = getattr(c, "image_storage", "float")
+        self.prefetch_batches  = getattr(c, "prefetch_batches", 0)
+        self.n_steps           = getattr(c, "n_steps", 1)
+        self.sequence_replay   = getattr(c, "sequence_replay", False)
+        self.store_hidden      = getattr(c, "store_hidden", False)
+        self.burn_in           = getattr(c, "burn_in", 0)
+        self.n_envs            = getattr(c, "n_envs", 1)
+        self.n_actors          = getattr(c, "n_actors", 0)
+        self.weight_sync_every = getattr(c, "weight_sync_every", 100)
+        self.eval_workers      = getattr(c, "eval_workers", 0)
+        self.state_ckpt        = getattr(c, "state_checkpoint", True)
+        self.phase_timing      = getattr(c, "phase_timing", False)
+        self.evaluator         = None  # asynchronous evaluation, set in training files for 'eval_workers' > 0
+        self.plotter           = None  # background plotting of 'progress.txt', set in training files
+        self.timer             = PhaseTimer(enabled=False)  # wall time of the training phases, set in training files
+        self.needs_history     = False # whether history is needed
+        self.is_multi          = False # whether agent contains multiple agents, e.g., for MADDPG
 
         # checks
         assert c.mode in ["train", "test"], "Unknown mode. Should be 'train' or 'test'."
@@ -88,6 +118,42 @@ class BaseAgent(_Agent):
         assert self.loss in ["SmoothL1Loss", "MSELoss"], "Pick 'SmoothL1Loss' or 'MSELoss', please."
         assert self.optimizer in ["Adam", "RMSprop"], "Pick 'Adam' or 'RMSprop' as optimizer, please."
         assert self.device in ["cpu", "cuda"], "Unknown device."
+        assert self.buffer_type in ["uniform", "prioritized"], "Pick 'uniform' or 'prioritized' as buffer_type, please."
+        assert self.buffer_storage in ["numpy", "torch", "memmap"], "Pick 'numpy', 'torch' or 'memmap' as buffer_storage, please."
+        assert self.buffer_ckpt in ["incremental", "pickle", "none"], \
+            "Pick 'incremental', 'pickle' or 'none' as buffer_checkpoint, please."
+        assert not (self.buffer_compact and self.buffer_storage == "memmap"), "A compact buffer cannot be memory-mapped."
+        assert not (self.buffer_storage == "memmap" and self.buffer_dir is not None and getattr(c, "prior_buffer", None) is not None
+                    and os.path.realpath(self.buffer_dir) == os.path.realpath(c.prior_buffer)), \
+            "'buffer_dir' must differ from 'prior_buffer', since the new buffer recreates the files in 'buffer_dir'."
+        assert self.image_storage in ["float", "uint8", "packbits"], "Pick 'float', 'uint8' or 'packbits' as image_storage, please."
+        assert isinstance(self.n_steps, int) and self.n_steps >= 1, "'n_steps' must be a positive integer."
+        assert self.n_steps == 1 or not self.buffer_compact, "A compact buffer cannot store n-step transitions."
+        assert self.sequence_replay or not self.store_hidden, "Stored recurrent states need 'sequence_replay'."
+        assert self.store_hidden or self.burn_in == 0, "Burn-in refreshes stored recurrent states and needs 'store_hidden'."
+        assert isinstance(self.n_envs, int) and self.n_envs >= 1, "'n_envs' must be a positive integer."
+        assert self.n_envs == 1 or not self.store_hidden, "Stored recurrent states are only available for a single env."
+        assert isinstance(self.n_actors, int) and self.n_actors >= 0, "'n_actors' must be a non-negative integer."
+        assert self.n_actors == 0 or self.n_envs == 1, "Pick either 'n_actors' or 'n_envs', please."
+        assert self.n_actors == 0 or not self.store_hidden, "Stored recurrent states are not available for 'n_actors' > 0."
+        assert self.weight_sync_every >= 1, "'weight_sync_every' must be a positive integer."
+        assert isinstance(self.eval_workers, int) and self.eval_workers >= 0, "'eval_workers' must be a non-negative integer."
+        assert isinstance(self.phase_timing, bool), "'phase_timing' must be true or false."
+
+        # final observations of compact buffers live outside the ring, which incremental checkpoints cannot track
+        if self.buffer_compact and self.buffer_ckpt == "incremental":
+            logger.warning("Compact replay buffers are checkpointed via pickle instead of incrementally.")
+            self.buffer_ckpt = "pickle"
+
+        # prioritized experience replay
+        if self.buffer_type == "prioritized":
+            self.per_alpha      = getattr(c, "per_alpha", 0.6)
+            self.per_beta       = getattr(c, "per_beta", 0.4)
+            self.per_beta_steps = getattr(c, "per_beta_steps", None) or c.timesteps
+
+        # recurrent states of the nets in the current training episode and evaluation episode
+        self._carry      = None
+        self._eval_carry = None
 
         # gpu support
         if self.device == "cpu":
@@ -96,6 +162,176 @@ class BaseAgent(_Agent):
             self.device = torch.device("cuda")
             print("Using GPU support.")
 
+    def select_actions(self, s, s_hist=None, a_hist=None, hist_len=None):
+        """Selects actions for the states of 'n_envs' envs, stacked along the first axis (histories likewise). Loops over 
+        select_action() unless an agent implements a batched forward pass."""
+        if self.needs_history:
+            return np.stack([self.select_action(s[i], s_hist[i], a_hist[i], hist_len[i]) for i in range(len(s))])
+        return np.stack([self.select_action(s_i) for s_i in s])
+
+    def memorize_batch(self, s, a, r, s2, d):
+        """Stores transitions stacked along the first axis, equivalent to calling memorize() for each of them in order."""
+        for i in range(len(s)):
+            self.memorize(s[i], a[i], r[i], s2[i], d[i])
+
+    def training_state(self) -> dict:
+        """Everything of the agent that changes during training except for the replay buffer contents: nets, optimizers,
+        tensors like 'log_temperature', exploration schedules and noise, and numeric attributes like update counters.
+        Attributes starting with '_' are considered transient, and the settings of how training is executed are taken
+        from the config of the resumed run."""
+        state = {}
+
+        for key, val in vars(self).items():
+            if key.startswith("_") or key in ["replay_buffer", "logger", "evaluator", "plotter", "buffer_checkpointer"] + RUN_SETTINGS:
+                continue
+
+            if isinstance(val, (torch.nn.Module, torch.optim.Optimizer)):
+                state[key] = val.state_dict()
+
+            elif isinstance(val, torch.Tensor):
+                state[key] = val.detach().clone()
+
+            elif isinstance(val, (bool, int, float, np.number, np.ndarray)):
+                state[key] = copy.deepcopy(val)
+
+            elif isinstance(val, (LinearDecayEpsilonGreedy, OU_Noise, Gaussian_Noise)):
+                state[key] = copy.deepcopy(vars(val))
+
+        # annealed importance-sampling exponent and maximum priority of prioritized replay
+        buf = buffer.unwrap(getattr(self, "replay_buffer", None))
+        if isinstance(buf, buffer.PrioritizedReplayBuffer):
+            state["replay_buffer"] = {"beta": buf.beta, "max_prio": buf.max_prio}
+
+        return state
+
+    def load_training_state(self, state: dict) -> None:
+        """Restores a state returned by training_state(). Nets, optimizers and tensors are loaded in place, so that the
+        optimizers keep referencing the parameters they update."""
+        for key, val in state.items():
+            cur = getattr(self, key, None)
+
+            if key == "replay_buffer":
+                buf = buffer.unwrap(self.replay_buffer)
+                vars(buf).update(val)
+
+            elif isinstance(cur, (torch.nn.Module, torch.optim.Optimizer)):
+                cur.load_state_dict(val)
+
+            elif isinstance(cur, torch.Tensor) and cur.shape == val.shape:
+                with torch.no_grad():
+                    cur.copy_(val)
+
+            elif isinstance(cur, (LinearDecayEpsilonGreedy, OU_Noise, Gaussian_Noise)):
+                vars(cur).update(val)
+
+            else:
+                setattr(self, key, val.to(self.device) if isinstance(val, torch.Tensor) else val)
+
+    def _init_replay_buffer(self, disc_actions, action_dim=None):
+        """Creates the replay buffer for single-agent, non-recurrent agents according to 'buffer_type'."""
+        kwargs = dict(state_type    = self.state_type,
+                      state_shape   = self.state_shape,
+                      buffer_length = self.buffer_length,
+                      batch_size    = self.batch_size,
+                      device        = self.device,
+                      disc_actions  = disc_actions,
+                      action_dim    = action_dim,
+                      storage       = self.buffer_storage,
+                      buffer_dir    = self.buffer_dir,
+                      compact       = self.buffer_compact,
+                      image_storage = self.image_storage,
+                      n_steps       = self.n_steps,
+                      gamma         = self.gamma)
+
+        if self.buffer_type == "prioritized":
+            return buffer.PrioritizedReplayBuffer(alpha=self.per_alpha, beta=self.per_beta, beta_steps=self.per_beta_steps, **kwargs)
+        return buffer.UniformReplayBuffer(**kwargs)
+
+    def _init_lstm_buffer(self, disc_actions, action_dim=None, hidden_nets=None):
+        """Creates the replay buffer for recurrent agents, which is episode-indexed if 'sequence_replay' is set. With
+        'store_hidden', the recurrent states of 'hidden_nets' (dict of name: net) are stored as well."""
+        assert self.buffer_type == "uniform", "Prioritized replay is currently not available for recurrent agents."
+
+        kwargs = dict(state_type     = self.state_type,
+                      state_shape    = self.state_shape,
+                      buffer_length  = self.buffer_length,
+                      batch_size     = self.batch_size,
+                      device         = self.device,
+                      disc_actions   = disc_actions,
+                      action_dim     = action_dim,
+                      history_length = self.history_length,
+                      storage        = self.buffer_storage,
+                      buffer_dir     = self.buffer_dir,
+                      compact        = self.buffer_compact)
+
+        if not self.sequence_replay:
+            return buffer.UniformReplayBuffer_LSTM(**kwargs)
+
+        hidden_dims = {key: net.hidden_dim for key, net in hidden_nets.items()} if self.store_hidden else None
+        return buffer.SequenceReplayBuffer_LSTM(burn_in=self.burn_in, hidden_dims=hidden_dims, **kwargs)
+
+    def _step_tensors(self, s, a):
+        """Converts a single state and action into histories of length one."""
+        s = torch.tensor(s, dtype=torch.float32).view(1, 1, -1).to(self.device)
+        a = torch.tensor(a, dtype=torch.float32).view(1, 1, -1).to(self.device)
+        return s, a
+
+    def _memorize_lstm(self, s, a, r, s2, d, hidden_nets):
+        """Stores a transition of a recurrent agent. With 'store_hidden', the recurrent states of 'hidden_nets' before 
+        consuming s are stored along and are advanced by (s, a) afterwards."""
+        if not self.store_hidden:
+            return self.replay_buffer.add(s, a, r, s2, d)
+
+        if self._carry is None or self.replay_buffer.new_episode(s):
+            self._carry = {key: torch.zeros((1, net.hidden_dim), device=self.device) for key, net in hidden_nets.items()}
+
+        self.replay_buffer.add(s, a, r, s2, d, hidden={key: h.cpu().numpy()[0] for key, h in self._carry.items()})
+
+        s, a = self._step_tensors(s, a)
+        one  = torch.ones(1, dtype=torch.int64, device=self.device)
+        self._carry = {key: net.burn_in(s, a, one, self._carry[key]) for key, net in hidden_nets.items()}
+
+    def _act_hidden(self, net, s_hist, a_hist, hist_len):
+        """Recurrent state of the actor 'net' for action selection with 'store_hidden'. In training, this is the state 
+        advanced in memorize(). In test mode, the state is advanced here by the latest history entry."""
+        if hist_len == 0:
+            hidden = torch.zeros((1, net.hidden_dim), device=self.device)
+
+        elif self.mode == "train":
+            return self._carry["actor"]
+
+        else:
+            s, a = self._step_tensors(s_hist[hist_len - 1], a_hist[hist_len - 1])
+            hidden = net.burn_in(s, a, torch.ones(1, dtype=torch.int64, device=self.device), self._eval_carry)
+
+        self._eval_carry = hidden
+        return hidden
+
+    def _initial_hidden(self, batch, net, key, nxt=False):
+        """Recurrent state of 'net' before the sampled s_hist (s2_hist if 'nxt'), obtained by replaying the burn-in steps 
+        from the stored state 'key'. None without 'store_hidden'."""
+        if not self.store_hidden:
+            return None
+
+        seq = batch[-1]
+        sfx = "2" if nxt else ""
+        return net.burn_in(seq["s_burn" + sfx], seq["a_burn" + sfx], seq["burn_len" + sfx], seq[key + sfx])
+
+    def _unpack_batch(self, batch):
+        """Splits a batch of the buffer from '_init_replay_buffer' into (s, a, r, s2, d, g, w, ind). 'g' is the discount of
+        s2, which is gamma for 1-step transitions. 'w' and 'ind' are None unless prioritized replay is used."""
+        if self.buffer_type == "prioritized":
+            *batch, w, ind = batch
+        else:
+            w, ind = None, None
+
+        if self.n_steps > 1:
+            s, a, r, s2, d, g = batch
+        else:
+            s, a, r, s2, d = batch
+            g = self.gamma
+        return s, a, r, s2, d, g, w, ind
+
     def _count_params(self, net):
         """Count the number of parameters of a given net"""
         return sum([np.prod(p.shape) for p in net.parameters()])
@@ -0,0 +1,332 @@
+"""
+Update throughput benchmark of the agents in `tud_rl/agents/_continuous` and `tud_rl/agents/_discrete`. Each agent is
+built with the settings of the first config in `tud_rl/configs` listing it which it can be built with (the first
+variant, e.g., 'SCDQN_a', for suffixed names), while the replay buffer is filled with synthetic transitions instead of
+env interaction. For every batch size, the agent is built in a fresh process, and for every number of CPU threads the
+benchmark measures
+
+    updates_per_s   calls of agent.train() per second
+    act_ms_p50/p99  latency of a greedy agent.select_action()
+    peak_rss_mb     peak RSS of the process, including the filled replay buffer
+
+together with the number of parameters and the size of the replay buffer. The state and action shapes are taken from
+the config's env, which is built with the stubs of `tud_rl.benchmarks.envs` for missing data files; if it cannot be
+built, synthetic shapes are used and reported. Agents which cannot be built or trained, e.g., those requiring a specific
+env, are reported with their error.
+
+The results are written to a JSON report and optionally compared with a baseline report, in which case the exit code is
+1 if an agent got slower, needs more memory, or fails although it ran in the baseline.
+
+Usage:
+    python -m tud_rl.benchmarks.agents --batch_sizes 32 128 --threads 1 4 --out agent_bench.json --baseline agent_baseline.json
+"""
+import copy
+import glob
+import json
+import logging
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import yaml
+
+from tud_rl.benchmarks.common import compare_to_baseline, peak_rss_mb, system_info, write_report
+from tud_rl.benchmarks.envs import CONFIG_DIR, UNREGISTERED, stub_missing_files
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "agents")
+
+# compared metrics with the direction of improvement and the default tolerance
+METRICS = {"updates_per_s": ("higher", 0.2),
+           "act_ms_p50"   : ("lower", 0.3),
+           "peak_rss_mb"  : ("lower", 0.1)}
+
+
+def available_agents() -> dict:
+    """Agent names keyed by action type, read from the plug-in folders without importing them."""
+    return {kind: sorted(os.path.basename(f)[:-3] for f in glob.glob(os.path.join(AGENT_DIR, f"_{kind}", "*.py"))
+                         if not f.endswith("__init__.py"))
+            for kind in ["continuous", "discrete"]}
+
+
+def find_configs(agent: str, kind: str) -> list:
+    """Configs of the action type listing 'agent' in alphabetical order, as tuples of path and name of the listing."""
+    found = []
+    for path in sorted(glob.glob(os.path.join(CONFIG_DIR, f"{kind}_actions", "*.yaml"))):
+        with open(path) as f:
+            listed = (yaml.safe_load(f) or {}).get("agent") or {}
+
+        for name in listed:
+            if name == agent or (name[:-2] == agent and name[-2] == "_" and name[-1].islower()):
+                found.append((path, name))
+                break
+    return found
+
+
+def _spaces(c, kind: str, args):
+    """Sets c.state_shape and c.num_actions as the training scripts do. Returns the source of the shapes."""
+    try:
+        import gym
+
+        import tud_rl
+        import tud_rl.envs
+        from tud_rl.benchmarks.envs import _specs
+        from tud_rl.wrappers import get_wrapper
+
+        if c.Env.name in UNREGISTERED and c.Env.name not in [spec.id for spec in _specs()]:
+            gym.register(id=c.Env.name, entry_point=tud_rl.loc + UNREGISTERED[c.Env.name])
+
+        env = gym.make(c.Env.name, **c.Env.env_kwargs)
+        for wrapper in c.Env.wrappers:
+            env = get_wrapper(name=wrapper, env=env, **c.Env.wrapper_kwargs[wrapper])
+
+        obs = env.observation_space
+        c.state_shape = obs.shape if c.Env.state_type == "image" else obs.shape[0]
+        c.num_actions = env.action_space.n if kind == "discrete" else env.action_space.shape[0]
+        env.close()
+        return c.Env.name
+
+    except Exception as e:
+        if c.Env.state_type == "image":
+            raise
+        c.state_shape = args.state_dim
+        c.num_actions = args.num_actions
+        return f"synthetic ({type(e).__name__}: {e})"[:200]
+
+
+def _transitions(agent, discrete: bool, n: int, p_done: float):
+    """Yields 'n' random transitions (s, a, r, s2, d) shaped like the env interaction of the training scripts."""
+    shape  = agent.state_shape if isinstance(agent.state_shape, tuple) else (agent.state_shape,)
+    prefix = (agent.N_agents,) if agent.is_multi else ()
+
+    s = np.random.randn(*prefix, *shape).astype(np.float32)
+    for _ in range(n):
+        s2 = np.random.randn(*prefix, *shape).astype(np.float32)
+
+        if discrete:
+            a = np.random.randint(agent.num_actions, size=prefix) if agent.is_multi else np.random.randint(agent.num_actions)
+        else:
+            a = np.random.uniform(-1.0, 1.0, size=prefix + (agent.num_actions,))
+
+        r = np.random.randn(agent.N_agents, 1) if agent.is_multi else float(np.random.randn())
+        d = bool(np.random.rand() < p_done)
+
+        yield s, a, r, s2, d
+        s = np.random.randn(*prefix, *shape).astype(np.float32) if d else s2
+
+
+def _act_args(agent, discrete: bool):
+    """Arguments of select_action() for a random state, with full histories for agents needing them."""
+    from tud_rl.common.history import HistoryTracker
+
+    s, a, _, _, _ = next(_transitions(agent, discrete, 1, 0.0))
+    if not agent.needs_history:
+        return {"s": s}
+
+    s_hist = HistoryTracker(agent.history_length, agent.state_shape)
+    a_hist = HistoryTracker(agent.history_length, np.shape(a) or 1, dtype=np.asarray(a).dtype)
+    for s_i, a_i, *_ in _transitions(agent, discrete, agent.history_length, 0.0):
+        s_hist.push(s_i)
+        a_hist.push(a_i)
+    return {"s": s, "s_hist": s_hist.view(), "a_hist": a_hist.view(), "hist_len": s_hist.hist_len}
+
+
+def _n_params(agent) -> int:
+    n = getattr(agent, "n_params", 0)
+    return int(sum(n)) if isinstance(n, (tuple, list)) else int(n)
+
+
+def _buffer_mb(buffer) -> float:
+    from tud_rl.common.buffer import unwrap
+    arrays = [x for x in vars(unwrap(buffer)).values() if isinstance(x, np.ndarray)]
+    return sum(x.nbytes for x in arrays) / 2**20
+
+
+def _build(agent: str, kind: str, configs: list, batch_size: int, args, tmp_dir: str):
+    """Builds 'agent' with the first of 'configs' that works. Returns the agent, config, name and source of the shapes."""
+    from tud_rl.agents import continuous, discrete
+    from tud_rl.common.configparser import ConfigFile
+
+    module = continuous if kind == "continuous" else discrete
+    errors = []
+
+    for config, name in configs:
+        try:
+            c = ConfigFile(config)
+            stub_missing_files(c.Env.env_kwargs, tmp_dir)
+            spaces = _spaces(c, kind, args)
+
+            c.mode          = "train"
+            c.device        = "cpu"
+            c.seed          = args.seed
+            c.batch_size    = batch_size
+            c.buffer_length = args.fill
+            if getattr(c, "buffer_storage", "numpy") == "memmap":
+                c.buffer_dir = os.path.join(tmp_dir, "buffer")
+
+            return getattr(module, agent + "Agent")(copy.deepcopy(c), name), c, name, spaces
+
+        except Exception as e:
+            errors.append(f"{os.path.relpath(config, CONFIG_DIR)}: {type(e).__name__}: {e}")
+    raise RuntimeError("; ".join(errors) if errors else "no config lists the agent")
+
+
+def _bench_agent(agent: str, kind: str, configs: list, batch_size: int, args, q) -> None:
+    """Process target: builds 'agent' with 'batch_size', fills its buffer and puts the results per thread count into 'q'."""
+    results = {}
+    try:
+        import torch
+
+        import tud_rl
+        tud_rl.logger.setLevel(logging.WARNING)
+        from tud_rl.common.logging_func import EpochLogger
+
+        np.random.seed(args.seed)
+        random.seed(args.seed)
+        torch.manual_seed(args.seed)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rss_before = peak_rss_mb()
+            a, c, name, spaces = _build(agent, kind, configs, batch_size, args, tmp_dir)
+            a.logger = EpochLogger(alg_str=name, seed=args.seed, env_str=c.Env.name, output_dir=os.path.join(tmp_dir, "log"))
+
+            for s, act, r, s2, d in _transitions(a, kind == "discrete", args.fill, args.p_done):
+                a.memorize(s, act, r, s2, d)
+
+            info = {"config": os.path.relpath(c.file, CONFIG_DIR), "name": name, "spaces": spaces,
+                    "n_params": _n_params(a), "buffer_mb": _buffer_mb(a.replay_buffer)}
+
+            act_args = _act_args(a, kind == "discrete")
+            for threads in args.threads:
+                torch.set_num_threads(threads)
+
+                for _ in range(args.warmup):
+                    a.train()
+                a.logger.epoch_dict.clear()
+
+                t = time.perf_counter()
+                for _ in range(args.updates):
+                    a.train()
+                upd_t = time.perf_counter() - t
+                a.logger.epoch_dict.clear()
+
+                # greedy actions, since exploration may skip the forward pass
+                a.mode, act_t = "test", []
+                for _ in range(args.acts):
+                    t = time.perf_counter()
+                    a.select_action(**act_args)
+                    act_t.append(time.perf_counter() - t)
+                a.mode = "train"
+
+                results[f"{agent}/bs{batch_size}/t{threads}"] = {
+                    "status"       : "ok",
+                    "updates_per_s": args.updates / upd_t,
+                    "act_ms_p50"   : 1000 * np.percentile(act_t, 50),
+                    "act_ms_p99"   : 1000 * np.percentile(act_t, 99),
+                    "peak_rss_mb"  : peak_rss_mb(),
+                    "agent_rss_mb" : peak_rss_mb() - rss_before,
+                    **info}
+
+    except BaseException as e:
+        results = {f"{agent}/bs{batch_size}/t{threads}": {"status": "error", "error": f"{type(e).__name__}: {e}"[:600]}
+                   for threads in args.threads}
+    q.put(results)
+
+
+def run(agents: list, args) -> dict:
+    ctx     = mp.get_context("spawn")
+    kinds   = available_agents()
+    results = {}
+
+    for agent in agents:
+        kind = "continuous" if agent in kinds["continuous"] else "discrete"
+        configs = find_configs(agent, kind)
+
+        for batch_size in args.batch_sizes:
+            q = ctx.Queue()
+            p = ctx.Process(target=_bench_agent, args=(agent, kind, configs, batch_size, args, q))
+            p.start()
+            try:
+                res = q.get(timeout=args.timeout)
+            except Exception:
+                res = {f"{agent}/bs{batch_size}/t{threads}": {"status": "timeout",
+                                                               "error" : f"no result within {args.timeout} s"}
+                       for threads in args.threads}
+            p.join(timeout=5)
+            if p.is_alive():
+                p.kill()
+
+            results.update(res)
+            for case, r in res.items():
+                if r["status"] == "ok":
+                    print(f"{case:<32} {r['updates_per_s']:>10.1f} {r['act_ms_p50']:>10.3f} {r['act_ms_p99']:>10.3f}"
+                          f" {r['peak_rss_mb']:>9.1f}")
+                else:
+                    print(f"{case:<32} {r['status']}: {r['error']}")
+
+    return results
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--agents", type=str, nargs="+", default=None, help="agent names, defaults to all agents")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[32, 128, 512])
+    parser.add_argument("--threads", type=int, nargs="+", default=None, help="torch threads, defaults to 1 and all CPUs")
+    parser.add_argument("--updates", type=int, default=200, help="timed train() calls per case")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed train() calls per case")
+    parser.add_argument("--acts", type=int, default=1000, help="timed select_action() calls per case")
+    parser.add_argument("--fill", type=int, default=10000, help="synthetic transitions in the replay buffer")
+    parser.add_argument("--p_done", type=float, default=0.01, help="probability of an episode end per transition")
+    parser.add_argument("--state_dim", type=int, default=32, help="state dimension if the env cannot be built")
+    parser.add_argument("--num_actions", type=int, default=3, help="action dimension if the env cannot be built")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=900, help="seconds per agent and batch size")
+    parser.add_argument("--out", type=str, default="agent_bench.json", help="path of the JSON report")
+    parser.add_argument("--baseline", type=str, default=None, help="report to compare with")
+    parser.add_argument("--update_baseline", action="store_true", help="write the report to '--baseline' instead")
+    parser.add_argument("--tolerance", type=float, default=None, help="relative tolerance of all metrics")
+    args = parser.parse_args()
+
+    args.threads = args.threads or sorted({1, os.cpu_count() or 1})
+    kinds  = available_agents()
+    agents = args.agents or kinds["continuous"] + kinds["discrete"]
+
+    unknown = [agent for agent in agents if agent not in kinds["continuous"] + kinds["discrete"]]
+    assert not unknown, f"Unknown agents {unknown}. Pick from {kinds['continuous'] + kinds['discrete']} please."
+
+    print(f"{'agent/batch size/threads':<32} {'updates/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'RSS (MB)':>9}")
+    results = run(agents, args)
+
+    report = {"system": system_info(),
+              "settings": {key: getattr(args, key) for key in ["batch_sizes", "threads", "updates", "warmup", "acts", "fill",
+                                                               "p_done", "seed"]},
+              "results": results}
+    write_report(report, args.out)
+    print(f"Report written to {args.out}.")
+
+    if args.baseline is None:
+        return
+
+    if args.update_baseline:
+        write_report(report, args.baseline)
+        print(f"Baseline written to {args.baseline}.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    metrics = {key: (better, tol if args.tolerance is None else args.tolerance) for key, (better, tol) in METRICS.items()}
+    regressions = compare_to_baseline(results, baseline["results"], metrics)
+
+    if regressions:
+        print("Regressions compared to the baseline:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("No regressions compared to the baseline.")
+
+
+if __name__ == "__main__":
+    main()
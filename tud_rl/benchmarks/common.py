@@ -0,0 +1,65 @@
+"""
+Helpers shared by the benchmarks: system information, JSON reports and the comparison against a stored baseline.
+"""
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+
+def system_info() -> dict:
+    """Versions and machine details stored with every report, since timings are only comparable on the same setup."""
+    import gym
+    import torch
+
+    return {"time"     : time.strftime("%Y-%m-%d %H:%M:%S"),
+            "platform" : platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python"   : sys.version.split()[0],
+            "numpy"    : np.__version__,
+            "torch"    : torch.__version__,
+            "gym"      : gym.__version__}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def write_report(report: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4)
+
+
+def compare_to_baseline(results: dict, baseline: dict, metrics: dict) -> list:
+    """Compares the 'results' of a report with the ones of a 'baseline' report, both dicts of case: dict of metric: value.
+    'metrics' maps each compared metric to ("higher" or "lower", tolerance), i.e., whether larger values are better and
+    the tolerated relative deterioration. Returns the regressions as list of messages. Cases which were run successfully
+    in the baseline but failed now are regressions as well, cases missing in either report are ignored."""
+    regressions = []
+
+    for case, base in baseline.items():
+        if case not in results or base.get("status") != "ok":
+            continue
+
+        new = results[case]
+        if new.get("status") != "ok":
+            regressions.append(f"{case}: {new.get('status')} ({new.get('error', '')}), was ok in the baseline")
+            continue
+
+        for metric, (better, tol) in metrics.items():
+            if metric not in base or metric not in new:
+                continue
+
+            b, n = base[metric], new[metric]
+            if (better == "higher" and n < b * (1 - tol)) or (better == "lower" and n > b * (1 + tol)):
+                regressions.append(f"{case}: {metric} {n:.4g} vs. {b:.4g} in the baseline (tolerance {tol:.0%})")
+
+    return regressions
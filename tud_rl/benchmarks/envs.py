@@ -0,0 +1,293 @@
+"""
+Throughput benchmark of the environments registered in `tud_rl/__init__.py`. Each env is built in a fresh process with
+the `env_kwargs` of the first config in `tud_rl/configs` using it (constructor defaults otherwise), and the benchmark
+measures the build time, the reset latency, the steps per second under random actions and the peak RSS of the process.
+
+Data files of the configs which do not exist locally are replaced by synthetic stubs (AIS trajectories, global path,
+depth, current, wind and wave data), see STUBS. Envs which cannot be built, e.g., due to missing packages or weights,
+are reported with their error.
+
+The results are written to a JSON report and optionally compared with a baseline report, in which case the exit code is
+1 if an env got slower, needs more memory, or fails although it ran in the baseline.
+
+Usage:
+    python -m tud_rl.benchmarks.envs --out env_bench.json --baseline env_baseline.json [--update_baseline]
+"""
+import glob
+import json
+import logging
+import multiprocessing as mp
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import yaml
+
+from tud_rl.benchmarks.common import compare_to_baseline, peak_rss_mb, system_info, write_report
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "configs")
+
+# compared metrics with the direction of improvement and the default tolerance
+METRICS = {"steps_per_s"  : ("higher", 0.2),
+           "reset_ms_mean": ("lower", 0.2),
+           "peak_rss_mb"  : ("lower", 0.1)}
+
+# envs used by the configs but not registered in tud_rl/__init__.py
+UNREGISTERED = {"AIS-Env-v0": "AIS_Env"}
+
+
+# ---------------------------- stubs of missing data files -------------------------------
+# a straight global path heading north on the Elbe, the data grids cover it with a margin
+_LAT0, _LON0, _N_WPS, _WP_DIST = 53.50, 9.90, 400, 50.0
+
+
+def _grid():
+    lat = np.arange(_LAT0 - 0.05, _LAT0 + _N_WPS * _WP_DIST / 111_320 + 0.05, 0.002)
+    lon = np.arange(_LON0 - 0.05, _LON0 + 0.05, 0.002)
+    return lat, lon
+
+
+def _stub_global_path():
+    lat = _LAT0 + np.arange(_N_WPS) * _WP_DIST / 111_320
+    return {"lat": lat, "lon": np.full(_N_WPS, _LON0)}
+
+
+def _stub_depth():
+    lat, lon = _grid()
+    return {"lat": lat, "lon": lon, "data": np.full((len(lat), len(lon)), 20.0)}
+
+
+def _stub_current_or_wind(speed):
+    lat, lon = _grid()
+    return {"lat": lat, "lon": lon, "speed_mps": np.full((len(lat), len(lon)), speed), "angle": np.zeros((len(lat), len(lon)))}
+
+
+def _stub_waves():
+    lat, lon = _grid()
+    shape = (len(lat), len(lon))
+    return {"lat": lat, "lon": lon, "angle": np.zeros(shape), "height": np.full(shape, 0.5), "period": np.full(shape, 5.0),
+            "length": np.full(shape, 40.0)}
+
+
+def _stub_ais(n_trajs=20, n_half=200, dt=5, v=5.0):
+    """Trajectories going east and curving north and west, the turning point is where the east speed is zero."""
+    t = np.arange(2 * n_half)
+    ve = v * (n_half - t) / n_half
+    vn = v * (1 - np.abs(n_half - t) / n_half)
+
+    trajs = []
+    for _ in range(n_trajs):
+        trajs.append({"e": 2000 + np.cumsum(ve * dt), "n": 6000 + np.random.uniform(-500, 500) + np.cumsum(vn * dt)})
+    return trajs
+
+
+STUBS = {"AIS_path"         : _stub_ais,
+         "global_path_file" : _stub_global_path,
+         "depth_data_file"  : _stub_depth,
+         "current_data_file": lambda: _stub_current_or_wind(0.5),
+         "wind_data_file"   : lambda: _stub_current_or_wind(5.0),
+         "wave_data_file"   : _stub_waves}
+
+# optional model files which the envs accept as None
+OPTIONAL_FILES = ["supervised_path"]
+
+
+def config_kwargs() -> dict:
+    """The 'env_kwargs' of the first config in alphabetical order using an env, keyed by env name."""
+    kwargs = {}
+    for path in sorted(glob.glob(os.path.join(CONFIG_DIR, "**", "*.yaml"), recursive=True)):
+        with open(path) as f:
+            env = (yaml.safe_load(f) or {}).get("env", {})
+        if env.get("name") and env["name"] not in kwargs:
+            kwargs[env["name"]] = {"env_kwargs": env.get("env_kwargs") or {}, "config": os.path.relpath(path, CONFIG_DIR)}
+    return kwargs
+
+
+def stub_missing_files(env_kwargs: dict, stub_dir: str) -> list:
+    """Replaces paths of 'env_kwargs' to missing files by stubs written to 'stub_dir'. Returns the replaced keys."""
+    stubbed = []
+    for key, val in env_kwargs.items():
+        if not isinstance(val, str) or os.path.isfile(val):
+            continue
+
+        if key in STUBS:
+            path = os.path.join(stub_dir, f"{key}.pickle")
+            with open(path, "wb") as f:
+                pickle.dump(STUBS[key](), f)
+            env_kwargs[key] = path
+            stubbed.append(key)
+
+        elif key in OPTIONAL_FILES:
+            env_kwargs[key] = None
+            stubbed.append(key)
+
+    return stubbed
+
+
+def _specs() -> list:
+    import gym
+    registry = gym.envs.registry
+    return list(registry.values() if isinstance(registry, dict) else registry.all())
+
+
+def registered_envs() -> list:
+    import tud_rl
+    return sorted(spec.id for spec in _specs() if str(spec.entry_point).startswith(tud_rl.loc))
+
+
+def _bench_env(name: str, env_kwargs: dict, args, q) -> None:
+    """Process target: builds and runs env 'name' and puts the results into 'q'."""
+    res = {"status": "ok"}
+    try:
+        import gym
+
+        import tud_rl
+        tud_rl.logger.setLevel(logging.WARNING)
+        import tud_rl.envs
+
+        if name in UNREGISTERED and name not in [spec.id for spec in _specs()]:
+            gym.register(id=name, entry_point=tud_rl.loc + UNREGISTERED[name])
+
+        # tud_rl.envs skips env modules whose imports fail
+        cls_name = str(gym.spec(name).entry_point).split(":")[-1]
+        if not hasattr(tud_rl.envs, cls_name):
+            q.put({"status": "unavailable", "error": f"{cls_name} could not be imported, see the import warnings"})
+            return
+
+        np.random.seed(args.seed)
+        random.seed(args.seed)
+        rss_before = peak_rss_mb()
+
+        t = time.perf_counter()
+        env = gym.make(name, **env_kwargs)
+        res["build_s"] = time.perf_counter() - t
+
+        if hasattr(env, "seed"):
+            env.seed(args.seed)
+        env.action_space.seed(args.seed)
+
+        # reset latency
+        reset_t = []
+        for _ in range(args.resets):
+            t = time.perf_counter()
+            env.reset()
+            reset_t.append(time.perf_counter() - t)
+
+        # random actions, episodes end with 'done' or after 'max_episode_steps'
+        max_steps = getattr(env, "_max_episode_steps", None) or args.max_episode_steps
+        step_t, epi_steps = [], 0
+        env.reset()
+
+        # multi-agent envs take one action per agent
+        N_agents = getattr(env.unwrapped, "N_agents", None)
+
+        for _ in range(args.steps):
+            a = env.action_space.sample() if N_agents is None else np.array([env.action_space.sample() for _ in range(N_agents)])
+
+            t = time.perf_counter()
+            _, _, d, _ = env.step(a)
+            step_t.append(time.perf_counter() - t)
+
+            epi_steps += 1
+            if np.any(d) or epi_steps >= max_steps:
+                env.reset()
+                epi_steps = 0
+
+        res.update({"reset_ms_mean": 1000 * np.mean(reset_t),
+                    "reset_ms_p95" : 1000 * np.percentile(reset_t, 95),
+                    "steps_per_s"  : len(step_t) / sum(step_t),
+                    "step_ms_p95"  : 1000 * np.percentile(step_t, 95),
+                    "peak_rss_mb"  : peak_rss_mb(),
+                    "env_rss_mb"   : peak_rss_mb() - rss_before})
+        env.close()
+
+    except BaseException as e:
+        res = {"status": "error", "error": f"{type(e).__name__}: {e}"[:300]}
+    q.put(res)
+
+
+def run(envs: list, args) -> dict:
+    ctx     = mp.get_context("spawn")
+    configs = config_kwargs()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as stub_dir:
+        for name in envs:
+            cfg = configs.get(name, {"env_kwargs": {}, "config": None})
+            env_kwargs = dict(cfg["env_kwargs"])
+            stubbed = stub_missing_files(env_kwargs, stub_dir)
+
+            q = ctx.Queue()
+            p = ctx.Process(target=_bench_env, args=(name, env_kwargs, args, q))
+            p.start()
+            try:
+                res = q.get(timeout=args.timeout)
+            except Exception:
+                res = {"status": "timeout", "error": f"no result within {args.timeout} s"}
+            p.join(timeout=5)
+            if p.is_alive():
+                p.kill()
+
+            results[name] = {**res, "config": cfg["config"], "stubs": stubbed}
+
+            if res["status"] == "ok":
+                print(f"{name:<36} {res['reset_ms_mean']:>10.3f} {res['steps_per_s']:>12.1f} {res['step_ms_p95']:>10.3f}"
+                      f" {res['peak_rss_mb']:>9.1f}")
+            else:
+                print(f"{name:<36} {res['status']}: {res['error']}")
+
+    return results
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--envs", type=str, nargs="+", default=None, help="env names, defaults to all registered envs")
+    parser.add_argument("--steps", type=int, default=2000, help="random steps per env")
+    parser.add_argument("--resets", type=int, default=20, help="timed resets per env")
+    parser.add_argument("--max_episode_steps", type=int, default=500, help="episode length if the env defines none")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=900, help="seconds per env")
+    parser.add_argument("--out", type=str, default="env_bench.json", help="path of the JSON report")
+    parser.add_argument("--baseline", type=str, default=None, help="report to compare with")
+    parser.add_argument("--update_baseline", action="store_true", help="write the report to '--baseline' instead")
+    parser.add_argument("--tolerance", type=float, default=None, help="relative tolerance of all metrics")
+    args = parser.parse_args()
+
+    envs = args.envs or registered_envs() + sorted(UNREGISTERED)
+
+    print(f"{'env':<36} {'reset (ms)':>10} {'steps/s':>12} {'p95 (ms)':>10} {'RSS (MB)':>9}")
+    results = run(envs, args)
+
+    report = {"system": system_info(),
+              "settings": {"steps": args.steps, "resets": args.resets, "seed": args.seed},
+              "results": results}
+    write_report(report, args.out)
+    print(f"Report written to {args.out}.")
+
+    if args.baseline is None:
+        return
+
+    if args.update_baseline:
+        write_report(report, args.baseline)
+        print(f"Baseline written to {args.baseline}.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    metrics = {key: (better, tol if args.tolerance is None else args.tolerance) for key, (better, tol) in METRICS.items()}
+    regressions = compare_to_baseline(results, baseline["results"], metrics)
+
+    if regressions:
+        print("Regressions compared to the baseline:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("No regressions compared to the baseline.")
+
+
+if __name__ == "__main__":
+    main()
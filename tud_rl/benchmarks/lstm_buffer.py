@@ -0,0 +1,118 @@
+"""
+Benchmarks the history extraction of `UniformReplayBuffer_LSTM.sample()` against the former
+per-element loop implementation and checks that both return identical tensors.
+
+Usage:
+    python -m tud_rl.benchmarks.lstm_buffer
+"""
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+
+from tud_rl.common.buffer import UniformReplayBuffer_LSTM
+
+
+def loop_sample(buf: UniformReplayBuffer_LSTM, bat_indices: np.ndarray) -> tuple:
+    """Reference implementation: the loop-based history extraction used before vectorization."""
+    H = buf.history_length
+    B = len(bat_indices)
+
+    s_hist = np.zeros((B, H, buf.state_shape), dtype=np.float32)
+    a_hist = np.zeros((B, H, 1), dtype=np.int64) if buf.disc_actions else np.zeros((B, H, buf.action_dim), dtype=np.float32)
+    hist_len = np.ones(B, dtype=np.int64) * H
+
+    for i, b_idx in enumerate(bat_indices):
+        s_hist[i, :, :] = buf.s[(b_idx - H) : b_idx, :]
+        a_hist[i, :, :] = buf.a[(b_idx - H) : b_idx, :]
+
+        for j in range(1, H + 1):
+            if buf.d[b_idx - j] == True:
+                hist_len[i] = j - 1
+                s_hist[i, : (H - j + 1), :] = 0.0
+                a_hist[i, : (H - j + 1), :] = 0
+                s_hist[i] = np.roll(s_hist[i], shift=-(H - j + 1), axis=0)
+                a_hist[i] = np.roll(a_hist[i], shift=-(H - j + 1), axis=0)
+                break
+
+    s2_hist = np.zeros((B, H, buf.state_shape), dtype=np.float32)
+    a2_hist = np.zeros((B, H, 1), dtype=np.int64) if buf.disc_actions else np.zeros((B, H, buf.action_dim), dtype=np.float32)
+    hist_len2 = np.ones(B, dtype=np.int64) * H
+
+    for i, b_idx in enumerate(bat_indices):
+        s2_hist[i, :, :] = buf.s[(b_idx - H + 1) : (b_idx + 1), :]
+        a2_hist[i, :, :] = buf.a[(b_idx - H + 1) : (b_idx + 1), :]
+
+        for j in range(1, H):
+            if buf.d[b_idx - j] == True:
+                hist_len2[i] = j
+                s2_hist[i, : (H - j), :] = 0.0
+                a2_hist[i, : (H - j), :] = 0
+                s2_hist[i] = np.roll(s2_hist[i], shift=-(H - j), axis=0)
+                a2_hist[i] = np.roll(a2_hist[i], shift=-(H - j), axis=0)
+                break
+
+    return (torch.tensor(s_hist), torch.tensor(a_hist), torch.tensor(hist_len),
+            torch.tensor(s2_hist), torch.tensor(a2_hist), torch.tensor(hist_len2))
+
+
+def fill_buffer(buf: UniformReplayBuffer_LSTM, n: int, p_done: float) -> None:
+    for _ in range(n):
+        a = np.random.randint(0, 5) if buf.disc_actions else np.random.uniform(-1, 1, size=buf.action_dim)
+        buf.add(s=np.random.randn(buf.state_shape), a=a, r=np.random.randn(), s2=np.random.randn(buf.state_shape),
+                d=np.random.binomial(1, p_done))
+
+
+def timeit(fnc, repeats: int) -> float:
+    """Returns the mean wall-clock time of 'fnc' in milliseconds."""
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fnc()
+    return (time.perf_counter() - t0) / repeats * 1000
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--history_lengths", type=int, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--state_shape", type=int, default=64)
+    parser.add_argument("--buffer_length", type=int, default=100_000)
+    parser.add_argument("--p_done", type=float, default=0.05)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'batch':>6} {'hist':>5} {'loop (ms)':>10} {'vect (ms)':>10} {'speedup':>8} {'identical':>10}")
+
+    for history_length in args.history_lengths:
+        for disc_actions in [False, True]:
+            buf = UniformReplayBuffer_LSTM(state_type="feature", state_shape=args.state_shape, buffer_length=args.buffer_length,
+                                           batch_size=args.batch_sizes[0], device=torch.device("cpu"), disc_actions=disc_actions,
+                                           history_length=history_length, action_dim=3)
+            fill_buffer(buf, n=args.buffer_length, p_done=args.p_done)
+
+            # check equality on identical indices
+            for batch_size in args.batch_sizes:
+                buf.batch_size = batch_size
+                np.random.seed(batch_size)
+                new = buf.sample()[:6]
+                np.random.seed(batch_size)
+                ind = np.random.randint(low=history_length, high=buf.size, size=batch_size)
+                old = loop_sample(buf, ind)
+                identical = all(torch.equal(x, y) and x.dtype == y.dtype for x, y in zip(new, old))
+                assert identical, f"Mismatch for batch_size={batch_size}, history_length={history_length}."
+
+            # timing only for continuous actions, the discrete case behaves alike
+            if disc_actions:
+                continue
+
+            for batch_size in args.batch_sizes:
+                buf.batch_size = batch_size
+                ind = np.random.randint(low=history_length, high=buf.size, size=batch_size)
+                t_loop = timeit(lambda: loop_sample(buf, ind), repeats=args.repeats)
+                t_vect = timeit(buf.sample, repeats=args.repeats)
+                print(f"{batch_size:>6} {history_length:>5} {t_loop:>10.3f} {t_vect:>10.3f} {t_loop / t_vect:>7.1f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
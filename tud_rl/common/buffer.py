@@ -1,44 +1,267 @@
+import json
+import os
+import queue
+import threading
+from collections import deque
+
 import numpy as np
 import torch
 
 
 class UniformReplayBuffer:
-    """A simple replay buffer with uniform sampling."""
-    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim=None):
+    """A simple replay buffer with uniform sampling.
+    
+    'storage' selects how transitions are stored and batches are built:
+        'numpy':  fancy-index the numpy arrays and copy the result into new tensors (default).
+        'torch':  the arrays are shared zero-copy with torch tensors and batches are gathered via index_select into
+                  preallocated output tensors, which are pinned when sampling for a GPU. The output tensors are reused,
+                  so a batch is only valid until the next call of sample().
+        'memmap': the arrays are memory-mapped .npy files in 'buffer_dir', so only the sampled rows are paged into RAM.
+                  flush() writes them to disk together with the ring-buffer metadata.
+    
+    If 'compact' is True, s2 is not stored since it usually equals the s of the next transition. Instead, 'nxt' holds for 
+    each transition the row of its successor in 's' or, if the next state is a final observation (episode end), -(k+1) for 
+    slot k of the small, growing array 's_final'. s2 is rebuilt at sample time.
+
+    'image_storage' sets the format of image states: 'float' (float32), 'uint8' for integer-valued pixels or 'packbits' for 
+    binary channels such as in MinAtar, which stores one bit per pixel via np.packbits. Only the sampled batch is converted 
+    back to float32.
+
+    If 'n_steps' > 1, transitions are first collected in a small per-episode queue and stored as n-step transitions
+    (s_t, a_t, R_n, s_{t+n}, d, gamma^n) with R_n = sum_k gamma^k r_{t+k}. Near the episode end, the return is truncated 
+    and 'g' holds the discount gamma^k of the actually used k < n steps. sample() then additionally returns 'g'."""
+    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim=None, storage="numpy",
+                 buffer_dir=None, compact=False, image_storage="float", n_steps=1, gamma=None):
+        assert storage in ["numpy", "torch", "memmap"], "Pick 'numpy', 'torch' or 'memmap' as storage, please."
+        assert storage != "memmap" or buffer_dir is not None, "A memory-mapped buffer needs a 'buffer_dir'."
+        assert not (compact and storage == "memmap"), "A compact buffer cannot be memory-mapped."
+        assert image_storage in ["float", "uint8", "packbits"], "Pick 'float', 'uint8' or 'packbits' as image_storage, please."
+        assert n_steps >= 1, "'n_steps' must be at least 1."
+        assert n_steps == 1 or gamma is not None, "N-step returns need a discount factor 'gamma'."
+        assert n_steps == 1 or not compact, "A compact buffer cannot store n-step transitions."
+
         self.state_type  = state_type
         self.state_shape = state_shape
         self.max_size    = buffer_length
         self.batch_size  = batch_size
         self.ptr         = 0
         self.size        = 0
+        self.n_added     = 0
         self.device      = device
+        self.storage     = storage
+        self.buffer_dir  = buffer_dir
+        self.compact     = compact
+        self.n_steps     = n_steps
+        self.gamma       = gamma
+        self.reuse_out   = True     # torch storage: gather batches into reused output tensors
+        self._keys       = []
+
+        # feature states are always stored as float32
+        self.image_storage = image_storage if state_type == "image" else "float"
+
+        if storage == "memmap":
+            os.makedirs(buffer_dir, exist_ok=True)
         
         if state_type == "image":
-            self.s  = np.zeros((self.max_size, *state_shape), dtype=np.float32)
-            self.s2 = np.zeros((self.max_size, *state_shape), dtype=np.float32)
+            if self.image_storage == "packbits":
+                row_shape, dtype = (int(np.ceil(np.prod(state_shape) / 8)),), np.uint8
+            else:
+                row_shape, dtype = state_shape, (np.uint8 if self.image_storage == "uint8" else np.float32)
+
+            self.s  = self._zeros("s", (self.max_size, *row_shape), dtype)
+            if not compact:
+                self.s2 = self._zeros("s2", (self.max_size, *row_shape), dtype)
 
         elif state_type == "feature":
-            self.s  = np.zeros((self.max_size, state_shape), dtype=np.float32)
-            self.s2 = np.zeros((self.max_size, state_shape), dtype=np.float32)
+            self.s  = self._zeros("s", (self.max_size, state_shape), np.float32)
+            if not compact:
+                self.s2 = self._zeros("s2", (self.max_size, state_shape), np.float32)
+
+        if compact:
+            self.nxt      = self._zeros("nxt", (self.max_size,), np.int64)
+            self.s_final  = None   # allocated at the first add, since subclasses may change the shape of s
+            self._free    = []     # unused slots of s_final
+            self._pending = None   # slot holding s2 of the latest transition until its successor is known
         
         if disc_actions:
-            self.a = np.zeros((self.max_size, 1), dtype=np.int64)
+            self.a = self._zeros("a", (self.max_size, 1), np.int64)
         else:
-            self.a = np.zeros((self.max_size, action_dim), dtype=np.float32)
+            self.a = self._zeros("a", (self.max_size, action_dim), np.float32)
+
+        self.r  = self._zeros("r", (self.max_size, 1), np.float32)
+        self.d  = self._zeros("d", (self.max_size, 1), np.float32)
+
+        if n_steps > 1:
+            self.g       = self._zeros("g", (self.max_size, 1), np.float32)
+            self._nstep  = deque()   # 1-step transitions of the current episode which are not yet stored
 
-        self.r  = np.zeros((self.max_size, 1), dtype=np.float32)
-        self.d  = np.zeros((self.max_size, 1), dtype=np.float32)
+    def _zeros(self, key, shape, dtype):
+        """Allocates the zero-initialized storage array of attribute 'key', as .npy file in 'buffer_dir' for memmap storage."""
+        if key not in self._keys:
+            self._keys.append(key)
+
+        if self.storage == "memmap":
+            return np.lib.format.open_memmap(os.path.join(self.buffer_dir, f"{key}.npy"), mode="w+", dtype=dtype, shape=shape)
+        return np.zeros(shape, dtype=dtype)
     
     def add(self, s, a, r, s2, d):
         """s and s2 are np.arrays of shape (in_channels, height, width) or (state_shape,)."""
+        if self.n_steps == 1:
+            return self._store(s, a, r, s2, d)
+
+        # a new episode started without a done flag (e.g., time limit): the previous one is stored with truncated returns
+        if self._nstep and not np.array_equal(self._nstep[-1][3], s):
+            self._flush_nstep()
+
+        self._nstep.append((np.array(s), np.array(a), r, np.array(s2), d))
+
+        if d:
+            self._flush_nstep()
+        elif len(self._nstep) == self.n_steps:
+            self._store_nstep()
+
+    def add_batch(self, s, a, r, s2, d):
+        """Adds M transitions at once, equivalent to M calls of add() in the given order. All arguments are np.arrays with
+        leading dimension M, e.g., s of shape (M, in_channels, height, width) or (M, state_shape). Each storage array is 
+        written with at most two slice assignments, since the rows wrap around at the end of the ring buffer. Batches
+        larger than the buffer, e.g., long episodes, are written in chunks of at most 'max_size' transitions."""
+        if self.n_steps == 1:
+            for i in range(0, len(s), self.max_size):
+                j = slice(i, i + self.max_size)
+                self._store_batch(s[j], a[j], r[j], s2[j], d[j])
+            return
+
+        # n-step returns are accumulated sequentially
+        for i in range(len(s)):
+            UniformReplayBuffer.add(self, s[i], a[i], r[i], s2[i], d[i])
+
+    def _store_nstep(self):
+        """Stores the n-step transition starting with the oldest queued transition and removes the latter from the queue."""
+        s, a, _, _, _ = self._nstep[0]
+        _, _, _, s2, d = self._nstep[-1]
+        R = sum(self.gamma ** k * tr[2] for k, tr in enumerate(self._nstep))
+
+        self._store(s, a, R, s2, d, g=self.gamma ** len(self._nstep))
+        self._nstep.popleft()
+
+    def _flush_nstep(self):
+        """Stores all queued transitions of an ended episode."""
+        while self._nstep:
+            self._store_nstep()
+
+    def _store(self, s, a, r, s2, d, g=None):
+        """Writes a (possibly n-step) transition at position 'ptr'."""
+        s, s2 = self._encode(s), self._encode(s2)
+
+        if self.compact:
+            self._link(s, s2)
+        else:
+            self.s2[self.ptr] = s2
+
         self.s[self.ptr]  = s
         self.a[self.ptr]  = a
         self.r[self.ptr]  = r
-        self.s2[self.ptr] = s2
         self.d[self.ptr]  = d
 
-        self.ptr  = (self.ptr + 1) % self.max_size
-        self.size = min(self.size + 1, self.max_size)
+        if g is not None:
+            self.g[self.ptr] = g
+
+        self.ptr     = (self.ptr + 1) % self.max_size
+        self.size    = min(self.size + 1, self.max_size)
+        self.n_added += 1
+
+    def _store_batch(self, s, a, r, s2, d, g=None):
+        """Writes M transitions at positions 'ptr', ..., 'ptr' + M - 1 (modulo 'max_size')."""
+        M = len(s)
+        assert M <= self.max_size, "Cannot add more transitions at once than the buffer holds."
+
+        # compact storage links each transition to its successor, which is sequential
+        if self.compact:
+            for i in range(M):
+                UniformReplayBuffer._store(self, s[i], a[i], r[i], s2[i], d[i], None if g is None else g[i])
+            return
+
+        self._write("s", self._encode_batch(s))
+        self._write("s2", self._encode_batch(s2))
+        self._write("a", a)
+        self._write("r", r)
+        self._write("d", d)
+
+        if g is not None:
+            self._write("g", g)
+
+        self.ptr     = (self.ptr + M) % self.max_size
+        self.size    = min(self.size + M, self.max_size)
+        self.n_added += M
+
+    def _write(self, key, values):
+        """Writes rows into the storage array 'key' starting at 'ptr' and wrapping around at its end."""
+        arr    = getattr(self, key)
+        values = np.asarray(values).reshape((len(values), *arr.shape[1:]))
+        n_tail = min(len(values), self.max_size - self.ptr)
+
+        arr[self.ptr : self.ptr + n_tail] = values[:n_tail]
+        arr[: len(values) - n_tail]       = values[n_tail:]
+
+    def _link(self, s, s2):
+        """Compact storage: links the latest transition to the one added now if it continues with s, and keeps s2 of the
+        new transition in a slot of s_final until its successor is known."""
+        if self.s_final is None:
+            self.s_final = np.zeros((0, *self.s.shape[1:]), dtype=self.s.dtype)
+
+        # the overwritten transition releases its final observation
+        if self.size == self.max_size and self.nxt[self.ptr] < 0:
+            self._free.append(-self.nxt[self.ptr] - 1)
+
+        # latest transition continues with s: its next state is the row written now and the pending slot can be reused,
+        # otherwise its next state stays a final observation (compared in storage precision)
+        if self._pending is not None and np.array_equal(self.s_final[self._pending], np.asarray(s, dtype=self.s.dtype)):
+            self.nxt[(self.ptr - 1) % self.max_size] = self.ptr
+            slot = self._pending
+        else:
+            if not self._free:
+                self._grow_final()
+            slot = self._free.pop()
+
+        self.s_final[slot] = s2
+        self.nxt[self.ptr] = -(slot + 1)
+        self._pending      = slot
+
+    def _grow_final(self):
+        """Doubles the number of slots for final observations."""
+        n = len(self.s_final)
+        self.s_final = np.concatenate([self.s_final, np.zeros((max(n, 16), *self.s_final.shape[1:]), dtype=self.s_final.dtype)])
+        self._free.extend(range(len(self.s_final) - 1, n - 1, -1))
+
+    def _encode(self, s):
+        """Converts a state into its storage format. 'uint8' is handled by the assignment into the storage array."""
+        if self.image_storage == "packbits":
+            return np.packbits(np.asarray(s).reshape(-1) != 0)
+        return s
+
+    def _encode_batch(self, s):
+        """Converts M states, stacked along the first axis, into their storage format."""
+        if self.image_storage == "packbits":
+            return np.packbits(np.asarray(s).reshape(len(s), -1) != 0, axis=1)
+        return s
+
+    def _decode(self, rows):
+        """Converts stored states of a batch back to float32."""
+        if self.image_storage == "packbits":
+            n = int(np.prod(self.state_shape))
+            return np.unpackbits(rows, axis=-1, count=n).reshape(len(rows), *self.state_shape).astype(np.float32)
+
+        elif self.image_storage == "uint8":
+            return rows.astype(np.float32)
+        return rows
+
+    def _next_states(self, ind):
+        """Compact storage: rebuilds s2 for the transitions 'ind'."""
+        nxt = self.nxt[ind]
+        s2  = self.s[np.maximum(nxt, 0)]
+        fin = nxt < 0
+        s2[fin] = self.s_final[-nxt[fin] - 1]
+        return s2
     
     def sample(self):
         """Return sizes:
@@ -46,37 +269,287 @@ class UniformReplayBuffer:
         a:  torch.Size([batch_size, 1]) or torch.Size([batch_size, action_dim])
         r:  torch.Size([batch_size, 1])
         s2: torch.Size([batch_size, in_channels, height, width]) or torch.Size([batch_size, state_shape])
-        d:  torch.Size([batch_size, 1])"""
+        d:  torch.Size([batch_size, 1])
+        g:  torch.Size([batch_size, 1]), discount of s2, only if n_steps > 1"""
 
         # sample index
         ind = np.random.randint(low = 0, high = self.size, size = self.batch_size)
 
-        return (torch.tensor(self.s[ind]).to(self.device), 
-                torch.tensor(self.a[ind]).to(self.device), 
-                torch.tensor(self.r[ind]).to(self.device), 
-                torch.tensor(self.s2[ind]).to(self.device), 
-                torch.tensor(self.d[ind]).to(self.device))
+        return self._gather(ind, *self._sample_keys())
+
+    def _sample_keys(self):
+        return ("s", "a", "r", "s2", "d", "g") if self.n_steps > 1 else ("s", "a", "r", "s2", "d")
+
+    def _gather(self, ind, *keys):
+        """Returns the rows 'ind' of the storage arrays named in 'keys' as tensors on self.device."""
+        if self.storage != "torch":
+            return tuple(torch.tensor(self._rows(key, ind)).to(self.device) for key in keys)
+
+        if not hasattr(self, "_out"):
+            self._out = {}
+        pin = self.device.type == "cuda"
+        ind = torch.from_numpy(np.asarray(ind, dtype=np.int64))
+
+        batch = []
+        for key in keys:
+            if (key == "s2" and self.compact) or (key in ["s", "s2"] and self.image_storage == "packbits"):
+                batch.append(torch.from_numpy(self._rows(key, ind.numpy())).to(self.device))
+                continue
+
+            arr = getattr(self, key)
+            src = torch.from_numpy(arr)
+            out, event = self._out.get(key, (None, None))
+
+            if out is None or not self.reuse_out or out.shape != (len(ind), *arr.shape[1:]):
+                out = torch.empty((len(ind), *arr.shape[1:]), dtype=src.dtype, pin_memory=pin)
+
+            # the previous asynchronous host-to-device copy must be finished before overwriting the pinned output
+            elif event is not None:
+                event.synchronize()
+
+            torch.index_select(src, 0, ind, out=out)
+
+            if pin:
+                x = out.to(self.device, non_blocking=True)
+                event = torch.cuda.Event()
+                event.record()
+            else:
+                x = out
+            self._out[key] = (out, event)
+
+            # uint8 images are transferred as bytes and converted on the target device
+            if key in ["s", "s2"] and self.image_storage == "uint8":
+                x = x.float()
+            batch.append(x)
+
+        return tuple(batch)
+
+    def _rows(self, key, ind):
+        if key == "s2" and self.compact:
+            rows = self._next_states(ind)
+        else:
+            rows = getattr(self, key)[ind]
+
+        if key in ["s", "s2"]:
+            rows = self._decode(rows)
+        return rows
+
+    def __getstate__(self):
+        # reusable output tensors and cuda events are rebuilt on demand
+        state = self.__dict__.copy()
+        state.pop("_out", None)
+        return state
+
+    def __setstate__(self, state):
+        # buffers pickled before the storage options existed
+        state.setdefault("storage", "numpy")
+        state.setdefault("buffer_dir", None)
+        state.setdefault("compact", False)
+        state.setdefault("image_storage", "float")
+        state.setdefault("n_steps", 1)
+        state.setdefault("gamma", None)
+        state.setdefault("reuse_out", True)
+        state.setdefault("n_added", state["size"])
+        state.setdefault("_keys", [key for key in ["s", "s2", "a", "r", "d", "m"] if key in state])
+        self.__dict__.update(state)
+
+    def _on_restore(self):
+        """Called after the stored transitions were restored from disk via reopen() or a buffer checkpoint."""
+        pass
+
+    def flush(self):
+        """Writes a memory-mapped buffer to 'buffer_dir'. Arrays that were reopened from another directory via reopen()
+        are copied once and are memory-mapped from 'buffer_dir' afterwards."""
+        assert self.storage == "memmap", "Only memory-mapped buffers can be flushed."
+
+        for key in self._keys:
+            arr  = getattr(self, key)
+            path = os.path.join(self.buffer_dir, f"{key}.npy")
+
+            if os.path.abspath(arr.filename) == os.path.abspath(path):
+                arr.flush()
+            else:
+                np.save(path, arr)
+                setattr(self, key, np.load(path, mmap_mode="r+"))
+        self._out = {}
+
+        meta = {"class": type(self).__name__, "ptr": self.ptr, "size": self.size, "n_added": self.n_added, "max_size": self.max_size,
+                "keys": self._keys}
+        with open(os.path.join(self.buffer_dir, "meta.json.tmp"), "w") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(self.buffer_dir, "meta.json.tmp"), os.path.join(self.buffer_dir, "meta.json"))
+
+    def reopen(self, buffer_dir):
+        """Continues from a buffer written by flush() without loading it into RAM. The files are mapped copy-on-write, 
+        hence they stay read-only and new transitions only live in memory until the next flush()."""
+        with open(os.path.join(buffer_dir, "meta.json")) as f:
+            meta = json.load(f)
+
+        assert set(meta["keys"]) == set(self._keys), f"Cannot reopen a {meta['class']} as {type(self).__name__}."
+        assert meta["max_size"] == self.max_size, "The 'buffer_length' differs from the one of the reopened buffer."
+
+        for key in self._keys:
+            arr = np.load(os.path.join(buffer_dir, f"{key}.npy"), mmap_mode="c")
+            assert arr.shape == getattr(self, key).shape and arr.dtype == getattr(self, key).dtype, \
+                f"Array '{key}' of the reopened buffer does not match."
+            setattr(self, key, arr)
+        self._out = {}
+
+        self.ptr     = meta["ptr"]
+        self.size    = meta["size"]
+        self.n_added = meta.get("n_added", meta["size"])
+        self._on_restore()
+
+
+class SegmentTree:
+    """Array-backed binary segment tree over 'capacity' leaves. Node i has children 2i and 2i+1, the root is node 1, and
+    the leaves are stored at [n_leaves, 2 * n_leaves). All operations work on whole index arrays to avoid Python loops."""
+    def __init__(self, capacity, operation, neutral_element):
+        self.capacity = capacity
+        self.depth    = int(np.ceil(np.log2(max(capacity, 2))))
+        self.n_leaves = 2 ** self.depth
+        self.op       = operation
+        self.tree     = np.full(2 * self.n_leaves, neutral_element, dtype=np.float64)
+
+    @property
+    def root(self):
+        return self.tree[1]
+
+    def __getitem__(self, idx):
+        return self.tree[np.asarray(idx) + self.n_leaves]
+
+    def update(self, idx, values):
+        """Sets the leaves 'idx' (int or np.array) to 'values' and recomputes all affected parents, level by level."""
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1) + self.n_leaves
+        self.tree[idx] = values
+
+        for _ in range(self.depth):
+            idx = np.unique(idx // 2)
+            self.tree[idx] = self.op(self.tree[2 * idx], self.tree[2 * idx + 1])
+
+
+class SumTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity=capacity, operation=np.add, neutral_element=0.0)
+
+    def find(self, values):
+        """Returns for each prefix sum in 'values' (np.array) the index of the leaf in which it falls."""
+        values = np.array(values, dtype=np.float64)
+        idx = np.ones(len(values), dtype=np.int64)
+
+        # descend all prefix sums simultaneously
+        for _ in range(self.depth):
+            left     = 2 * idx
+            left_sum = self.tree[left]
+            go_right = values >= left_sum
+            values  -= left_sum * go_right
+            idx      = left + go_right
+
+        return idx - self.n_leaves
+
+
+class MinTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity=capacity, operation=np.minimum, neutral_element=np.inf)
+
+
+class PrioritizedReplayBuffer(UniformReplayBuffer):
+    """A replay buffer with proportional prioritization (Schaul et al. 2016). Priorities are kept in an array-backed
+    sum-tree, so sampling and priority updates are O(log n) and vectorized over the batch."""
+    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim=None,
+                 alpha=0.6, beta=0.4, beta_steps=1_000_000, eps=1e-6, storage="numpy", buffer_dir=None, compact=False,
+                 image_storage="float", n_steps=1, gamma=None):
+        super().__init__(state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim, storage, buffer_dir,
+                         compact, image_storage, n_steps, gamma)
+
+        self.alpha    = alpha
+        self.beta     = beta
+        self.beta_inc = (1.0 - beta) / beta_steps
+        self.eps      = eps
+
+        self.sum_tree = SumTree(self.max_size)
+        self.min_tree = MinTree(self.max_size)
+        self.max_prio = 1.0
+
+    def _store(self, s, a, r, s2, d, g=None):
+        """New transitions get the maximum priority seen so far to guarantee that they are replayed at least once."""
+        ind = self.ptr
+        super()._store(s, a, r, s2, d, g)
+        self._set_priorities(ind, self.max_prio ** self.alpha)
+
+    def _store_batch(self, s, a, r, s2, d, g=None):
+        ind = (self.ptr + np.arange(len(s))) % self.max_size
+        super()._store_batch(s, a, r, s2, d, g)
+        self._set_priorities(ind, self.max_prio ** self.alpha)
+
+    def _set_priorities(self, ind, p_alpha):
+        self.sum_tree.update(ind, p_alpha)
+        self.min_tree.update(ind, p_alpha)
+
+    def sample(self):
+        """Return sizes:
+        s:   torch.Size([batch_size, in_channels, height, width]) or torch.Size([batch_size, state_shape])
+        a:   torch.Size([batch_size, 1]) or torch.Size([batch_size, action_dim])
+        r:   torch.Size([batch_size, 1])
+        s2:  torch.Size([batch_size, in_channels, height, width]) or torch.Size([batch_size, state_shape])
+        d:   torch.Size([batch_size, 1])
+        g:   torch.Size([batch_size, 1]), discount of s2, only if n_steps > 1
+        w:   torch.Size([batch_size, 1]), importance-sampling weights
+        ind: np.array of shape (batch_size,), needed for 'update_priorities'"""
+
+        # stratified sampling: one prefix sum from each of batch_size equally sized segments
+        total  = self.sum_tree.root
+        bounds = np.linspace(0.0, total, self.batch_size + 1)
+        ind    = self.sum_tree.find(np.random.uniform(low=bounds[:-1], high=bounds[1:]))
+        ind    = np.minimum(ind, self.size - 1)
+
+        # importance-sampling weights, normalized by the largest possible weight
+        probs    = self.sum_tree[ind] / total
+        min_prob = self.min_tree.root / total
+        w = np.power(min_prob / probs, self.beta).astype(np.float32).reshape(-1, 1)
+
+        # anneal beta towards 1
+        self.beta = min(1.0, self.beta + self.beta_inc)
+
+        return (*self._gather(ind, *self._sample_keys()), torch.tensor(w).to(self.device), ind)
+
+    def update_priorities(self, ind, td_err):
+        """Sets new priorities for the sampled transitions 'ind' based on their absolute TD errors
+        (torch.Size([batch_size, 1]) or np.array of shape (batch_size,))."""
+        if isinstance(td_err, torch.Tensor):
+            td_err = td_err.detach().cpu().numpy()
+        p = np.abs(td_err).reshape(-1) + self.eps
+
+        self.max_prio = max(self.max_prio, p.max())
+        self._set_priorities(ind, np.power(p, self.alpha))
+
+    def _on_restore(self):
+        """Priorities are not persisted, so all restored transitions start with the maximum priority."""
+        self._set_priorities(np.arange(self.size), self.max_prio ** self.alpha)
 
 
 class MultiAgentUniformReplayBuffer(UniformReplayBuffer):
     """A simple replay buffer with uniform sampling for multi-agent scenarios."""
-    def __init__(self, N_agents, state_type, state_shape, buffer_length, batch_size, device, action_dim) -> None:
+    def __init__(self, N_agents, state_type, state_shape, buffer_length, batch_size, device, action_dim, storage="numpy",
+                 buffer_dir=None, compact=False) -> None:
         super().__init__(state_type=state_type, state_shape=state_shape, buffer_length=buffer_length, batch_size=batch_size,\
-             device=device, disc_actions=False, action_dim=action_dim)
+             device=device, disc_actions=False, action_dim=action_dim, storage=storage, buffer_dir=buffer_dir, compact=compact)
 
         self.N_agents = N_agents
 
         if state_type == "image":
-            self.s  = np.zeros((self.max_size, self.N_agents, *state_shape), dtype=np.float32)
-            self.s2 = np.zeros((self.max_size, self.N_agents, *state_shape), dtype=np.float32)
+            self.s  = self._zeros("s", (self.max_size, self.N_agents, *state_shape), np.float32)
+            if not compact:
+                self.s2 = self._zeros("s2", (self.max_size, self.N_agents, *state_shape), np.float32)
 
         elif state_type == "feature":
-            self.s  = np.zeros((self.max_size, self.N_agents, state_shape), dtype=np.float32)
-            self.s2 = np.zeros((self.max_size, self.N_agents, state_shape), dtype=np.float32)
+            self.s  = self._zeros("s", (self.max_size, self.N_agents, state_shape), np.float32)
+            if not compact:
+                self.s2 = self._zeros("s2", (self.max_size, self.N_agents, state_shape), np.float32)
         
-        self.a = np.zeros((self.max_size, self.N_agents, action_dim), dtype=np.float32)
-        self.r = np.zeros((self.max_size, self.N_agents, 1), dtype=np.float32)
-        self.d = np.zeros((self.max_size, 1), dtype=np.float32)
+        self.a = self._zeros("a", (self.max_size, self.N_agents, action_dim), np.float32)
+        self.r = self._zeros("r", (self.max_size, self.N_agents, 1), np.float32)
+        self.d = self._zeros("d", (self.max_size, 1), np.float32)
 
     def add(self, s, a, r, s2, d):
         """Args:
@@ -99,34 +572,49 @@ class MultiAgentUniformReplayBuffer(UniformReplayBuffer):
 
 class UniformReplayBuffer_BootDQN(UniformReplayBuffer):
     """A simple replay buffer with uniform sampling. Incorporates bootstrapping masks."""
-    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, K, mask_p):
+    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, K, mask_p, storage="numpy", buffer_dir=None,
+                 compact=False, image_storage="float"):
         super().__init__(state_type    = state_type,
                          state_shape   = state_shape, 
                          buffer_length = buffer_length, 
                          batch_size    = batch_size, 
                          device        = device,
-                         disc_actions  = True)
+                         disc_actions  = True,
+                         storage       = storage,
+                         buffer_dir    = buffer_dir,
+                         compact       = compact,
+                         image_storage = image_storage)
+        assert 0.0 < mask_p <= 1.0, "'mask_p' must be in (0, 1]."
+
         self.K          = K
         self.mask_p     = mask_p
-        self.m  = np.zeros((self.max_size, K), dtype=np.float32)
+        self.m  = self._zeros("m", (self.max_size, K), np.float32)
     
 
-    def add(self, s, a, r, s2, d):
+    def _store(self, s, a, r, s2, d, g=None):
         """s and s2 are np.arrays of shape (in_channels, height, width)  or (state_shape,)."""
-        self.s[self.ptr]  = s
-        self.a[self.ptr]  = a
-        self.r[self.ptr]  = r
-        self.s2[self.ptr] = s2
-        self.d[self.ptr]  = d
+        self.m[self.ptr] = self._draw_masks(1)[0]
+        super()._store(s, a, r, s2, d, g)
 
-        while True:
-            m = np.random.binomial(1, self.mask_p, size=self.K)
-            if 1 in m:
-                break
-        self.m[self.ptr] = m
+    def _store_batch(self, s, a, r, s2, d, g=None):
+        self._write("m", self._draw_masks(len(s)))
+        super()._store_batch(s, a, r, s2, d, g)
 
-        self.ptr  = (self.ptr + 1) % self.max_size
-        self.size = min(self.size + 1, self.max_size)
+    def _draw_masks(self, n):
+        """Draws n masks of K independent Bernoulli(mask_p) heads, conditioned on at least one active head. The first 
+        active head follows a truncated geometric distribution and is drawn by inversion, the heads after it are 
+        unconditioned Bernoulli draws. Returns an np.array of shape (n, K)."""
+        if self.mask_p == 1.0:
+            return np.ones((n, self.K), dtype=np.float32)
+
+        q     = 1.0 - self.mask_p
+        u     = np.random.uniform(size=(n, 1))
+        first = np.floor(np.log1p(-u * (1.0 - q ** self.K)) / np.log(q)).astype(np.int64)
+        first = np.minimum(first, self.K - 1)
+
+        heads = np.arange(self.K)[None, :]
+        m = (heads == first) | ((heads > first) & (np.random.uniform(size=(n, self.K)) < self.mask_p))
+        return m.astype(np.float32)
 
     
     def sample(self):
@@ -141,17 +629,14 @@ class UniformReplayBuffer_BootDQN(UniformReplayBuffer):
         # sample index
         ind = np.random.randint(low = 0, high = self.size, size = self.batch_size)
 
-        return (torch.tensor(self.s[ind]).to(self.device), 
-                torch.tensor(self.a[ind]).to(self.device), 
-                torch.tensor(self.r[ind]).to(self.device), 
-                torch.tensor(self.s2[ind]).to(self.device), 
-                torch.tensor(self.d[ind]).to(self.device),
-                torch.tensor(self.m[ind]).to(self.device))
+        return self._gather(ind, "s", "a", "r", "s2", "d", "m")
 
 
 class UniformReplayBuffer_LSTM(UniformReplayBuffer):
-    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, disc_actions, history_length, action_dim=None):
-        super().__init__(state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim)
+    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, disc_actions, history_length, action_dim=None,
+                 storage="numpy", buffer_dir=None, compact=False):
+        super().__init__(state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim, storage, buffer_dir,
+                         compact)
         
         self.action_dim     = action_dim
         self.disc_actions   = disc_actions
@@ -182,83 +667,25 @@ class UniformReplayBuffer_LSTM(UniformReplayBuffer):
         
         # ---------- direct extraction ---------
 
-        s  = self.s[bat_indices]
-        a  = self.a[bat_indices]
-        r  = self.r[bat_indices]
-        s2 = self.s2[bat_indices]
-        d  = self.d[bat_indices]
-        
-        # ---------- hist generation  --------
+        s, a, r, s2, d = self._gather(bat_indices, "s", "a", "r", "s2", "d")
 
-        # create empty histories
-        s_hist = np.zeros((self.batch_size, self.history_length, self.state_shape), dtype=np.float32)
-        
-        if self.disc_actions:
-            a_hist = np.zeros((self.batch_size, self.history_length, 1), dtype=np.int64)
-        else:
-            a_hist = np.zeros((self.batch_size, self.history_length, self.action_dim), dtype=np.float32)
-        
-        hist_len = np.ones(self.batch_size, dtype=np.int64) * self.history_length
-
-        # fill histories
-        for i, b_idx in enumerate(bat_indices):
-            
-            # take data
-            s_hist[i, :, :] = self.s[(b_idx - self.history_length) : b_idx, :]
-            a_hist[i, :, :] = self.a[(b_idx - self.history_length) : b_idx, :]
-
-            # truncate if done appeared
-            for j in range(1, self.history_length + 1):
-                
-                if self.d[b_idx - j] == True:
-                    
-                    # set history lengths
-                    hist_len[i]  = j - 1
-
-                    # set prior entries to zero when done appeared
-                    s_hist[i, : (self.history_length - j + 1) ,:] = 0.0
-                    a_hist[i, : (self.history_length - j + 1) ,:] = 0
-
-                    # move non-zero experiences to the beginning
-                    s_hist[i] = np.roll(s_hist[i], shift = -(self.history_length - j + 1), axis=0)
-                    a_hist[i] = np.roll(a_hist[i], shift = -(self.history_length - j + 1), axis=0)
-                    break
-        
-        # ---------- hist2 generation  --------
+        # ---------- episode boundaries --------
 
-        # create empty histories
-        s2_hist   = np.zeros((self.batch_size, self.history_length, self.state_shape), dtype=np.float32)
+        # done flags of the preceding transitions, column j-1 corresponds to index b_idx - j, shape (batch_size, history_length)
+        back = np.arange(1, self.history_length + 1)
+        prev_d = self.d[bat_indices[:, None] - back[None, :], 0] == 1.0
+        always = np.ones((self.batch_size, 1), dtype=bool)
 
-        if self.disc_actions:
-            a2_hist = np.zeros((self.batch_size, self.history_length, 1), dtype=np.int64)
-        else:
-            a2_hist = np.zeros((self.batch_size, self.history_length, self.action_dim), dtype=np.float32)
-
-        hist_len2 = np.ones(self.batch_size, dtype=np.int64) * self.history_length
-
-        # fill histories
-        for i, b_idx in enumerate(bat_indices):
-            
-            # take data
-            s2_hist[i, :, :] = self.s[(b_idx - self.history_length + 1) : (b_idx + 1), :]
-            a2_hist[i, :, :] = self.a[(b_idx - self.history_length + 1) : (b_idx + 1), :]
-            
-            # truncate if done appeared
-            for j in range(1, self.history_length):
-                
-                if self.d[b_idx - j] == True:
-                    
-                    # set history lengths
-                    hist_len2[i] = j
-
-                    # set prior entries to zero when done appeared
-                    s2_hist[i, : (self.history_length - j) ,:] = 0.0
-                    a2_hist[i, : (self.history_length - j) ,:] = 0
-
-                    # move non-zero experiences to the beginning
-                    s2_hist[i] = np.roll(s2_hist[i], shift= -(self.history_length - j), axis=0)
-                    a2_hist[i] = np.roll(a2_hist[i], shift= -(self.history_length - j), axis=0)
-                    break
+        # hist_len: number of transitions since the last done, capped at history_length (via the always-true last column)
+        hist_len = np.concatenate([prev_d, always], axis=1).argmax(axis=1).astype(np.int64)
+
+        # hist_len2: same for s2, which additionally contains the current transition (only the first 'history_length - 1' dones matter)
+        hist_len2 = np.concatenate([prev_d[:, :-1], always], axis=1).argmax(axis=1).astype(np.int64) + 1
+
+        # ---------- hist generation  --------
+
+        s_hist, a_hist = self._gather_hist(ends=bat_indices, hist_len=hist_len)
+        s2_hist, a2_hist = self._gather_hist(ends=bat_indices + 1, hist_len=hist_len2)
 
         return (torch.tensor(s_hist).to(self.device), 
                 torch.tensor(a_hist).to(self.device), 
@@ -266,27 +693,165 @@ class UniformReplayBuffer_LSTM(UniformReplayBuffer):
                 torch.tensor(s2_hist).to(self.device), 
                 torch.tensor(a2_hist).to(self.device), 
                 torch.tensor(hist_len2).to(self.device),
-                torch.tensor(s).to(self.device),
-                torch.tensor(a).to(self.device),
-                torch.tensor(r).to(self.device),
-                torch.tensor(s2).to(self.device),
-                torch.tensor(d).to(self.device))
+                s, a, r, s2, d)
+
+    def _gather_hist(self, ends, hist_len, length=None):
+        """Gathers for each batch element the 'hist_len' states and actions before index 'ends' (exclusive) into the first 
+        'hist_len' slots of a history with 'length' (default: history_length) slots. Remaining slots are zero."""
+        length = self.history_length if length is None else length
+
+        # buffer index of each history slot in the ring, shape (batch_size, length)
+        t = np.arange(length)[None, :]
+        idx = (ends[:, None] - hist_len[:, None] + t) % self.max_size
+        valid = t < hist_len[:, None]
+        idx = np.where(valid, idx, 0)
+
+        s_hist = np.where(valid[:, :, None], self.s[idx], 0.0).astype(np.float32)
+        a_hist = np.where(valid[:, :, None], self.a[idx], 0).astype(self.a.dtype)
+        return s_hist, a_hist
+
+
+class SequenceReplayBuffer_LSTM(UniformReplayBuffer_LSTM):
+    """Episode-indexed replay buffer for the recurrent agents. 'ep_t' holds the step of each transition within its episode,
+    so histories are cut at the episode start without scanning done flags. This also covers episodes ended by a time limit,
+    which are detected since s does not continue s2 of the previous transition, and rows overwritten in the ring. 
+    
+    If 'hidden_dims' is given, e.g. {"actor": 256, "critic": 512}, add() additionally stores the recurrent states of these 
+    nets before s was consumed, as recorded at collection time. sample() then appends a dict with the states stored at the
+    start of up to 'burn_in' steps preceding each history, together with these steps. The agent replays them without 
+    gradient to refresh the stale states, so that the histories are conditioned on the whole episode."""
+    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, disc_actions, history_length, action_dim=None,
+                 storage="numpy", buffer_dir=None, compact=False, burn_in=0, hidden_dims=None):
+        assert burn_in == 0 or hidden_dims is not None, "Burn-in needs stored recurrent states."
+        super().__init__(state_type, state_shape, buffer_length, batch_size, device, disc_actions, history_length, action_dim,
+                         storage, buffer_dir, compact)
+
+        self.burn_in     = burn_in
+        self.hidden_dims = hidden_dims or {}
+        self.ep_t        = self._zeros("ep_t", (self.max_size,), np.int64)
+        self._last       = None     # s2 and d of the latest transition
+
+        for key, dim in self.hidden_dims.items():
+            setattr(self, f"h_{key}", self._zeros(f"h_{key}", (self.max_size, dim), np.float32))
+
+    def new_episode(self, s):
+        """Whether a transition starting in s begins a new episode."""
+        return self._last is None or bool(self._last[1]) or not np.array_equal(self._last[0], s)
+
+    def add(self, s, a, r, s2, d, hidden=None):
+        """hidden: dict with the recurrent state (np.array of shape (hidden_dim,)) for each key of 'hidden_dims'."""
+        self.ep_t[self.ptr] = 0 if self.new_episode(s) else self.ep_t[(self.ptr - 1) % self.max_size] + 1
+
+        for key in self.hidden_dims:
+            getattr(self, f"h_{key}")[self.ptr] = hidden[key]
+
+        self._last = (np.array(s2), d)
+        super().add(s, a, r, s2, d)
+
+    def add_batch(self, s, a, r, s2, d, hidden=None):
+        """Adds M consecutive transitions, see UniformReplayBuffer.add_batch(). 'hidden' holds np.arrays of shape 
+        (M, hidden_dim)."""
+        s, s2, d = np.asarray(s), np.asarray(s2), np.asarray(d).reshape(-1)
+        M = len(s)
+
+        if M > self.max_size:
+            for i in range(0, M, self.max_size):
+                j = slice(i, i + self.max_size)
+                self.add_batch(s[j], a[j], r[j], s2[j], d[j], None if hidden is None else {k: v[j] for k, v in hidden.items()})
+            return
+
+        # episode starts: s does not continue s2 of the previous transition
+        new     = np.empty(M, dtype=bool)
+        new[0]  = self.new_episode(s[0])
+        new[1:] = d[:-1].astype(bool) | np.any((s[1:] != s2[:-1]).reshape(M - 1, int(np.prod(s.shape[1:]))), axis=1)
+
+        # step within the episode, counted from the latest start or continuing the previous transition
+        pos   = np.arange(M)
+        start = np.maximum.accumulate(np.where(new, pos, -1))
+        ep_t  = np.where(start >= 0, pos - start, self.ep_t[(self.ptr - 1) % self.max_size] + 1 + pos)
+
+        self._write("ep_t", ep_t)
+        for key in self.hidden_dims:
+            self._write(f"h_{key}", hidden[key])
+
+        self._last = (np.array(s2[-1]), d[-1])
+        super().add_batch(s, a, r, s2, d)
+
+    def sample(self) -> tuple:
+        """Returns the tuple of UniformReplayBuffer_LSTM.sample(). With stored recurrent states, a dict is appended with:
+
+        s_burn:   torch.Size([batch_size, burn_in, state_shape])
+        a_burn:   torch.Size([batch_size, burn_in, action_dim or 1])
+        burn_len: torch.Size(batch_size)
+        <key>:    torch.Size([batch_size, hidden_dim]) for each key of 'hidden_dims'
+
+        The burn-in steps directly precede s_hist and '<key>' is the stored state before them. The same entries with suffix 
+        '2' refer to s2_hist.
+        """
+
+        # sample indices
+        ind = np.random.randint(low = 0, high = self.size, size = self.batch_size)
+
+        s, a, r, s2, d = self._gather(ind, "s", "a", "r", "s2", "d")
+
+        # steps before each transition which belong to its episode and were not yet overwritten
+        oldest = self.ptr if self.size == self.max_size else 0
+        avail  = np.minimum(self.ep_t[ind], (ind - oldest) % self.max_size)
+
+        # s_hist ends before the sampled transition, s2_hist contains it
+        n  = np.minimum(avail, self.burn_in + self.history_length)
+        n2 = np.minimum(avail + 1, self.burn_in + self.history_length)
+        hist_len, hist_len2 = np.minimum(n, self.history_length), np.minimum(n2, self.history_length)
+
+        s_hist, a_hist = self._gather_hist(ends=ind, hist_len=hist_len)
+        s2_hist, a2_hist = self._gather_hist(ends=ind + 1, hist_len=hist_len2)
+
+        batch = (torch.tensor(s_hist).to(self.device), 
+                 torch.tensor(a_hist).to(self.device), 
+                 torch.tensor(hist_len).to(self.device),
+                 torch.tensor(s2_hist).to(self.device), 
+                 torch.tensor(a2_hist).to(self.device), 
+                 torch.tensor(hist_len2).to(self.device),
+                 s, a, r, s2, d)
+
+        if not self.hidden_dims:
+            return batch
+
+        # burn-in steps and the stored states before them
+        s_burn, a_burn = self._gather_hist(ends=ind - hist_len, hist_len=n - hist_len, length=self.burn_in)
+        s_burn2, a_burn2 = self._gather_hist(ends=ind + 1 - hist_len2, hist_len=n2 - hist_len2, length=self.burn_in)
+
+        seq = dict(s_burn=s_burn, a_burn=a_burn, burn_len=n - hist_len, s_burn2=s_burn2, a_burn2=a_burn2, burn_len2=n2 - hist_len2)
+
+        for key in self.hidden_dims:
+            h = getattr(self, f"h_{key}")
+            seq[key]       = h[(ind - n) % self.max_size]
+            seq[key + "2"] = h[(ind + 1 - n2) % self.max_size]
+
+        return (*batch, {key: torch.tensor(val).to(self.device) for key, val in seq.items()})
 
 
 class UniformReplayBufferEnvs(UniformReplayBuffer):
     """This buffer additionally stores a copy of the current env-object at each time step, which might be necessary when the state
     of an environment alone is not sufficient to fully characterize its internals, as, e.g., in the MinAtar environments, and one
     wants episodes starting from a random initial state in the buffer. Memory-wise this is not too expensive since a MinAtar 
-    environment typically requires 48 bytes."""
+    environment typically requires 48 bytes. The envs are not part of a memory-mapped buffer and are not restored by reopen()."""
     
-    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim=None):
-        super().__init__(state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim)
+    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim=None, storage="numpy",
+                 buffer_dir=None, compact=False, image_storage="float"):
+        super().__init__(state_type, state_shape, buffer_length, batch_size, device, disc_actions, action_dim, storage, buffer_dir,
+                         compact, image_storage)
         self.envs = [None] * buffer_length
     
     def add(self, s, a, r, s2, d, env):
         self.envs[self.ptr] = env
         super().add(s, a, r, s2, d)
 
+    def add_batch(self, s, a, r, s2, d, envs):
+        for i, env in enumerate(envs):
+            self.envs[(self.ptr + i) % self.max_size] = env
+        super().add_batch(s, a, r, s2, d)
+
     def sample_env(self):
         ind = np.random.choice(self.size)
         return self.envs[ind]
@@ -295,14 +860,107 @@ class UniformReplayBufferEnvs(UniformReplayBuffer):
 class UniformReplayBufferEnvs_BootDQN(UniformReplayBuffer_BootDQN):
     """Corresponds to 'UniformReplayBufferEnvs' with bootstrapping masks."""
 
-    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, K, mask_p):
-        super().__init__(state_type, state_shape, buffer_length, batch_size, device, K, mask_p)
+    def __init__(self, state_type, state_shape, buffer_length, batch_size, device, K, mask_p, storage="numpy", buffer_dir=None,
+                 compact=False, image_storage="float"):
+        super().__init__(state_type, state_shape, buffer_length, batch_size, device, K, mask_p, storage, buffer_dir, compact,
+                         image_storage)
         self.envs = [None] * buffer_length
     
     def add(self, s, a, r, s2, d, env):
         self.envs[self.ptr] = env
         super().add(s, a, r, s2, d)
+
+    def add_batch(self, s, a, r, s2, d, envs):
+        for i, env in enumerate(envs):
+            self.envs[(self.ptr + i) % self.max_size] = env
+        super().add_batch(s, a, r, s2, d)
     
     def sample_env(self):
         ind = np.random.choice(self.size)
         return self.envs[ind]
+
+
+class PrefetchSampler:
+    """Wraps a replay buffer and prepares the next 'n_batches' batches in a background thread, so that sampling overlaps
+    with the gradient computation of the agent. All other methods and attributes are delegated to the buffer. Methods run
+    under the same lock as the sampling, hence add() never writes into rows which are gathered at the same moment.
+    Prefetched batches may not contain the most recent transitions, and batches are no longer reproducible via the seed.
+    Pickling the sampler pickles the wrapped buffer."""
+    def __init__(self, buffer, n_batches):
+        assert n_batches >= 1, "'n_batches' must be at least 1."
+
+        self.buffer  = buffer
+        self.lock    = threading.Lock()
+        self.queue   = queue.Queue(maxsize=n_batches)
+        self._thread = None
+
+        # queued batches must not share reused output tensors
+        self.buffer.reuse_out = False
+
+    def _work(self):
+        while True:
+            try:
+                with self.lock:
+                    batch = self.buffer.sample()
+            except Exception as e:
+                self.queue.put(e)
+                return
+            self.queue.put(batch)
+
+    def sample(self):
+        # the thread is started lazily, since the buffer can only be sampled after the first updates are due
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, daemon=True)
+            self._thread.start()
+
+        batch = self.queue.get()
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+    def __getattr__(self, name):
+        attr = getattr(self.buffer, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attr(*args, **kwargs)
+        return locked
+
+    def __reduce__(self):
+        with self.lock:
+            return _restore_buffer, (type(self.buffer), {**self.buffer.__getstate__(), "reuse_out": True})
+
+
+class TimedSampler:
+    """Wraps a replay buffer and times its sample() as phase 'sample' of a PhaseTimer. All other methods and attributes
+    are delegated to the buffer. Pickling the sampler pickles the wrapped buffer."""
+    def __init__(self, buffer, timer):
+        self.buffer = buffer
+        self.sample = timer.wrap("sample", buffer.sample)
+
+    def __getattr__(self, name):
+        return getattr(self.buffer, name)
+
+    def __reduce__(self):
+        return _unpickle_wrapped, (self.buffer,)
+
+
+def unwrap(buffer):
+    """The replay buffer inside PrefetchSampler and TimedSampler wrappers."""
+    while isinstance(buffer, (PrefetchSampler, TimedSampler)):
+        buffer = buffer.buffer
+    return buffer
+
+
+def _unpickle_wrapped(buffer):
+    """Unpickles the buffer wrapped by a TimedSampler."""
+    return buffer
+
+
+def _restore_buffer(cls, state):
+    """Unpickles the buffer wrapped by a PrefetchSampler."""
+    buffer = cls.__new__(cls)
+    buffer.__setstate__(state)
+    return buffer
@@ -0,0 +1,127 @@
+"""
+Incremental checkpoints of replay buffers. Instead of pickling the whole buffer at every epoch end, only the
+ring-buffer segment that changed since the previous checkpoint is appended to the checkpoint directory:
+
+    <ckpt_dir>/checkpoint.json      metadata (ptr, size, n_added) and the ordered list of segments
+    <ckpt_dir>/seg_<k>.npz          rows of all storage arrays written between two checkpoints
+
+Segments whose rows have all been overwritten in the ring buffer are deleted. Writing happens in a background
+thread, the training thread only copies the changed rows.
+"""
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from tud_rl.common.buffer import UniformReplayBuffer
+
+
+class BufferCheckpointer:
+    def __init__(self, buffer: UniformReplayBuffer, ckpt_dir: str):
+        self.buffer     = buffer
+        self.ckpt_dir   = ckpt_dir
+        self.segments   = []
+        self.n_segments = 0
+        self.n_saved    = 0     # value of buffer.n_added at the last checkpoint
+        self._thread    = None
+
+        assert not buffer.compact, "Compact buffers cannot be checkpointed incrementally."
+        assert not hasattr(buffer, "envs"), "Buffers with env copies cannot be checkpointed incrementally."
+        os.makedirs(ckpt_dir, exist_ok=True)
+
+    def save(self):
+        """Copies the rows added since the last checkpoint and writes them in a background thread."""
+        buf   = self.buffer
+        n_new = min(buf.n_added - self.n_saved, buf.max_size)
+
+        # rows are copied here, so that the training thread can continue to write into the buffer
+        start = (buf.ptr - n_new) % buf.max_size
+        ind   = (start + np.arange(n_new)) % buf.max_size
+        rows  = {key: getattr(buf, key)[ind] for key in buf._keys}
+
+        seg = {"file": f"seg_{self.n_segments:06d}.npz", "start": int(start), "first_add": buf.n_added - n_new,
+               "last_add": buf.n_added}
+        meta = {"class": type(buf).__name__, "max_size": buf.max_size, "ptr": buf.ptr, "size": buf.size, "n_added": buf.n_added}
+        self.n_saved     = buf.n_added
+        self.n_segments += 1
+
+        # keep at most one pending write
+        self.wait()
+        self._thread = threading.Thread(target=self._write, args=(seg, rows, meta))
+        self._thread.start()
+
+    def resume(self):
+        """Restores the buffer from the checkpoint in 'ckpt_dir' and continues it, so that the next save() only appends
+        the rows added after resuming."""
+        load_checkpoint(self.buffer, self.ckpt_dir)
+
+        with open(os.path.join(self.ckpt_dir, "checkpoint.json")) as f:
+            meta = json.load(f)
+
+        self.segments   = meta["segments"]
+        self.n_segments = max([int(s["file"][4:10]) + 1 for s in self.segments], default=0)
+        self.n_saved    = meta["n_added"]
+
+    def wait(self):
+        """Blocks until the pending write is finished."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _write(self, seg, rows, meta):
+        if seg["last_add"] > seg["first_add"]:
+            np.savez(os.path.join(self.ckpt_dir, seg["file"]), **rows)
+            self.segments.append(seg)
+
+        # segments that are completely overwritten in the ring buffer are obsolete
+        dead = [s for s in self.segments if s["last_add"] <= meta["n_added"] - meta["max_size"]]
+        self.segments = [s for s in self.segments if s not in dead]
+
+        # metadata is replaced atomically, so that an interrupted write leaves the previous checkpoint valid
+        path = os.path.join(self.ckpt_dir, "checkpoint.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({**meta, "segments": self.segments}, f)
+        os.replace(path + ".tmp", path)
+
+        for s in dead:
+            os.remove(os.path.join(self.ckpt_dir, s["file"]))
+
+
+def load_checkpoint(buffer: UniformReplayBuffer, ckpt_dir: str) -> None:
+    """Restores the transitions of an incremental checkpoint into 'buffer' by replaying its segments in order."""
+    with open(os.path.join(ckpt_dir, "checkpoint.json")) as f:
+        meta = json.load(f)
+
+    assert meta["max_size"] == buffer.max_size, "The 'buffer_length' differs from the one of the checkpointed buffer."
+    assert not hasattr(buffer, "envs"), "Incremental checkpoints do not contain the env copies of the transitions."
+
+    for seg in meta["segments"]:
+        with np.load(os.path.join(ckpt_dir, seg["file"])) as rows:
+            assert set(rows.files) == set(buffer._keys), f"Cannot load a {meta['class']} into a {type(buffer).__name__}."
+            ind = (seg["start"] + np.arange(seg["last_add"] - seg["first_add"])) % buffer.max_size
+
+            for key in buffer._keys:
+                getattr(buffer, key)[ind] = rows[key]
+
+    buffer.ptr     = meta["ptr"]
+    buffer.size    = meta["size"]
+    buffer.n_added = meta["n_added"]
+    buffer._on_restore()
+
+
+def load_prior_buffer(buffer: UniformReplayBuffer, path: str) -> UniformReplayBuffer:
+    """Loads a prior buffer for continued training. 'path' may be an incremental checkpoint directory, a directory of a
+    memory-mapped buffer, or a pickled buffer. Returns the buffer to be used by the agent."""
+    if os.path.isfile(os.path.join(path, "checkpoint.json")):
+        load_checkpoint(buffer, path)
+        return buffer
+
+    if os.path.isfile(os.path.join(path, "meta.json")):
+        assert not hasattr(buffer, "envs"), "Memory-mapped buffers do not contain the env copies of the transitions."
+        buffer.reopen(path)
+        return buffer
+
+    with open(path, "rb") as f:
+        return pickle.load(f)
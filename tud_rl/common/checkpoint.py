@@ -0,0 +1,136 @@
+"""
+Checkpoints of the full training state, which is written to '<run directory>/checkpoint.pth' at the end of every epoch:
+
+    agent           nets, optimizers, temperatures, exploration schedules and counters, see BaseAgent.training_state()
+    total_steps     env steps done, training continues with this step
+    epoch           last completed epoch
+    rng             states of the torch, numpy and random generators
+    evaluations     evaluations of the asynchronous evaluator which were not logged yet, see AsyncEvaluator.state()
+
+The replay buffer is stored separately by its own checkpoint mechanism. Files are written to a temporary file first and
+then renamed, so that an interrupted write leaves the previous checkpoint intact.
+"""
+import os
+import pickle
+import random
+import shutil
+
+import numpy as np
+import torch
+
+from tud_rl import logger
+from tud_rl.agents.base import _Agent
+from tud_rl.common.buffer_checkpoint import load_prior_buffer
+
+CHECKPOINT_FILE = "checkpoint.pth"
+
+
+def atomic_save(obj, path: str, pickler=torch.save) -> None:
+    """Writes 'obj' to 'path' via a temporary file, which replaces 'path' once it is complete."""
+    with open(path + ".tmp", "wb") as f:
+        pickler(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def atomic_pickle(obj, path: str) -> None:
+    atomic_save(obj, path, pickler=pickle.dump)
+
+
+def get_rng_state() -> dict:
+    state = {"torch": torch.get_rng_state(), "numpy": np.random.get_state(), "random": random.getstate()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: dict) -> None:
+    torch.set_rng_state(state["torch"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["random"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def save_checkpoint(agent: _Agent, epoch: int, total_steps: int, runtime: float) -> None:
+    """Writes the training state after 'epoch', with 'total_steps' env steps done."""
+    state = {"agent"       : agent.training_state(),
+             "epoch"       : epoch,
+             "total_steps" : total_steps,
+             "runtime"     : runtime,
+             "rng"         : get_rng_state(),
+             "evaluations" : agent.evaluator.state() if agent.evaluator is not None else []}
+    atomic_save(state, os.path.join(agent.logger.output_dir, CHECKPOINT_FILE))
+
+
+def read_checkpoint(run_dir: str) -> dict:
+    return torch.load(os.path.join(run_dir, CHECKPOINT_FILE), map_location="cpu", weights_only=False)
+
+
+def load_checkpoint(agent: _Agent, ckpt: dict) -> int:
+    """Restores agent and random number generators from a checkpoint returned by read_checkpoint(). Returns the
+    number of env steps done, i.e., the first step of the continued training."""
+    agent.load_training_state(ckpt["agent"])
+    set_rng_state(ckpt["rng"])
+    return ckpt["total_steps"]
+
+
+def truncate_progress(run_dir: str, epoch: int) -> None:
+    """Removes the rows of epochs after 'epoch' from 'progress.txt', which were logged after the last checkpoint."""
+    path = os.path.join(run_dir, "progress.txt")
+    if not os.path.isfile(path):
+        return
+
+    with open(path) as f:
+        lines = f.readlines()
+
+    if not lines:
+        return
+
+    idx  = lines[0].rstrip("\n").split("\t").index("Epoch")
+    keep = [lines[0]] + [line for line in lines[1:] if line.strip() and int(float(line.split("\t")[idx])) <= epoch]
+
+    with open(path + ".tmp", "w") as f:
+        f.writelines(keep)
+    os.replace(path + ".tmp", path)
+
+
+def store_buffer(agent: _Agent) -> None:
+    """Stores the replay buffer according to 'buffer_checkpoint'."""
+    if agent.buffer_storage == "memmap":
+        agent.replay_buffer.flush()
+
+        # the files of the interrupted run are copied into 'buffer_dir' by the first flush
+        shutil.rmtree(f"{agent.buffer_dir}_resume", ignore_errors=True)
+
+    elif agent.buffer_ckpt == "incremental":
+        agent.buffer_checkpointer.save()
+
+    elif agent.buffer_ckpt == "pickle":
+        atomic_pickle(agent.replay_buffer, f"{agent.logger.output_dir}/buffer.pickle")
+
+
+def set_aside_memmap(buffer_dir: str) -> None:
+    """A memory-mapped buffer recreates its files, hence the files of an interrupted run are moved to
+    '<buffer_dir>_resume' before the agent is initialized. They are kept there until the next flush."""
+    if os.path.isfile(os.path.join(buffer_dir, "meta.json")):
+        shutil.rmtree(f"{buffer_dir}_resume", ignore_errors=True)
+        os.replace(buffer_dir, f"{buffer_dir}_resume")
+
+
+def restore_buffer(agent: _Agent) -> None:
+    """Restores the replay buffer of an interrupted run from the checkpoint of the run directory, which is continued."""
+    run_dir = agent.logger.output_dir
+
+    if agent.buffer_storage == "memmap" and os.path.isfile(f"{agent.buffer_dir}_resume/meta.json"):
+        agent.replay_buffer.reopen(f"{agent.buffer_dir}_resume")
+
+    elif agent.buffer_ckpt == "incremental" and os.path.isfile(f"{run_dir}/buffer_ckpt/checkpoint.json"):
+        agent.buffer_checkpointer.resume()
+
+    elif agent.buffer_ckpt == "pickle" and os.path.isfile(f"{run_dir}/buffer.pickle"):
+        agent.replay_buffer = load_prior_buffer(agent.replay_buffer, f"{run_dir}/buffer.pickle")
+
+    else:
+        logger.warning("Found no replay buffer checkpoint, training continues with an empty replay buffer.")
@@ -0,0 +1,114 @@
+"""
+Optimizers for ensembles whose members are stacked along the first axis of every parameter, e.g., EnsembleMLP in
+`tud_rl/common/nets.py`. step(members) only updates the rows of the given members, and every member keeps its own optimizer
+state including its step count. This is equivalent to one torch.optim optimizer per member, of which only the ones of the
+given members step, while the other members cost nothing.
+
+A single member is updated in place through views of its rows, several members are gathered and written back.
+"""
+import torch
+from torch.optim import Optimizer
+
+
+def _rows(t, members):
+    return t[members] if isinstance(members, int) else t.index_select(0, members)
+
+
+def _per_member(x, like):
+    """Reshapes per-member values 'x' to broadcast against the rows 'like'."""
+    return x.view(*x.shape, *[1] * (like.dim() - x.dim()))
+
+
+class _EnsembleOptimizer(Optimizer):
+
+    def _state_keys(self, group) -> list:
+        raise NotImplementedError
+
+    def _update(self, rows, grad, group) -> None:
+        """Updates the 'rows' (dict of state key: rows, including 'param' and 'member_step') in place."""
+        raise NotImplementedError
+
+    @torch.no_grad()
+    def step(self, members):
+        """'members' is an int or a LongTensor of distinct members."""
+        for group in self.param_groups:
+            keys = ["member_step"] + self._state_keys(group)
+
+            for p in group["params"]:
+                if p.grad is None:
+                    continue
+
+                state = self.state[p]
+                if not state:
+                    state["member_step"] = torch.zeros(p.shape[0], dtype=p.dtype, device=p.device)
+                    for key in keys[1:]:
+                        state[key] = torch.zeros_like(p, memory_format=torch.preserve_format)
+
+                rows = {key: _rows(state[key], members) for key in keys}
+                rows["param"] = _rows(p, members)
+
+                self._update(rows, _rows(p.grad, members), group)
+
+                # views of a single member were updated in place
+                if not isinstance(members, int):
+                    p.index_copy_(0, members, rows.pop("param"))
+                    for key, val in rows.items():
+                        state[key].index_copy_(0, members, val)
+
+
+class EnsembleAdam(_EnsembleOptimizer):
+    """Adam (without weight decay and amsgrad) with a separate bias correction for every member."""
+
+    def __init__(self, params, lr=1e-3, betas=(0.9, 0.999), eps=1e-8):
+        super().__init__(params, dict(lr=lr, betas=betas, eps=eps))
+
+    def _state_keys(self, group):
+        return ["exp_avg", "exp_avg_sq"]
+
+    def _update(self, rows, grad, group):
+        beta1, beta2 = group["betas"]
+        step = rows["member_step"].add_(1)
+
+        # a single member follows the arithmetic of torch.optim.Adam exactly
+        if step.dim() == 0:
+            step = step.item()
+
+        rows["exp_avg"].lerp_(grad, 1 - beta1)
+        rows["exp_avg_sq"].mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+
+        step_size = group["lr"] / (1 - beta1 ** step)
+        bias_correction2_sqrt = (1 - beta2 ** step) ** 0.5
+
+        if torch.is_tensor(step):
+            step_size, bias_correction2_sqrt = _per_member(step_size, grad), _per_member(bias_correction2_sqrt, grad)
+
+        denom = (rows["exp_avg_sq"].sqrt() / bias_correction2_sqrt).add_(group["eps"])
+
+        if torch.is_tensor(step_size):
+            rows["param"].addcdiv_(rows["exp_avg"] * step_size, denom, value=-1)
+        else:
+            rows["param"].addcdiv_(rows["exp_avg"], denom, value=-step_size)
+
+
+class EnsembleRMSprop(_EnsembleOptimizer):
+    """RMSprop (without weight decay and momentum), 'member_step' only counts the updates of a member."""
+
+    def __init__(self, params, lr=1e-2, alpha=0.99, eps=1e-8, centered=False):
+        super().__init__(params, dict(lr=lr, alpha=alpha, eps=eps, centered=centered))
+
+    def _state_keys(self, group):
+        return ["square_avg", "grad_avg"] if group["centered"] else ["square_avg"]
+
+    def _update(self, rows, grad, group):
+        alpha = group["alpha"]
+        rows["member_step"].add_(1)
+
+        square_avg = rows["square_avg"].mul_(alpha).addcmul_(grad, grad, value=1 - alpha)
+
+        if group["centered"]:
+            grad_avg = rows["grad_avg"].lerp_(grad, 1 - alpha)
+            avg = square_avg.addcmul(grad_avg, grad_avg, value=-1).sqrt_().add_(group["eps"])
+        else:
+            avg = square_avg.sqrt().add_(group["eps"])
+
+        rows["param"].addcdiv_(grad, avg, value=-group["lr"])
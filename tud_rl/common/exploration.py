@@ -11,12 +11,12 @@ class LinearDecayEpsilonGreedy:
         self.eps_inc = (eps_final - eps_init) / eps_decay_steps
         self.eps_t   = 0
 
-    def get_epsilon(self, mode):
-        "Returns the current epsilon based on linear scheduling."
+    def get_epsilon(self, mode, n=1):
+        "Returns the current epsilon based on linear scheduling. The schedule advances by 'n' steps, e.g., one per env."
 
         if mode == "train":
             self.current_eps = max(self.eps_init + self.eps_inc * self.eps_t, self.eps_final)
-            self.eps_t += 1
+            self.eps_t += n
         
         else:
             self.current_eps = 0
@@ -54,8 +54,9 @@ class Gaussian_Noise:
         self.mu    = np.ones(shape=(1,action_dim)) * mu
         self.sigma = sigma
 
-    def sample(self):
-        return self.mu + self.sigma * np.random.randn(1,self.action_dim)
+    def sample(self, n=1):
+        """returns: np.array with shape (n, action_dim)."""
+        return self.mu + self.sigma * np.random.randn(n,self.action_dim)
     
     def reset(self):
         pass
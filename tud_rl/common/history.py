@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class HistoryTracker:
+    """History of the last 'length' items of shape 'shape', e.g., the states and actions preceding the current state of
+    LSTM-based agents. Items fill the history from the front until it is full, afterwards the oldest one is dropped, and
+    the rows behind 'hist_len' are zero. With 'n_envs', one history is kept for each of 'n_envs' parallel envs.
+
+    Every item is stored twice in a ring of 2 * length rows, so that a push writes two rows and the ordered history is
+    always a contiguous slice of the ring. view() returns this slice without copying, it is valid until the next push.
+    """
+
+    def __init__(self, length: int, shape, n_envs: int = None, dtype=np.float64):
+        self.length = length
+        self.n_envs = n_envs
+        self.shape  = (shape,) if isinstance(shape, (int, np.integer)) else tuple(shape)
+
+        if n_envs is None:
+            self._ring = np.zeros((2 * length,) + self.shape, dtype=dtype)
+            self._n    = 0                                      # items pushed since the last reset
+        else:
+            self._ring = np.zeros((n_envs, 2 * length) + self.shape, dtype=dtype)
+            self._n    = np.zeros(n_envs, dtype=np.int64)
+            self._envs = np.arange(n_envs)
+            self._rows = np.arange(length)
+
+    @property
+    def hist_len(self):
+        """Number of items in the history, an array of one per env with 'n_envs'."""
+        if self.n_envs is None:
+            return min(self._n, self.length)
+        return np.minimum(self._n, self.length)
+
+    def push(self, x) -> None:
+        """Appends 'x', with 'n_envs' an array holding the item of every env along the first axis."""
+        pos = self._n % self.length
+
+        if self.n_envs is None:
+            x = np.reshape(x, self.shape)
+            self._ring[pos] = x
+            self._ring[pos + self.length] = x
+        else:
+            x = np.reshape(x, (self.n_envs,) + self.shape)
+            self._ring[self._envs, pos] = x
+            self._ring[self._envs, pos + self.length] = x
+        self._n += 1
+
+    def reset(self, env=None) -> None:
+        """Empties the history, with 'n_envs' the one of 'env' (int or array of indices) or all of them if not given."""
+        if self.n_envs is None:
+            self._ring[:self.length] = 0
+            self._n = 0
+        elif env is None:
+            self._ring[:, :self.length] = 0
+            self._n[:] = 0
+        else:
+            self._ring[env, :self.length] = 0
+            self._n[env] = 0
+
+    def view(self, env: int = None) -> np.ndarray:
+        """Ordered history of shape (length, *shape), oldest item first, without copying. With 'n_envs', the one of 'env'."""
+        n     = self._n if self.n_envs is None else self._n[env]
+        start = n % self.length if n >= self.length else 0
+        ring  = self._ring if self.n_envs is None else self._ring[env]
+        return ring[start:start + self.length]
+
+    def batch(self) -> np.ndarray:
+        """Ordered histories of all envs with shape (n_envs, length, *shape). Gathered from the ring, hence a copy."""
+        start = np.where(self._n >= self.length, self._n % self.length, 0)
+        return self._ring[self._envs[:, None], start[:, None] + self._rows]
@@ -55,7 +55,8 @@ class Logger:
     state of a training run, and the trained model.
     """
 
-    def __init__(self, alg_str, seed, env_str=None, info=None, output_dir=None, output_fname='progress.txt', exp_name=None):
+    def __init__(self, alg_str, seed, env_str=None, info=None, output_dir=None, output_fname='progress.txt', exp_name=None,
+                 resume=False):
         """
         Initialize a Logger.
         Args:
@@ -70,6 +71,8 @@ class Logger:
                 will know to group them. (Use case: if you run the same
                 hyperparameter configuration with multiple random seeds, you
                 should give them all the same ``exp_name``.)
+            resume (bool): Continue logging into an existing ``output_dir``,
+                appending to its output file.
         """
         
         # create output directory
@@ -95,18 +98,55 @@ class Logger:
             else:
                 self.output_dir = "experiments/" + alg_str + "_" + env_str + "_" + info + "_" + today + str(seed)
 
-        os.makedirs(self.output_dir)
+        os.makedirs(self.output_dir, exist_ok=resume)
+
+        # logged values of all rows and their running maxima, so that the output file is never read back
+        self.history  = {}
+        self.best     = {}
+        self.improved = set()   # keys whose value in the last row is a new maximum
+
+        # a resumed run keeps the header and the history of its output file
+        path = osp.join(self.output_dir, output_fname)
+        self.log_headers = []
+
+        if resume and osp.isfile(path):
+            with open(path) as f:
+                header = f.readline().rstrip("\n")
+                self.log_headers = header.split("\t") if header else []
+
+                for line in f:
+                    if line.strip():
+                        self._track(line.rstrip("\n").split("\t"))
 
         # create output file and automated closing when file terminates
-        self.output_file = open(osp.join(self.output_dir, output_fname), 'w')
+        self.output_file = open(path, 'a' if self.log_headers else 'w')
         print(f"Logging data to {self.output_file.name}")
         atexit.register(self.output_file.close)
 
-        self.first_row = True
-        self.log_headers = []
+        self.first_row = not self.log_headers
         self.log_current_row = {}
         self.exp_name = exp_name
 
+    def _track(self, vals):
+        """Appends the values of a row to the history and updates the running maxima."""
+        self.improved.clear()
+
+        for key, val in zip(self.log_headers, vals):
+            try:
+                val = float(val)
+            except (TypeError, ValueError):
+                val = np.nan
+
+            self.history.setdefault(key, []).append(val)
+
+            if key not in self.best or val > self.best[key] or np.isnan(self.best[key]):
+                self.best[key] = val
+                self.improved.add(key)
+
+    def last_row(self):
+        """The values of the last row as a dict."""
+        return {key: vals[-1] for key, vals in self.history.items()}
+
     def log_tabular(self, key, val):
         """
         Log a value of some diagnostic.
@@ -168,6 +208,7 @@ class Logger:
                 self.output_file.write("\t".join(self.log_headers) + "\n")
             self.output_file.write("\t".join(map(str, vals)) + "\n")
             self.output_file.flush()
+        self._track(vals)
         self.log_current_row.clear()
         self.first_row = False
 
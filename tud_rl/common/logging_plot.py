@@ -1,11 +1,94 @@
+import atexit
 import csv
+import multiprocessing as mp
+import queue as queue_lib
 
 #import matplotlib
 #matplotlib.use("agg")
 import matplotlib.pyplot as plt
 import pandas as pd
 
-from tud_rl.common.helper_fnc import exponential_smoothing
+# smoothing factor of the smoothed evaluation return, see helper_fnc.exponential_smoothing()
+SMOOTHING = 0.05
+
+
+class ProgressFigure:
+    """Figure of the evaluation return, Q-values and losses of the columns of 'progress.txt'. Rows are appended to the
+    lines of the figure, so that it is never rebuilt from scratch."""
+
+    def __init__(self, columns, alg, env_str, info=None):
+        self.fig, self.ax = plt.subplots(2, 2, figsize=(16, 9))
+        self.title = f"{alg} ({info}) | {env_str}" if info is not None else f"{alg} | {env_str}"
+        self.x     = []
+        self.lines = []     # [line, column, smoothed, values]
+
+        ax = self.ax
+
+        # first axis
+        for col in [col for col in columns if col.startswith("Avg_Eval_ret")]:
+            self._add(ax[0,0], col, label=col)
+            self._add(ax[0,0], col, label="Smoothed " + col, smoothed=True)
+        ax[0,0].legend()
+        ax[0,0].set_xlabel("Timestep")
+        ax[0,0].set_ylabel("Test return")
+
+        # second axis
+        for col in [col for col in columns if "Q_val" in col]:
+            self._add(ax[0,1], col, label=col)
+        ax[0,1].legend()
+        ax[0,1].set_xlabel("Timestep")
+        ax[0,1].set_ylabel("Q-value")
+
+        # third axis
+        if "Loss" in columns:
+            self._add(ax[1,0], "Loss")
+            ax[1,0].set_xlabel("Timestep")
+            ax[1,0].set_ylabel("Loss")
+
+        if any([col.startswith("Critic_loss") for col in columns]) and any([col.startswith("Actor_loss") for col in columns]):
+            for col in [col for col in columns if col.startswith("Critic_loss")]:
+                self._add(ax[1,0], col, label=col)
+
+            for col in [col for col in columns if col.startswith("Actor_loss")]:
+                self._add(ax[1,0], col, label=col)
+
+            ax[1,0].legend()
+            ax[1,0].set_xlabel("Timestep")
+            ax[1,0].set_ylabel("Loss")
+
+        # fourth axis
+        ax[1,1].set_xlabel("Timestep")
+
+        if "Avg_bias" in columns:
+            self._add(ax[1,1], "Avg_bias", label="Avg. bias")
+            ax[1,1].legend()
+
+    def _add(self, ax, col, label=None, smoothed=False):
+        line, = ax.plot([], [], label=label)
+        self.lines.append([line, col, smoothed, []])
+
+    def append(self, row: dict) -> None:
+        """Appends a row of 'progress.txt', given as dict of column: value."""
+        self.x.append(row["Timestep"])
+
+        for line, col, smoothed, y in self.lines:
+            val = row[col]
+            if smoothed and y:
+                val = SMOOTHING * val + (1 - SMOOTHING) * y[-1]
+            y.append(val)
+            line.set_data(self.x, y)
+
+        for ax in self.ax.flat:
+            ax.relim()
+            ax.autoscale_view()
+
+        self.fig.suptitle(f"{self.title} | Runtime (h): {round(row['Runtime_in_h'], 3)}")
+
+    def save(self, path: str) -> None:
+        self.fig.savefig(path)
+
+    def close(self) -> None:
+        plt.close(self.fig)
 
 
 def plot_from_progress(dir, alg, env_str, info=None):
@@ -13,7 +96,7 @@ def plot_from_progress(dir, alg, env_str, info=None):
 
     Args:
         dir (string):     directory of 'progress.txt', most likely something like experiments/some_number
-        env_str (string): name of environment 
+        env_str (string): name of environment
         alg (string):     used algorithm
         info (string):    further information to display in the header
     """
@@ -27,56 +110,65 @@ def plot_from_progress(dir, alg, env_str, info=None):
     df = df.iloc[1:]
     df = df.astype(float)
 
-    runtime = df["Runtime_in_h"].iloc[-1].round(3)
-
     # create plot
-    fig, ax = plt.subplots(2, 2, figsize=(16, 9))
-    
-    # define title
-    if info is not None:
-        fig.suptitle(f"{alg} ({info}) | {env_str} | Runtime (h): {runtime}")
-    else:
-        fig.suptitle(f"{alg} | {env_str} | Runtime (h): {runtime}")
-
-    # first axis
-    for col in df.columns[[col.startswith("Avg_Eval_ret") for col in df.columns]]:
-        ax[0,0].plot(df["Timestep"], df[col], label=col)
-        ax[0,0].plot(df["Timestep"], exponential_smoothing(df[col].values), label = "Smoothed " + col)
-    ax[0,0].legend()
-    ax[0,0].set_xlabel("Timestep")
-    ax[0,0].set_ylabel("Test return")
-
-    # second axis
-    for col in df.columns[["Q_val" in col for col in df.columns]]:
-        ax[0,1].plot(df["Timestep"], df[col], label=col)
-    ax[0,1].legend()
-    ax[0,1].set_xlabel("Timestep")
-    ax[0,1].set_ylabel("Q-value")
-    
-    # third axis
-    if "Loss" in df.columns:
-        ax[1,0].plot(df["Timestep"], df["Loss"])
-        ax[1,0].set_xlabel("Timestep")
-        ax[1,0].set_ylabel("Loss")
-
-    if any([col.startswith("Critic_loss") for col in df.columns]) and any([col.startswith("Actor_loss") for col in df.columns]):
-        for col in df.columns[[col.startswith("Critic_loss") for col in df.columns]]:
-            ax[1,0].plot(df["Timestep"], df[col], label=col)
-
-        for col in df.columns[[col.startswith("Actor_loss") for col in df.columns]]:
-            ax[1,0].plot(df["Timestep"], df[col], label=col)
-
-        ax[1,0].legend()
-        ax[1,0].set_xlabel("Timestep")
-        ax[1,0].set_ylabel("Loss")
-
-    # fourth axis
-    ax[1,1].set_xlabel("Timestep")
-    
-    if "Avg_bias" in df.columns:
-        ax[1,1].plot(df["Timestep"], df["Avg_bias"], label="Avg. bias")
-        ax[1,1].legend()
-    
+    fig = ProgressFigure(list(df.columns), alg, env_str, info)
+    for _, row in df.iterrows():
+        fig.append(row)
+
     # safe figure and close
-    plt.savefig(f"{dir}/{alg}_{env_str}.pdf")
-    plt.close()
+    fig.save(f"{dir}/{alg}_{env_str}.pdf")
+    fig.close()
+
+
+def _plot_worker(q, path, alg, env_str, info):
+    """Process target of ProgressPlotter: appends the received rows and saves the figure once per batch of rows."""
+    plt.switch_backend("agg")
+    fig = None
+
+    while True:
+        rows = [q.get()]
+        try:
+            while True:
+                rows.append(q.get_nowait())
+        except queue_lib.Empty:
+            pass
+
+        for row in rows:
+            if row is None:
+                continue
+            if fig is None:
+                fig = ProgressFigure(list(row), alg, env_str, info)
+            fig.append(row)
+
+        if fig is not None:
+            fig.save(path)
+
+        if None in rows:
+            break
+
+
+class ProgressPlotter:
+    """Plots the rows of 'progress.txt' into '<dir>/<alg>_<env_str>.pdf' in a background process, which keeps the figure
+    and only appends the new rows. 'history' are the rows logged so far as dict of column: values, e.g., of a resumed
+    run. The figure is completed at exit."""
+
+    def __init__(self, dir, alg, env_str, info=None, history=None):
+        ctx        = mp.get_context()
+        self.queue = ctx.Queue()
+        self.proc  = ctx.Process(target=_plot_worker, args=(self.queue, f"{dir}/{alg}_{env_str}.pdf", alg, env_str, info),
+                                 daemon=True)
+        self.proc.start()
+        atexit.register(self.close)
+
+        for i in range(len(next(iter(history.values()), [])) if history else 0):
+            self.append({key: vals[i] for key, vals in history.items()})
+
+    def append(self, row: dict) -> None:
+        """Plots a row given as dict of column: value."""
+        self.queue.put(row)
+
+    def close(self) -> None:
+        """Waits until all rows are plotted and stops the process."""
+        if self.proc.is_alive():
+            self.queue.put(None)
+            self.proc.join()
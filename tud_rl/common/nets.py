@@ -5,6 +5,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.distributions.normal import Normal
+from torch.nn.utils.rnn import pack_padded_sequence
 
 ACTIVATIONS = {"relu"     : F.relu,
                "identity" : nn.Identity(),
@@ -58,25 +59,98 @@ class MLP(nn.Module):
         return x
 
 
-class Double_MLP(nn.Module):
-    """Maintains two MLPs of identical structure as, e.g., in the TD3 author's original implementation."""
+class EnsembleLinear(nn.Module):
+    """'n_members' linear layers of identical shape with stacked parameters, evaluated with one batched matrix product.
+    Each member is initialized like nn.Linear. The weight is stored transposed as (n_members, in_size, out_size)."""
 
-    def __init__(self, in_size, out_size, net_struc):
+    def __init__(self, n_members, in_size, out_size):
         super().__init__()
 
-        self.MLP1 = MLP(in_size   = in_size, 
-                        out_size  = out_size, 
-                        net_struc = net_struc)
+        bound = 1 / np.sqrt(in_size)
+        self.weight = nn.Parameter(torch.empty(n_members, in_size, out_size).uniform_(-bound, bound))
+        self.bias   = nn.Parameter(torch.empty(n_members, 1, out_size).uniform_(-bound, bound))
+
+    def forward(self, x, member=None):
+        """x is a torch tensor, 'member' selects a single member (int) or a subset of members (torch.LongTensor of indices,
+        which may repeat) instead of all. Shapes:
+        x:       torch.Size([batch_size, in_size]) shared by the members, or torch.Size([n, batch_size, in_size]) with one
+                 input per member, where n is n_members or the number of selected members
+
+        returns: torch.Size([n, batch_size, out_size]), or torch.Size([batch_size, out_size]) for a single 'member'
+        """
+        if isinstance(member, int):
+            return torch.addmm(self.bias[member, 0], x, self.weight[member])
+
+        weight, bias = (self.weight, self.bias) if member is None else (self.weight[member], self.bias[member])
+
+        if x.dim() == 2:
+            x = x.expand(weight.size(0), -1, -1)
+        return torch.baddbmm(bias, x, weight)
+
+
+def _stack_legacy(state_dict, prefix, layers, renames=None):
+    """Converts a state dict with one nn.Linear per ensemble member into the stacked format of EnsembleLinear, in place.
+    'layers' maps the name of each EnsembleLinear to the names of the nn.Linear of its members, 'renames' maps other
+    legacy prefixes to their new ones. State dicts in the current format are left unchanged."""
+    legacy = set()
+
+    for name, members in layers.items():
+        if prefix + members[0] + ".weight" not in state_dict:
+            continue
+        state_dict[prefix + name + ".weight"] = torch.stack([state_dict[prefix + m + ".weight"].t() for m in members])
+        state_dict[prefix + name + ".bias"]   = torch.stack([state_dict[prefix + m + ".bias"] for m in members]).unsqueeze(1)
+        legacy.update(prefix + m + sfx for m in members for sfx in [".weight", ".bias"])
+
+    for key in legacy:
+        del state_dict[key]
+
+    for old, new in (renames or {}).items():
+        for key in [key for key in state_dict if key.startswith(prefix + old + ".")]:
+            state_dict[prefix + new + key[len(prefix + old):]] = state_dict.pop(key)
+
+
+class EnsembleMLP(nn.Module):
+    """'n_members' MLPs of identical structure, see MLP, with all members evaluated by one EnsembleLinear call per layer."""
+
+    def __init__(self, n_members, in_size, out_size, net_struc):
+        super().__init__()
+
+        self.n_members = n_members
+        self.struc     = net_struc
+
+        assert isinstance(self.struc, list), "net should be a list,  e.g. [[64, 'relu'], [64, 'relu'], 'identity']."
+        assert len(self.struc) >= 2, "net should have at least one hidden layer and a final activation."
+        assert isinstance(self.struc[-1], str), "Final element of net should only be the activation string."
+
+        sizes = [in_size] + [layer[0] for layer in self.struc[:-1]] + [out_size]
+        self.layers = nn.ModuleList([EnsembleLinear(n_members, sizes[i], sizes[i+1]) for i in range(len(sizes) - 1)])
+        self.acts   = [ACTIVATIONS[layer[1]] for layer in self.struc[:-1]] + [ACTIVATIONS[self.struc[-1]]]
+
+    def forward(self, x, member=None):
+        """x and 'member' as in EnsembleLinear.forward(). Returns torch.Size([n, batch_size, out_size]), or
+        torch.Size([batch_size, out_size]) for a single 'member'."""
+        for layer, act_f in zip(self.layers, self.acts):
+            x = act_f(layer(x, member))
+        return x
+
+
+class Double_MLP(EnsembleMLP):
+    """Maintains two MLPs of identical structure as, e.g., in the TD3 author's original implementation. Both are evaluated
+    in one batched call. State dicts of the former version with two separate MLPs ('MLP1', 'MLP2') are converted on load."""
+
+    def __init__(self, in_size, out_size, net_struc):
+        super().__init__(n_members=2, in_size=in_size, out_size=out_size, net_struc=net_struc)
+        self._register_load_state_dict_pre_hook(self._convert_legacy)
+
+    def _convert_legacy(self, state_dict, prefix, *args):
+        _stack_legacy(state_dict, prefix, {f"layers.{i}": [f"MLP1.layers.{i}", f"MLP2.layers.{i}"] for i in range(len(self.layers))})
 
-        self.MLP2 = MLP(in_size   = in_size, 
-                        out_size  = out_size, 
-                        net_struc = net_struc)
-    
     def forward(self, x):
-        return self.MLP1(x), self.MLP2(x)
+        q = super().forward(x)
+        return q[0], q[1]
 
     def single_forward(self, x):
-        return self.MLP1(x)
+        return super().forward(x, member=0)
 
 
 # --------------------------- MinAtar ---------------------------------
@@ -197,8 +271,172 @@ class FC_BootDQN(nn.Module):
 
 
 
+# --------------------------- Ensemble DQN ---------------------------------
+class EnsembleConv2d(nn.Module):
+    """'n_members' Conv2d layers of identical shape with stacked parameters of shape (n_members, out_channels, ...), each
+    initialized like nn.Conv2d. A shared input is convolved with all filters at once, inputs per member by a grouped
+    convolution."""
+
+    def __init__(self, n_members, in_channels, out_channels, kernel_size):
+        super().__init__()
+
+        bound = 1 / np.sqrt(in_channels * kernel_size**2)
+        self.weight = nn.Parameter(torch.empty(n_members, out_channels, in_channels, kernel_size, kernel_size).uniform_(-bound, bound))
+        self.bias   = nn.Parameter(torch.empty(n_members, out_channels).uniform_(-bound, bound))
+
+    def forward(self, x, member=None):
+        """x is a torch tensor, 'member' as in EnsembleLinear.forward(). Shapes:
+        x:       torch.Size([batch_size, in_channels, height, width]) shared by the members, or 
+                 torch.Size([n, batch_size, in_channels, height, width]) with one input per member
+
+        returns: torch.Size([n, batch_size, out_channels, out_height, out_width]), or without the first axis for a single
+                 'member'
+        """
+        if isinstance(member, int):
+            return F.conv2d(x, self.weight[member], self.bias[member])
+
+        weight, bias = (self.weight, self.bias) if member is None else (self.weight[member], self.bias[member])
+        n, out_channels, in_channels = weight.shape[:3]
+
+        if x.dim() == 4:
+            x = F.conv2d(x, weight.reshape(n * out_channels, *weight.shape[2:]), bias.reshape(-1))
+        else:
+            x = x.transpose(0, 1).reshape(x.size(1), n * in_channels, *x.shape[3:])
+            x = F.conv2d(x, weight.reshape(n * out_channels, *weight.shape[2:]), bias.reshape(-1), groups=n)
+        return x.view(x.size(0), n, out_channels, *x.shape[2:]).transpose(0, 1)
+
+
+def _convert_legacy_ensemble(state_dict, prefix, n_members, layers, convs=()):
+    """Converts the state dict of a former nn.ModuleList of 'n_members' nets, keys '<member>.<layer>.weight', into the 
+    stacked format, in place. 'layers' and 'convs' map the EnsembleLinear and EnsembleConv2d to their legacy names."""
+    _stack_legacy(state_dict, prefix, {name: [f"{i}.{old}" for i in range(n_members)] for name, old in layers.items()})
+
+    for name, old in dict(convs).items():
+        if prefix + f"0.{old}.weight" not in state_dict:
+            continue
+        for key in ["weight", "bias"]:
+            state_dict[prefix + f"{name}.{key}"] = torch.stack([state_dict.pop(prefix + f"{i}.{old}.{key}") for i in range(n_members)])
+
+
+class FC_EnsembleDQN(EnsembleMLP):
+    """Ensemble of 'N' DQNs for feature input, see EnsembleMLP. State dicts of the former nn.ModuleList of MLPs are 
+    converted on load."""
+
+    def __init__(self, state_shape, num_actions, net_struc, N):
+        super().__init__(n_members=N, in_size=state_shape, out_size=num_actions, net_struc=net_struc)
+        self._register_load_state_dict_pre_hook(self._convert_legacy)
+
+    def _convert_legacy(self, state_dict, prefix, *args):
+        _convert_legacy_ensemble(state_dict, prefix, self.n_members, {f"layers.{j}": f"layers.{j}" for j in range(len(self.layers))})
+
+
+class MinAtar_EnsembleDQN(nn.Module):
+    """Ensemble of 'N' DQNs of the structure of MinAtar_DQN, evaluated in one call per layer. State dicts of the former 
+    nn.ModuleList of MinAtar_DQN are converted on load."""
+
+    def __init__(self, in_channels, height, width, num_actions, N):
+        super().__init__()
+
+        self.n_members = N
+        core = MinAtar_CoreNet(in_channels=in_channels, height=height, width=width)
+
+        self.conv = EnsembleConv2d(N, in_channels, core.out_channels, core.kernel_size)
+        self.head = EnsembleMLP(n_members = N,
+                                in_size   = core.in_size_FC,
+                                out_size  = num_actions,
+                                net_struc = [[128, "relu"], "identity"])
+
+        self._register_load_state_dict_pre_hook(self._convert_legacy)
+
+    def _convert_legacy(self, state_dict, prefix, *args):
+        _convert_legacy_ensemble(state_dict, prefix, self.n_members, {f"head.layers.{j}": f"head.layers.{j}" for j in range(2)},
+                                 convs={"conv": "core.conv"})
+
+    def forward(self, s, member=None):
+        """s: torch.Size([batch_size, in_channels, height, width]) shared by the members, or torch.Size([n, batch_size,
+        in_channels, height, width]) with one input per member, 'member' as in EnsembleLinear.forward().
+
+        returns: torch.Size([n, batch_size, num_actions]), or torch.Size([batch_size, num_actions]) for a single 'member'
+        """
+        x = F.relu(self.conv(s, member))
+        return self.head(x.flatten(-3), member)
+
+
 # --------------------------- LSTM ---------------------------------
-class LSTM_Actor(nn.Module):
+class LSTMMemory(nn.Module):
+    """Memory extraction shared by the recurrent actors and critics: a dense layer followed by a one-layer LSTM over the
+    history. Recurrent states are passed as a single tensor of shape (batch_size, hidden_dim), which holds the concatenated
+    hidden and cell state and is zero at the start of an episode."""
+
+    @property
+    def hidden_dim(self):
+        return 2 * self.mem_LSTM.hidden_size
+
+    def _mem_input(self, s_hist, a_hist):
+        if self.use_past_actions:
+            return F.relu(self.mem_dense(torch.cat([s_hist, a_hist], dim=2)))
+        return F.relu(self.mem_dense(s_hist))
+
+    def _split(self, hidden):
+        return _split_state(hidden)
+
+    def _memory(self, s_hist, a_hist, hist_len, hidden=None):
+        """Returns the LSTM output after the first 'hist_len' steps of the history, starting from the recurrent state 'hidden'
+        (zero if None). Shape is (batch_size, hidden_size). Without history, the hidden state of 'hidden' is returned."""
+        return _lstm_memory(self.mem_LSTM, self._mem_input(s_hist, a_hist), hist_len, hidden)
+
+    @torch.no_grad()
+    def burn_in(self, s_hist, a_hist, hist_len, hidden=None):
+        """Returns the recurrent state after the first 'hist_len' steps of the history (which may be zero), starting from 
+        'hidden' (zero if None). No gradients are computed."""
+        run = hist_len > 0
+        x_mem = self._mem_input(s_hist[run], a_hist[run] if self.use_past_actions else None) if run.any() else None
+        return _lstm_burn_in(self.mem_LSTM, x_mem, hist_len, hidden, s_hist)
+
+
+def _split_state(hidden):
+    """Splits a recurrent state of shape (batch_size, hidden_dim) into the hidden and cell state expected by nn.LSTM."""
+    h, c = hidden.chunk(2, dim=1)
+    return h.unsqueeze(0).contiguous(), c.unsqueeze(0).contiguous()
+
+
+def _lstm_memory(lstm, x_mem, hist_len, hidden=None):
+    """Output of 'lstm' after the first 'hist_len' steps of the input 'x_mem', see LSTMMemory._memory()."""
+    extracted_mem, (_, _) = lstm(x_mem, None if hidden is None else _split_state(hidden))
+
+    # get selection index according to history lengths (no-history cases will be masked later)
+    h_idx = copy.deepcopy(hist_len)
+    h_idx[h_idx == 0] = 1
+    h_idx -= 1
+
+    # select LSTM output, resulting shape is (batch_size, hidden_dim)
+    hidden_mem = extracted_mem[torch.arange(extracted_mem.size(0)), h_idx]
+
+    # no-history cases yield the initial hidden state, which is zero without stored recurrent states
+    if hidden is None:
+        hidden_mem[hist_len == 0] = 0.0
+    else:
+        empty = (hist_len == 0).view(-1)
+        hidden_mem[empty] = hidden[empty, :lstm.hidden_size]
+    return hidden_mem
+
+
+def _lstm_burn_in(lstm, x_mem, hist_len, hidden, s_hist):
+    """Recurrent state of 'lstm' after the first 'hist_len' steps, see LSTMMemory.burn_in(). 'x_mem' holds the input of
+    the batch elements with a history only, or is None if there are none."""
+    if hidden is None:
+        hidden = s_hist.new_zeros((s_hist.size(0), 2 * lstm.hidden_size))
+    hidden = hidden.clone()
+
+    run = hist_len > 0
+    if x_mem is not None:
+        x_mem = pack_padded_sequence(x_mem, hist_len[run].cpu(), batch_first=True, enforce_sorted=False)
+        _, (h, c) = lstm(x_mem, _split_state(hidden[run]))
+        hidden[run] = torch.cat([h[0], c[0]], dim=1)
+    return hidden
+
+
+class LSTM_Actor(LSTMMemory):
     """Defines recurrent deterministic actor."""
     
     def __init__(self, action_dim, state_shape, use_past_actions) -> None:
@@ -222,12 +460,13 @@ class LSTM_Actor(nn.Module):
         self.post_comb_dense2 = nn.Linear(128, action_dim)
 
 
-    def forward(self, s, s_hist, a_hist, hist_len) -> tuple:
+    def forward(self, s, s_hist, a_hist, hist_len, hidden=None) -> tuple:
         """s, s_hist, hist_len are torch tensors. Shapes:
         s:        torch.Size([batch_size, state_shape])
         s_hist:   torch.Size([batch_size, history_length, state_shape])
         a_hist:   torch.Size([batch_size, history_length, action_dim])
         hist_len: torch.Size(batch_size)
+        hidden:   torch.Size([batch_size, hidden_dim]), recurrent state before s_hist (optional)
         
         returns: output with shape torch.Size([batch_size, action_dim]), act_net_info (dict)
         
@@ -246,26 +485,7 @@ class LSTM_Actor(nn.Module):
         curr_fe = F.relu(self.curr_fe_dense2(curr_fe))
 
         #------ memory ------
-        # dense layer
-        if self.use_past_actions:
-            x_mem = F.relu(self.mem_dense(torch.cat([s_hist, a_hist], dim=2)))
-        else:
-            x_mem = F.relu(self.mem_dense(s_hist))
-        
-        # LSTM
-        #self.mem_LSTM.flatten_parameters()
-        extracted_mem, (_, _) = self.mem_LSTM(x_mem)
-
-        # get selection index according to history lengths (no-history cases will be masked later)
-        h_idx = copy.deepcopy(hist_len)
-        h_idx[h_idx == 0] = 1
-        h_idx -= 1
-        
-        # select LSTM output, resulting shape is (batch_size, hidden_dim)
-        hidden_mem = extracted_mem[torch.arange(extracted_mem.size(0)), h_idx]
-        
-        # mask no-history cases to yield zero extracted memory
-        hidden_mem[hist_len == 0] = 0.0
+        hidden_mem = self._memory(s_hist, a_hist, hist_len, hidden)
 
         #------ post combination ------
         # concate current feature extraction with generated memory
@@ -283,7 +503,7 @@ class LSTM_Actor(nn.Module):
         return x, act_net_info
 
 
-class LSTM_Critic(nn.Module):
+class LSTM_Critic(LSTMMemory):
     """Defines recurrent critic network to compute Q-values."""
     
     def __init__(self, action_dim, state_shape, use_past_actions) -> None:
@@ -307,7 +527,7 @@ class LSTM_Critic(nn.Module):
         self.post_comb_dense2 = nn.Linear(128, 1)
         
 
-    def forward(self, s, a, s_hist, a_hist, hist_len, log_info=True) -> tuple:
+    def forward(self, s, a, s_hist, a_hist, hist_len, log_info=True, hidden=None) -> tuple:
         """s, s_hist, a_hist are torch tensors. Shapes:
         s:        torch.Size([batch_size, state_shape])
         a:        torch.Size([batch_size, action_dim])
@@ -315,6 +535,7 @@ class LSTM_Critic(nn.Module):
         a_hist:   torch.Size([batch_size, history_length, action_dim])
         hist_len: torch.Size(batch_size)
         log_info: Bool, whether to return logging dict
+        hidden:   torch.Size([batch_size, hidden_dim]), recurrent state before s_hist (optional)
         
         returns: output with shape torch.Size([batch_size, 1]), critic_net_info (dict) (if log_info)
         
@@ -335,26 +556,7 @@ class LSTM_Critic(nn.Module):
         curr_fe = F.relu(self.curr_fe_dense2(curr_fe))
         
         #------ memory ------
-        # dense layer
-        if self.use_past_actions:
-            x_mem = F.relu(self.mem_dense(torch.cat([s_hist, a_hist], dim=2)))
-        else:
-            x_mem = F.relu(self.mem_dense(s_hist))
-        
-        # LSTM
-        #self.mem_LSTM.flatten_parameters()
-        extracted_mem, (_, _) = self.mem_LSTM(x_mem)
-
-        # get selection index according to history lengths (no-history cases will be masked later)
-        h_idx = copy.deepcopy(hist_len)
-        h_idx[h_idx == 0] = 1
-        h_idx -= 1
-
-        # select LSTM output, resulting shape is (batch_size, hidden_dim)
-        hidden_mem = extracted_mem[torch.arange(extracted_mem.size(0)), h_idx]
-
-        # mask no-history cases to yield zero extracted memory
-        hidden_mem[hist_len == 0] = 0.0
+        hidden_mem = self._memory(s_hist, a_hist, hist_len, hidden)
         
         #------ post combination ------
         # concatenate current feature extraction with generated memory
@@ -374,28 +576,88 @@ class LSTM_Critic(nn.Module):
 
 
 class LSTM_Double_Critic(nn.Module):
+    """Two recurrent critics of the structure of LSTM_Critic. The dense layers of both are evaluated in one batched call
+    per layer, while each critic keeps its own LSTM. State dicts of the former version with two separate LSTM_Critic 
+    ('LSTM_Q1', 'LSTM_Q2') are converted on load."""
+
+    DENSE = ["curr_fe_dense1", "curr_fe_dense2", "mem_dense", "post_comb_dense1", "post_comb_dense2"]
+
     def __init__(self, action_dim, state_shape, use_past_actions) -> None:
         super(LSTM_Double_Critic, self).__init__()
 
-        self.LSTM_Q1 = LSTM_Critic(action_dim       = action_dim, 
-                                   state_shape      = state_shape,
-                                   use_past_actions = use_past_actions)
+        self.use_past_actions = use_past_actions
+
+        # current feature extraction
+        self.curr_fe_dense1 = EnsembleLinear(2, state_shape + action_dim, 128)
+        self.curr_fe_dense2 = EnsembleLinear(2, 128, 128)
 
-        self.LSTM_Q2 = LSTM_Critic(action_dim       = action_dim, 
-                                   state_shape      = state_shape,
-                                   use_past_actions = use_past_actions)
+        # memory
+        if use_past_actions:
+            self.mem_dense = EnsembleLinear(2, state_shape + action_dim, 128)
+        else:
+            self.mem_dense = EnsembleLinear(2, state_shape, 128)
+        self.mem_LSTMs = nn.ModuleList([nn.LSTM(input_size = 128, hidden_size = 128, num_layers = 1, batch_first = True)
+                                        for _ in range(2)])
 
-    def forward(self, s, a, s_hist, a_hist, hist_len) -> tuple:
-        q1                  = self.LSTM_Q1(s, a, s_hist, a_hist, hist_len, log_info=False)
-        q2, critic_net_info = self.LSTM_Q2(s, a, s_hist, a_hist, hist_len, log_info=True)
+        # post combination
+        self.post_comb_dense1 = EnsembleLinear(2, 128 + 128, 128)
+        self.post_comb_dense2 = EnsembleLinear(2, 128, 1)
 
-        return q1, q2, critic_net_info
+        self._register_load_state_dict_pre_hook(self._convert_legacy)
 
+    def _convert_legacy(self, state_dict, prefix, *args):
+        _stack_legacy(state_dict, prefix, {name: [f"LSTM_Q1.{name}", f"LSTM_Q2.{name}"] for name in self.DENSE},
+                      renames={"LSTM_Q1.mem_LSTM": "mem_LSTMs.0", "LSTM_Q2.mem_LSTM": "mem_LSTMs.1"})
 
-    def single_forward(self, s, a, s_hist, a_hist, hist_len):
-        q1 = self.LSTM_Q1(s, a, s_hist, a_hist, hist_len, log_info=False)
+    @property
+    def hidden_dim(self):
+        return sum(2 * lstm.hidden_size for lstm in self.mem_LSTMs)
 
-        return q1
+    def _split(self, hidden):
+        """Recurrent states are the concatenated states of both critics."""
+        if hidden is None:
+            return None, None
+        return hidden.chunk(2, dim=1)
+
+    def _mem_input(self, s_hist, a_hist, member=None):
+        """Input of the LSTM(s) with shape (2, batch_size, history_length, 128), or without the first axis for a 'member'."""
+        x = torch.cat([s_hist, a_hist], dim=2) if self.use_past_actions else s_hist
+        B, T, _ = x.shape
+        x = F.relu(self.mem_dense(x.reshape(B * T, -1), member))
+        return x.view(*x.shape[:-2], B, T, -1)
+
+    def _q(self, s, a, hidden_mem, member=None):
+        curr_fe = F.relu(self.curr_fe_dense1(torch.cat([s, a], dim=1), member))
+        curr_fe = F.relu(self.curr_fe_dense2(curr_fe, member))
+
+        x = torch.cat([curr_fe, hidden_mem], dim=-1)
+        x = F.relu(self.post_comb_dense1(x, member))
+        return self.post_comb_dense2(x, member), curr_fe
+
+    def forward(self, s, a, s_hist, a_hist, hist_len, hidden=None) -> tuple:
+        """Shapes as in LSTM_Critic.forward(), 'hidden' has shape (batch_size, hidden_dim) and holds the recurrent states
+        of both critics. Returns q1, q2 with shape torch.Size([batch_size, 1]) each and critic_net_info (dict) of q2."""
+        x_mem = self._mem_input(s_hist, a_hist)
+        hidden_mem = torch.stack([_lstm_memory(lstm, x_mem[i], hist_len, h)
+                                  for i, (lstm, h) in enumerate(zip(self.mem_LSTMs, self._split(hidden)))])
+
+        q, curr_fe = self._q(s, a, hidden_mem)
+
+        critic_net_info = dict(Critic_CurFE = curr_fe[1].detach().mean().cpu().numpy(),
+                               Critic_ExtMemory = hidden_mem[1].detach().mean().cpu().numpy())
+        return q[0], q[1], critic_net_info
+
+
+    def single_forward(self, s, a, s_hist, a_hist, hist_len, hidden=None):
+        hidden_mem = _lstm_memory(self.mem_LSTMs[0], self._mem_input(s_hist, a_hist, member=0), hist_len, self._split(hidden)[0])
+        return self._q(s, a, hidden_mem, member=0)[0]
+
+    @torch.no_grad()
+    def burn_in(self, s_hist, a_hist, hist_len, hidden=None):
+        run = hist_len > 0
+        x_mem = self._mem_input(s_hist[run], a_hist[run] if self.use_past_actions else None) if run.any() else [None, None]
+        return torch.cat([_lstm_burn_in(lstm, x_mem[i], hist_len, h, s_hist)
+                          for i, (lstm, h) in enumerate(zip(self.mem_LSTMs, self._split(hidden)))], dim=1)
 
 
 #-------------------------- SAC: GaussianActor ----------------------------
@@ -467,7 +729,7 @@ class GaussianActor(nn.Module):
 
 #-------------------------- LSTM-SAC: GaussianActor ----------------------------
 
-class LSTM_GaussianActor(nn.Module):
+class LSTM_GaussianActor(LSTMMemory):
     """Defines recurrent, stochastic actor based on a Gaussian distribution."""
     def __init__(self, action_dim, state_shape, use_past_actions, log_std_min=-20, log_std_max=2):
         super(LSTM_GaussianActor, self).__init__()
@@ -494,13 +756,14 @@ class LSTM_GaussianActor(nn.Module):
         self.mu      = nn.Linear(128, action_dim)
         self.log_std = nn.Linear(128, action_dim)
 
-    def forward(self, s, s_hist, a_hist, hist_len, deterministic, with_logprob):
+    def forward(self, s, s_hist, a_hist, hist_len, deterministic, with_logprob, hidden=None):
         """Returns action and it's logprob for given obs and history. o, o_hist, a_hist, hist_len are torch tensors. Args:
 
         s:        torch.Size([batch_size, state_shape])
         s_hist:   torch.Size([batch_size, history_length, state_shape])
         a_hist:   torch.Size([batch_size, history_length, action_dim])
         hist_len: torch.Size(batch_size)
+        hidden:   torch.Size([batch_size, hidden_dim]), recurrent state before s_hist (optional)
 
         deterministic: bool (whether to use mean as a sample, only at test time)
         with_logprob:  bool (whether to return logprob of sampled action as well, else second tuple element below will be 'None')
@@ -522,26 +785,7 @@ class LSTM_GaussianActor(nn.Module):
         curr_fe = F.relu(self.curr_fe_dense2(curr_fe))
 
         #------ memory ------
-        # dense layer
-        if self.use_past_actions:
-            x_mem = F.relu(self.mem_dense(torch.cat([s_hist, a_hist], dim=2)))
-        else:
-            x_mem = F.relu(self.mem_dense(s_hist))
-        
-        # LSTM
-        #self.mem_LSTM.flatten_parameters()
-        extracted_mem, (_, _) = self.mem_LSTM(x_mem)
-
-        # get selection index according to history lengths (no-history cases will be masked later)
-        h_idx = copy.deepcopy(hist_len)
-        h_idx[h_idx == 0] = 1
-        h_idx -= 1
-        
-        # select LSTM output, resulting shape is (batch_size, hidden_dim)
-        hidden_mem = extracted_mem[torch.arange(extracted_mem.size(0)), h_idx]
-        
-        # mask no-history cases to yield zero extracted memory
-        hidden_mem[hist_len == 0] = 0.0
+        hidden_mem = self._memory(s_hist, a_hist, hist_len, hidden)
 
         #------ post combination ------
         # concate current feature extraction with generated memory
@@ -596,24 +840,39 @@ class LSTM_GaussianActor(nn.Module):
 
 #--------------------- TQC -------------------------------
 class TQC_Critics(nn.Module):
-    def __init__(self, state_shape, action_dim, n_quantiles, n_critics):
+    """Quantile critics which share the parameters of a single 'net' by default, which is hence evaluated once and its output
+    repeated for the 'n_critics' critics. With 'independent', the critics have their own parameters as in Kuznetsov et al. 
+    (2020) and are evaluated in one batched call per layer. Shared state dicts are then converted on load by copying them
+    to every critic."""
+
+    def __init__(self, state_shape, action_dim, n_quantiles, n_critics, independent=False):
         super().__init__()
 
         self.n_quantiles = n_quantiles
         self.n_critics = n_critics
+        self.independent = independent
+
+        if independent:
+            self.nets = EnsembleMLP(n_members = n_critics,
+                                    in_size   = state_shape + action_dim,
+                                    out_size  = n_quantiles,
+                                    net_struc = [[512, "relu"], [512, "relu"], [512, "relu"], "identity"])
+
+            self._register_load_state_dict_pre_hook(self._convert_shared)
+        else:
+            self.net = nn.Sequential(
+                nn.Linear(state_shape + action_dim, 512),
+                nn.ReLU(),
+                nn.Linear(512,512),
+                nn.ReLU(),
+                nn.Linear(512,512),
+                nn.ReLU(),
+                nn.Linear(512,n_quantiles)
+            )
+
+    def _convert_shared(self, state_dict, prefix, *args):
+        _stack_legacy(state_dict, prefix, {f"nets.layers.{i}": [f"net.{2*i}"] * self.n_critics for i in range(4)})
 
-        self.net = nn.Sequential(
-            nn.Linear(state_shape + action_dim, 512),
-            nn.ReLU(),
-            nn.Linear(512,512),
-            nn.ReLU(),
-            nn.Linear(512,512),
-            nn.ReLU(),
-            nn.Linear(512,n_quantiles)
-        )
-
-        self.nets = [self.net] * n_critics
-        
     def forward(self, state, action):
         """
         Args:
@@ -623,10 +882,11 @@ class TQC_Critics(nn.Module):
         Returns:
             torch.Size([batch_size, n_critics, n_quantiles])
         """
-        sa = torch.cat((state,action),dim = 1).unsqueeze(1)
+        sa = torch.cat((state,action),dim = 1)
 
-        quantiles = torch.cat(tuple(net(sa) for net in self.nets),dim=1)
-        return quantiles
+        if self.independent:
+            return self.nets(sa).transpose(0, 1)
+        return self.net(sa).unsqueeze(1).expand(-1, self.n_critics, -1)
 
 
 #------------------------------- RecDQN for MMGEnv --------------------------------
@@ -926,8 +1186,8 @@ class LSTMRecActor(nn.Module):
         self.PI_dense1 = nn.Linear(64, 64)
         self.PI_dense2 = nn.Linear(64, action_dim)
 
-    def forward(self, s, s_hist, a_hist, hist_len) -> tuple:
-        """s, s_hist are torch tensors. Using a_hist is not implemented yet.
+    def forward(self, s, s_hist, a_hist, hist_len, hidden=None) -> tuple:
+        """s, s_hist are torch tensors. Using a_hist and stored recurrent states ('hidden') is not implemented yet.
 
         Args:
             s:        torch.Size([batch_size, num_obs_OS + num_obs_TS * N_TSs])
@@ -935,6 +1195,7 @@ class LSTMRecActor(nn.Module):
             hist_len: torch.Size(batch_size)
         Returns: 
             torch.Size([batch_size, action_dim]), critic_net_info (dict)"""
+        assert hidden is None, "Stored recurrent states are not available for LSTMRecActor."
 
         # setup x_tilde which comes into outer LSTM
         batch_size, history_length, _ = s_hist.shape
@@ -1266,14 +1527,16 @@ class LSTMRec_Double_Critic(nn.Module):
                                         num_obs_TS = num_obs_TS,
                                         device     = self.device)
 
-    def forward(self, s, a, s_hist, a_hist, hist_len) -> tuple:
+    def forward(self, s, a, s_hist, a_hist, hist_len, hidden=None) -> tuple:
+        assert hidden is None, "Stored recurrent states are not available for LSTMRec_Double_Critic."
         q1                  = self.LSTMRec_Q1(s, a, s_hist, a_hist, hist_len, log_info=False)
         q2, critic_net_info = self.LSTMRec_Q2(s, a, s_hist, a_hist, hist_len, log_info=True)
 
         return q1, q2, critic_net_info
 
 
-    def single_forward(self, s, a, s_hist, a_hist, hist_len):
+    def single_forward(self, s, a, s_hist, a_hist, hist_len, hidden=None):
+        assert hidden is None, "Stored recurrent states are not available for LSTMRec_Double_Critic."
         q1 = self.LSTMRec_Q1(s, a, s_hist, a_hist, hist_len, log_info=False)
 
         return q1
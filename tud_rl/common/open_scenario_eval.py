@@ -9,6 +9,7 @@ import numpy as np
 import tud_rl.agents.continuous as agents
 from tud_rl.agents.base import _Agent
 from tud_rl.common.configparser import ConfigFile
+from tud_rl.common.history import HistoryTracker
 from tud_rl.configs.continuous_actions import __path__ as cont_path
 from tud_rl.envs._envs.VesselFnc import (COLREG_COLORS, ED, NM_to_meter,
                                          bng_rel, get_ship_domain)
@@ -56,9 +57,8 @@ def Imazu_eval(dir):
 
         # LSTM: init history
         if eval_agent.needs_history:
-            s_hist = np.zeros((eval_agent.history_length, eval_agent.state_shape))
-            a_hist = np.zeros((eval_agent.history_length, eval_agent.num_actions))
-            hist_len = 0
+            s_hist = HistoryTracker(eval_agent.history_length, eval_agent.state_shape)
+            a_hist = HistoryTracker(eval_agent.history_length, eval_agent.num_actions)
 
         # get initial state
         s = eval_env.reset()
@@ -67,7 +67,7 @@ def Imazu_eval(dir):
         while not d:
 
             if eval_agent.needs_history:
-                a = eval_agent.select_action(s=s, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len)
+                a = eval_agent.select_action(s=s, s_hist=s_hist.view(), a_hist=a_hist.view(), hist_len=s_hist.hist_len)
             else:
                 a = eval_agent.select_action(s)
 
@@ -76,16 +76,8 @@ def Imazu_eval(dir):
 
             # LSTM: update history
             if eval_agent.needs_history:
-                if hist_len == eval_agent.history_length:
-                    s_hist = np.roll(s_hist, shift=-1, axis=0)
-                    s_hist[eval_agent.history_length - 1, :] = s
-
-                    a_hist = np.roll(a_hist, shift=-1, axis=0)
-                    a_hist[eval_agent.history_length - 1, :] = a
-                else:
-                    s_hist[hist_len] = s
-                    a_hist[hist_len] = a
-                    hist_len += 1
+                s_hist.push(s)
+                a_hist.push(a)
             s = s2
     
     # ------------------------ 2. Viz -------------------------------
@@ -0,0 +1,108 @@
+"""
+Wall-clock time of the phases of the training loop, accumulated with time.perf_counter():
+
+    env_step        stepping the env(s)
+    act             action selection
+    memorize        storing transitions in the replay buffer
+    sample          drawing batches from the replay buffer
+    update          gradient updates, excluding 'sample' and 'target_update'
+    target_update   target net updates
+    eval            evaluation, or copying the weights for an asynchronous evaluation
+    log             logging and plotting
+    checkpoint      weights, replay buffer and training state
+    other           remaining time of the loop
+
+Times of nested phases are only counted for the inner phase. At the end of an epoch, report() returns the totals since
+the previous report together with their percentage of the wall time, the env steps per second and the updates per
+second. The evaluation, logging and checkpointing at the end of an epoch hence appear in the row of the next epoch.
+"""
+import time
+from contextlib import nullcontext
+
+PHASES = ["env_step", "act", "memorize", "sample", "update", "target_update", "eval", "log", "checkpoint"]
+
+
+class _Phase:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name  = name
+
+    def __enter__(self):
+        self.timer._active.append(self)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        dt    = time.perf_counter() - self.start
+        timer = self.timer
+
+        timer._active.pop()
+        timer.totals[self.name] += dt
+        timer.counts[self.name] += 1
+
+        if timer._active:
+            timer.totals[timer._active[-1].name] -= dt
+
+
+class PhaseTimer:
+    """Accumulates the wall time of the PHASES, used as 'with timer("env_step"): ...'. A disabled timer does nothing.
+    'total_steps' is the env step at which timing starts."""
+
+    def __init__(self, enabled: bool = True, total_steps: int = 0):
+        self.enabled = enabled
+        self._null   = nullcontext()
+        self._phases = {name: _Phase(self, name) for name in PHASES}
+        self._active = []
+        self._reset(total_steps)
+
+    def _reset(self, total_steps):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self._start = time.perf_counter()
+        self._steps = total_steps
+
+    def __call__(self, name: str):
+        return self._phases[name] if self.enabled else self._null
+
+    def wrap(self, name: str, fn):
+        """Returns 'fn' timed as phase 'name'."""
+        phase = self._phases[name]
+
+        def timed(*args, **kwargs):
+            with phase:
+                return fn(*args, **kwargs)
+        return timed
+
+    def instrument(self, agent) -> None:
+        """Times the sampling and target updates inside agent.train(), which is the 'update' phase of the loops."""
+        from tud_rl.common.buffer import TimedSampler
+
+        agent.replay_buffer = TimedSampler(agent.replay_buffer, self)
+
+        for name in ["_target_update", "polyak_update"]:
+            if hasattr(agent, name):
+                setattr(agent, name, self.wrap("target_update", getattr(agent, name)))
+
+    def keys(self) -> list:
+        """Keys of the dict returned by report(), empty for a disabled timer."""
+        if not self.enabled:
+            return []
+        return [f"{kind}_{name}" for name in PHASES + ["other"] for kind in ["Time", "Pct"]] + ["Steps_per_s", "Updates_per_s"]
+
+    def report(self, total_steps: int) -> dict:
+        """Times in seconds and percentages of the phases since the last report, which ended after 'total_steps' env
+        steps, and restarts the accumulation."""
+        wall   = max(time.perf_counter() - self._start, 1e-9)
+        totals = {**self.totals, "other": wall - sum(self.totals.values())}
+
+        stats = {}
+        for name, t in totals.items():
+            stats[f"Time_{name}"] = t
+            stats[f"Pct_{name}"]  = 100 * t / wall
+
+        stats["Steps_per_s"]   = (total_steps - self._steps) / wall
+        stats["Updates_per_s"] = self.counts["update"] / wall
+
+        self._reset(total_steps)
+        return stats
@@ -0,0 +1,169 @@
+"""
+Vectorized environments for the training loops. N copies of an env are stepped in parallel worker processes:
+
+    actions         written by the training process into a shared array, then each worker is told to step
+    observations    written by the workers into shared arrays, together with the rewards and done flags
+
+The pipes only carry the step command and an acknowledgement. A worker resets its env as soon as the episode ends (done
+or 'max_episode_steps' reached), so the returned next states are already the initial states of the new episodes, while
+the final observations of the ended episodes are returned separately.
+"""
+import multiprocessing as mp
+import random
+import traceback
+from functools import partial
+
+import gym
+import numpy as np
+
+from tud_rl.wrappers import get_wrapper
+
+
+def make_env(name, env_kwargs, wrappers, wrapper_kwargs):
+    """Creates the env 'name' with its wrappers as in the training scripts."""
+    env = gym.make(name, **env_kwargs)
+
+    for wrapper in wrappers:
+        env = get_wrapper(name=wrapper, env=env, **wrapper_kwargs[wrapper])
+    return env
+
+
+def _shared_array(ctx, shape, dtype):
+    """Allocates a zero-initialized array in shared memory. Returns the raw buffer, which is passed to the workers, and
+    a numpy view on it."""
+    raw = ctx.RawArray("b", int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize)
+    return raw, _view(raw, shape, dtype)
+
+
+def _view(raw, shape, dtype):
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+def _worker(remote, env_fn, index, seed, max_episode_steps, disc_actions, spec):
+    """Steps a single env copy on request. The env and the global random number generators, which many of the custom envs
+    rely on, are seeded with 'seed'."""
+    np.random.seed(seed)
+    random.seed(seed)
+
+    arr = {key: _view(raw, shape, dtype) for key, (raw, shape, dtype) in spec.items()}
+
+    try:
+        env = env_fn()
+        env.seed(seed)
+        arr["s"][index] = env.reset()
+        epi_steps = 0
+        remote.send(None)
+
+        while True:
+            cmd = remote.recv()
+
+            if cmd == "step":
+                a = arr["a"][index].item() if disc_actions else arr["a"][index].copy()
+                s2, r, d, _ = env.step(a)
+                epi_steps += 1
+
+                arr["s2"][index] = s2
+                arr["r"][index]  = r
+                arr["d"][index]  = d
+
+                # auto-reset
+                if d or epi_steps == max_episode_steps:
+                    s2 = env.reset()
+                    epi_steps = 0
+
+                arr["s"][index] = s2
+                remote.send(None)
+
+            elif cmd == "close":
+                env.close()
+                break
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        remote.send(traceback.format_exc())
+    finally:
+        remote.close()
+
+
+class SubprocVecEnv:
+    """Runs 'n_envs' copies of the env created by 'env_fn' in worker processes. Worker i is seeded with 'seed' + i, hence
+    the first copy behaves like a single env with the same seed. 'env_fn' must be picklable if processes are spawned,
+    which 'partial(make_env, ...)' is."""
+
+    def __init__(self, env_fn, n_envs, seed, max_episode_steps, observation_space, action_space, start_method=None):
+        self.n_envs       = n_envs
+        self.disc_actions = isinstance(action_space, gym.spaces.Discrete)
+        ctx = mp.get_context(start_method)
+
+        # shared arrays: current states, final states of the last step, actions, rewards, done flags
+        shapes = {"s"  : ((n_envs, *observation_space.shape), np.float64),
+                  "s2" : ((n_envs, *observation_space.shape), np.float64),
+                  "a"  : ((n_envs, *action_space.shape), np.int64 if self.disc_actions else np.float64),
+                  "r"  : ((n_envs,), np.float64),
+                  "d"  : ((n_envs,), np.bool_)}
+        spec = {}
+
+        for key, (shape, dtype) in shapes.items():
+            raw, arr = _shared_array(ctx, shape, dtype)
+            spec[key] = (raw, shape, dtype)
+            setattr(self, key, arr)
+
+        self.remotes, self.processes = [], []
+
+        for i in range(n_envs):
+            remote, worker_remote = ctx.Pipe()
+            p = ctx.Process(target=_worker, args=(worker_remote, env_fn, i, seed + i, max_episode_steps, self.disc_actions,
+                                                  spec), daemon=True)
+            p.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(p)
+
+        self.closed = False
+        self._wait()
+
+    @classmethod
+    def from_config(cls, c, n_envs, observation_space, action_space, seed=None):
+        """Creates the vectorized version of the env specified in the 'Env' section of the config. 'seed' defaults to the
+        seed of the config."""
+        env_fn = partial(make_env, c.Env.name, c.Env.env_kwargs, c.Env.wrappers, c.Env.wrapper_kwargs)
+        return cls(env_fn, n_envs, c.seed if seed is None else seed, c.Env.max_episode_steps, observation_space,
+                   action_space)
+
+    def _wait(self):
+        """Collects the acknowledgements of all workers and re-raises errors of the envs."""
+        for i, remote in enumerate(self.remotes):
+            msg = remote.recv()
+            if msg is not None:
+                self.close()
+                raise RuntimeError(f"Env worker {i} failed:\n{msg}")
+
+    def reset(self):
+        """Returns the current states of all envs. The workers reset their envs on start and at episode ends, so this does
+        not start new episodes."""
+        return self.s.copy()
+
+    def step(self, a):
+        """Steps all envs with the actions 'a' (leading dimension 'n_envs'). Returns (s2, r, d, s): the next states as
+        returned by the envs, rewards, done flags, and the states to act on next, which differ from s2 for envs whose
+        episode ended and which were reset."""
+        self.a[:] = np.asarray(a).reshape(self.a.shape)
+
+        for remote in self.remotes:
+            remote.send("step")
+        self._wait()
+
+        return self.s2.copy(), self.r.copy(), self.d.copy(), self.s.copy()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        for remote, p in zip(self.remotes, self.processes):
+            try:
+                remote.send("close")
+            except (BrokenPipeError, EOFError):
+                pass
+            p.join(timeout=5)
+            remote.close()
@@ -1,5 +1,6 @@
 from copy import deepcopy
 
+from tud_rl.common.history import HistoryTracker
 from tud_rl.envs._envs.HHOS_Fnc import HHOSPlotter
 from tud_rl.envs._envs.HHOS_OpenPlanning_Env import *
 
@@ -95,18 +96,12 @@ class HHOS_OpenPlanning_Validation(HHOS_OpenPlanning_Env):
             
             # since we use LSTMRecTD3, we need history from the perspective of each TS as well
             if self.step_cnt == 0:
-                self.TS_s_hist = np.zeros((self.history_length, self.N_TSs, self.obs_size))
+                self.TS_s_hist = HistoryTracker(self.history_length, (self.N_TSs, self.obs_size))
                 self.TS_a_hist = np.zeros((self.history_length, self.N_TSs, 1))
-                self.hist_len  = 0
                 #self.TS_state  = np.zeros((self.N_TSs, self.obs_size))
             else:
                 # update history, where most recent state component is the old state from last step
-                if self.hist_len == self.history_length:
-                    self.TS_s_hist = np.roll(self.TS_s_hist, shift=-1, axis=0)
-                    self.TS_s_hist[self.history_length - 1] = self.TS_state
-                else:
-                    self.TS_s_hist[self.hist_len] = self.TS_state
-                    self.hist_len += 1
+                self.TS_s_hist.push(self.TS_state)
 
             # overwrite old state
             self.TS_state = self._get_TS_state()
@@ -165,9 +160,9 @@ class HHOS_OpenPlanning_Validation(HHOS_OpenPlanning_Env):
             # TS control
             for i, TS in enumerate(self.TSs):
                 a_TS = agent.select_action(s        = self.TS_state[i], 
-                                           s_hist   = self.TS_s_hist[:, i, :], 
+                                           s_hist   = self.TS_s_hist.view()[:, i, :], 
                                            a_hist   = self.TS_a_hist[:, i, :], 
-                                           hist_len = self.hist_len)
+                                           hist_len = self.TS_s_hist.hist_len)
                 TS.eta[2] = angle_to_2pi(TS.eta[2] + a_TS*self.d_head_scale)
 
         s, r, d, info = super().step(a, control_TS=True)
@@ -10,6 +10,7 @@ import torch
 from pytsa import TimePosition
 from pytsa.structs import DataColumns
 
+from tud_rl.common.history import HistoryTracker
 from tud_rl.common.nets import LSTMRecActor
 from tud_rl.envs._envs.HHOS_Base_Env import *
 from tud_rl.envs._envs.HHOS_Fnc import HHOSPlotter, knots_to_mps
@@ -526,8 +527,7 @@ class HHOS_RiverPipeline_Env(HHOS_Base_Env):
 
         # setup history
         state_shape = 4 + 7 * max([self.N_TSs_max, 1]) + self.lidar_n_beams
-        s_hist = np.zeros((2, state_shape))  # history length 2
-        hist_len = 0
+        s_hist = HistoryTracker(2, state_shape)  # history length 2
 
         # planning loop
         for _ in range(self.n_wps_loc-1):
@@ -537,8 +537,8 @@ class HHOS_RiverPipeline_Env(HHOS_Base_Env):
 
                 # recursive state design needs history
                 s_tens        = torch.tensor(s, dtype=torch.float32).view(1, state_shape)
-                s_hist_tens   = torch.tensor(s_hist, dtype=torch.float32).view(1, 2, state_shape) # batch size, history length, state shape
-                hist_len_tens = torch.tensor(hist_len)
+                s_hist_tens   = torch.tensor(s_hist.view(), dtype=torch.float32).view(1, 2, state_shape) # batch size, history length, state shape
+                hist_len_tens = torch.tensor(s_hist.hist_len)
                 a = self.planner(s=s_tens, s_hist=s_hist_tens, a_hist=None, hist_len=hist_len_tens)[0]
 
             # get APF move, always two components
@@ -569,12 +569,7 @@ class HHOS_RiverPipeline_Env(HHOS_Base_Env):
             if method == "RL":
 
                 # update history
-                if hist_len == 2:
-                    s_hist = np.roll(s_hist, shift=-1, axis=0)
-                    s_hist[1, :] = s
-                else:
-                    s_hist[hist_len] = s
-                    hist_len += 1
+                s_hist.push(s)
 
                 # s becomes s2
                 s = s2
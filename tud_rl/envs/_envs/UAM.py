@@ -10,6 +10,7 @@ from matplotlib import pyplot as plt
 from mycolorpy import colorlist as mcp
 
 from tud_rl.agents.base import _Agent
+from tud_rl.common.history import HistoryTracker
 from tud_rl.envs._envs.HHOS_Fnc import to_utm
 from tud_rl.envs._envs.Plane import *
 from tud_rl.envs._envs.VesselFnc import (NM_to_meter, angle_to_2pi,
@@ -242,17 +243,11 @@ class UAM(gym.Env):
             self.state = self._get_state(0)
 
             if self.step_cnt == 0:
-                self.s_multi_hist = np.zeros((self.history_length, self.N_planes, self.obs_size))                   
-                self.hist_len = 0
+                self.s_multi_hist = HistoryTracker(self.history_length, (self.N_planes, self.obs_size))
                 self.s_multi_old = np.zeros((self.N_planes, self.obs_size))
             else:
                 # update history, where most recent state component is the old state from last step
-                if self.hist_len == self.history_length:
-                    self.s_multi_hist = np.roll(self.s_multi_hist, shift=-1, axis=0)
-                    self.s_multi_hist[self.history_length - 1] = self.s_multi_old
-                else:
-                    self.s_multi_hist[self.hist_len] = self.s_multi_old
-                    self.hist_len += 1
+                self.s_multi_hist.push(self.s_multi_old)
 
             # overwrite old state
             self.s_multi_old = self._get_state_multi()
@@ -350,9 +345,9 @@ class UAM(gym.Env):
 
                     # spatial-temporal recurrent
                     act = cnt_agent.select_action(s        = states_multi[i], 
-                                                  s_hist   = self.s_multi_hist[:, i, :], 
+                                                  s_hist   = self.s_multi_hist.view()[:, i, :], 
                                                   a_hist   = None, 
-                                                  hist_len = self.hist_len)
+                                                  hist_len = self.s_multi_hist.hist_len)
 
                     # move plane
                     p.upd_dynamics(a=act, discrete_acts=False, perf=self.perf, dest=None)
@@ -13,6 +13,7 @@ from gym import spaces
 from PIL import Image
 
 from tud_rl.agents.base import _Agent
+from tud_rl.common.history import HistoryTracker
 from tud_rl.envs._envs.HHOS_Fnc import to_utm
 from tud_rl.envs._envs.Plane import *
 from tud_rl.envs._envs.VesselFnc import (ED, angle_to_2pi, angle_to_pi,
@@ -359,15 +360,9 @@ class UAM_Modular(gym.Env):
 
             # update history
             if not hasattr(p, "s_hist"):
-                p.s_hist = np.zeros((self.history_length, self.obs_size))
-                p.hist_len = 0
+                p.s_hist = HistoryTracker(self.history_length, self.obs_size)
             else:
-                if p.hist_len == self.history_length:
-                    p.s_hist = np.roll(p.s_hist, shift=-1, axis=0)
-                    p.s_hist[self.history_length - 1] = p.s_old
-                else:
-                    p.s_hist[p.hist_len] = p.s_old
-                    p.hist_len += 1
+                p.s_hist.push(p.s_old)
             
             # safe old state
             p.s_old = copy(p.s)
@@ -444,9 +439,9 @@ class UAM_Modular(gym.Env):
 
                 # spatial-temporal recurrent
                 act = cnt_agent.select_action(s        = p.s, 
-                                              s_hist   = p.s_hist, 
+                                              s_hist   = p.s_hist.view(), 
                                               a_hist   = None, 
-                                              hist_len = p.hist_len)
+                                              hist_len = p.s_hist.hist_len)
 
                 # move plane
                 p.upd_dynamics(a=act, discrete_acts=False, perf=self.perf, dest=None)
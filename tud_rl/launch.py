@@ -0,0 +1,309 @@
+"""
+Launches several training runs, i.e., all combinations of the given configs, agents and seeds, in a managed pool of
+processes. Each worker slot is pinned to its own set of cores, and the runs are limited to that many torch, OpenMP and
+BLAS threads, so that concurrent runs do not compete for the same cores.
+
+Every run writes into its own folder '<out>/<config>/<agent>/seed_<seed>', and its stdout/stderr into 'seed_<seed>.log'.
+Finished runs are marked with a 'finished' file and skipped when the launcher is started again. Unfinished runs resume
+from their last checkpoint, see 'state_checkpoint', or are restarted if they have none. An aggregate progress table of
+all runs is printed periodically.
+
+Usage:
+    python -m tud_rl.launch -c config.yaml -a DQN DDQN -s 1 2 3 -n 1
+"""
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from tud_rl import logger
+from tud_rl.common.configparser import ConfigFile
+from tud_rl.configs.continuous_actions import __path__ as cont_path
+from tud_rl.configs.discrete_actions import __path__ as discr_path
+
+# agents and envs are imported inside the functions, so that spawned processes log their imports into the run's log
+
+# environment variables limiting the thread pools of the numerical libraries
+THREAD_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+
+def base_name(agent_name: str) -> str:
+    """Agent name without the suffix of agent variants, e.g., 'KEBootDQN_b' -> 'KEBootDQN'."""
+    return agent_name[:-2] if agent_name[-1].islower() else agent_name
+
+
+def config_path(config_file: str, agent_name: str) -> str:
+    """Path of 'config_file', which is looked up in the config folder of the agent's action space unless it exists."""
+    from tud_rl.agents import is_discrete
+
+    if os.path.isfile(config_file):
+        return config_file
+    base_path = discr_path[0] if is_discrete(base_name(agent_name)) else cont_path[0]
+    return f"{base_path}/{config_file}"
+
+
+def run_dir(out: str, config_file: str, agent_name: str, seed: int) -> str:
+    config = os.path.splitext(os.path.basename(config_file))[0]
+    return f"{out}/{config}/{agent_name}/seed_{seed}"
+
+
+def overwrite_config(config: ConfigFile, agent_name: str, overrides: dict) -> None:
+    """Overwrites entries of the config, entries of the agent's section in 'agent' take precedence. Keys missing in the
+    config file are added as top-level entries, e.g., the optional ones like 'n_steps'."""
+    agent_dict = getattr(config.Agent, agent_name, None)
+
+    for key, val in overrides.items():
+        if isinstance(agent_dict, dict) and key in agent_dict:
+            agent_dict[key] = val
+            config.config_dict["agent"][agent_name][key] = val
+
+        elif hasattr(config, key) or hasattr(config.Env, key) or key in config.Env.env_kwargs:
+            config.overwrite(**{key: val})
+
+        else:
+            config.config_dict[key] = val
+            setattr(config, key, val)
+
+
+def _train(config_file: str, agent_name: str, seed: int, output_dir: str, cores: list, threads: int,
+           overrides: dict) -> None:
+    """Process target: trains a single run and marks it as finished."""
+    with open(f"{output_dir}.log", "a" if "resume" in overrides else "w") as f:
+        os.dup2(f.fileno(), 1)
+        os.dup2(f.fileno(), 2)
+
+    # terminated runs still close their env workers and actor processes
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    torch.set_num_threads(threads)
+
+    import tud_rl.envs
+    import tud_rl.run.train_continuous as cont
+    import tud_rl.run.train_discrete as discr
+    from tud_rl.agents import is_discrete
+
+    config = ConfigFile(config_path(config_file, agent_name))
+    overwrite_config(config, agent_name, {**overrides, "seed": seed})
+    config.max_episode_handler()
+    config.output_dir = output_dir
+
+    if is_discrete(base_name(agent_name)):
+        discr.train(config, agent_name)
+    else:
+        cont.train(config, agent_name)
+
+    open(f"{output_dir}/finished", "w").close()
+
+
+class Run:
+    """A single training run. 'overrides' are config entries set on top of the config file, 'dir' defaults to
+    '<out>/<config>/<agent>/seed_<seed>' and 'label' is the name of the run in the progress table."""
+
+    def __init__(self, config_file: str, agent_name: str, seed: int, out: str, overrides: dict = None, dir: str = None,
+                 label: str = None):
+        self.config_file = config_file
+        self.agent_name  = agent_name
+        self.seed        = seed
+        self.overrides   = overrides or {}
+        self.dir         = dir or run_dir(out, config_file, agent_name, seed)
+        self.label       = label or os.path.basename(config_file)
+        self.timesteps   = self.overrides.get("timesteps",
+                                              getattr(ConfigFile(config_path(config_file, agent_name)), "timesteps", None))
+        self.proc        = None
+        self.slot        = None
+
+        if os.path.isfile(f"{self.dir}/finished"):
+            self.status = "done"
+        elif os.path.isfile(f"{self.dir}/stopped"):
+            self.status = "stopped"
+        else:
+            self.status = "pending"
+
+    def history(self) -> dict:
+        """Columns of 'progress.txt' as arrays, empty if no epoch has been logged yet."""
+        try:
+            with open(f"{self.dir}/progress.txt") as f:
+                rows = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+            vals = np.array(rows[1:], dtype=float).reshape(len(rows) - 1, len(rows[0]))
+            return {col: vals[:, i] for i, col in enumerate(rows[0])} if len(vals) else {}
+        except (OSError, ValueError, IndexError):
+            return {}
+
+    def progress(self) -> dict:
+        """Last epoch, timestep, evaluation return and best evaluation return so far."""
+        h = self.history()
+        if not h or "Avg_Eval_ret" not in h:
+            return {}
+        return {"Epoch": int(h["Epoch"][-1]), "Timestep": int(h["Timestep"][-1]) + 1, "Eval_ret": h["Avg_Eval_ret"][-1],
+                "Best_ret": h["Avg_Eval_ret"].max()}
+
+
+def print_table(runs: list) -> None:
+    """Prints status and progress of all runs."""
+    header = f"{'Config':<24}{'Agent':<14}{'Seed':>6}  {'Status':<9}{'Epoch':>7}{'Timestep':>11}{'Done':>7}{'Eval_ret':>12}{'Best_ret':>12}"
+    lines  = [header, "-" * len(header)]
+
+    for run in runs:
+        p = run.progress() if run.status != "pending" else {}
+
+        if p:
+            done = f"{100 * p['Timestep'] / run.timesteps:.0f}%" if run.timesteps else ""
+            prog = f"{p['Epoch']:>7}{p['Timestep']:>11}{done:>7}{p['Eval_ret']:>12.2f}{p['Best_ret']:>12.2f}"
+        else:
+            prog = ""
+
+        lines.append(f"{run.label:<24.24}{run.agent_name:<14.14}{run.seed:>6}  {run.status:<9}{prog}")
+
+    counts = {s: sum(run.status == s for run in runs) for s in ["pending", "running", "done", "stopped", "failed"]}
+    lines.append(", ".join(f"{n} {s}" for s, n in counts.items()))
+    print("\n".join(lines) + "\n", flush=True)
+
+
+def launch(runs: list, n_workers: int, threads: int, cores: list = None, interval: float = 60.0, stop_fn=None) -> bool:
+    """Runs 'runs' in 'n_workers' processes with 'threads' threads and cores each. Running runs for which 'stop_fn(run)'
+    returns True are terminated early. Returns whether all runs finished or were stopped."""
+    from tud_rl.common.checkpoint import CHECKPOINT_FILE
+
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+
+    if n_workers * threads > len(cores):
+        logger.warning(f"{n_workers} workers with {threads} threads each oversubscribe the {len(cores)} available cores.")
+
+    # worker slot k is pinned to the cores k * threads, ..., (k + 1) * threads - 1
+    slots = [[cores[(k * threads + j) % len(cores)] for j in range(threads)] for k in range(n_workers)]
+    free  = list(range(n_workers))
+
+    # spawned processes import numpy and torch after the thread limits are set
+    ctx = mp.get_context("spawn")
+    for var in THREAD_VARS:
+        os.environ[var] = str(threads)
+
+    pending = [run for run in runs if run.status == "pending"]
+    running = []
+    printed = 0.0
+
+    try:
+        while pending or running:
+
+            # start runs in free slots, unfinished runs resume from their checkpoint or start from scratch
+            while pending and free:
+                run = pending.pop(0)
+                run.slot = free.pop(0)
+                overrides = run.overrides
+
+                if os.path.isfile(f"{run.dir}/{CHECKPOINT_FILE}"):
+                    logger.warning(f"Resuming the unfinished run in '{run.dir}'.")
+                    overrides = {**overrides, "resume": run.dir}
+
+                elif os.path.isdir(run.dir):
+                    logger.warning(f"Restarting the unfinished run in '{run.dir}'.")
+                    shutil.rmtree(run.dir)
+                os.makedirs(os.path.dirname(run.dir), exist_ok=True)
+
+                run.proc = ctx.Process(target=_train, args=(run.config_file, run.agent_name, run.seed, run.dir,
+                                                            slots[run.slot], threads, overrides))
+                run.proc.start()
+                run.status = "running"
+                running.append(run)
+
+            # collect finished runs
+            for run in [run for run in running if run.proc.exitcode is not None]:
+                running.remove(run)
+                free.append(run.slot)
+                run.status = "done" if run.proc.exitcode == 0 else "failed"
+
+                if run.status == "failed":
+                    logger.error(f"Run failed, see '{run.dir}.log'.")
+
+            # early stopping, marked so that the run is not restarted
+            if stop_fn is not None:
+                for run in [run for run in running if stop_fn(run)]:
+                    run.proc.terminate()
+                    run.proc.join()
+                    running.remove(run)
+                    free.append(run.slot)
+                    run.status = "stopped"
+                    open(f"{run.dir}/stopped", "w").close()
+
+            if time.time() - printed >= interval or not (pending or running):
+                print_table(runs)
+                printed = time.time()
+
+            time.sleep(0.5)
+    finally:
+        for run in running:
+            run.proc.terminate()
+            run.proc.join()
+            run.status = "failed"
+
+    return all(run.status in ["done", "stopped"] for run in runs)
+
+
+def main():
+    from tud_rl.agents import validate_agent
+
+    parser = ArgumentParser()
+
+    parser.add_argument(
+        "-c", "--config_files", type=str, nargs="+", required=True,
+        help="Configuration files, names in the config folders or paths.")
+
+    parser.add_argument(
+        "-a", "--agent_names", type=str, nargs="+", required=True,
+        help="Agents from the configs. Example: `DQN KEBootDQN_b`.")
+
+    parser.add_argument(
+        "-s", "--seeds", type=int, nargs="+", required=True,
+        help="Random number generator seeds.")
+
+    parser.add_argument(
+        "-n", "--threads", type=int, default=1,
+        help="Cores and torch/BLAS threads per run.")
+
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="Number of concurrent runs. Defaults to the number of available cores divided by `threads`.")
+
+    parser.add_argument(
+        "-o", "--out", type=str, default="experiments",
+        help="Root folder of the runs.")
+
+    parser.add_argument(
+        "-i", "--interval", type=float, default=60.0,
+        help="Seconds between two progress tables.")
+
+    parser.add_argument(
+        "--status", action="store_true",
+        help="Only print the progress table of the runs.")
+
+    args = parser.parse_args()
+
+    for agent_name in args.agent_names:
+        validate_agent(base_name(agent_name))
+
+    runs = [Run(config_file, agent_name, seed, args.out)
+            for config_file in args.config_files for agent_name in args.agent_names for seed in args.seeds]
+
+    if args.status:
+        print_table(runs)
+        return
+
+    n_cores   = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    n_workers = args.workers or max(1, n_cores // args.threads)
+
+    if not launch(runs, n_workers=n_workers, threads=args.threads, interval=args.interval):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Evaluation of the policy in a process pool, off the critical path of training. At the end of an epoch, the weights are
+copied and the 'eval_episodes' are spread over 'eval_workers' worker processes, each holding its own test env and agent.
+Training continues meanwhile. Finished evaluations are logged in the order of their epochs, together with the training
+statistics of the respective epoch, and the evaluated weights are the ones saved as (best) weights.
+"""
+import copy
+import multiprocessing as mp
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+from tud_rl.agents.base import _Agent
+from tud_rl.common.configparser import ConfigFile
+from tud_rl.common.vec_env import make_env
+from tud_rl.run.train_distributed import acting_config, acting_net
+
+# test env, agent and evaluation function of a worker process
+_worker = {}
+
+
+def snapshot_weights(agent: _Agent) -> dict:
+    """CPU copies of the state dicts of the nets stored by save_weights(), keyed by their infix in the file names."""
+    nets = {"": agent.DQN} if hasattr(agent, "DQN") else {"_actor": agent.actor, "_critic": agent.critic}
+    return {key: {k: v.detach().cpu().clone() for k, v in net.state_dict().items()} for key, net in nets.items()}
+
+
+def _init_worker(c: ConfigFile, agent_cls: type, agent_name: str, evaluate_fn) -> None:
+    torch.set_num_threads(1)
+    _worker["c"]           = c
+    _worker["env"]         = make_env(c.Env.name, c.Env.env_kwargs, c.Env.wrappers, c.Env.wrapper_kwargs)
+    _worker["agent"]       = agent_cls(acting_config(c), agent_name)
+    _worker["evaluate_fn"] = evaluate_fn
+
+
+def _evaluate(weights: dict, n_episodes: int, seed: int) -> list:
+    """Runs 'n_episodes' evaluation episodes with the acting net set to 'weights'."""
+    np.random.seed(seed)
+    random.seed(seed)
+    torch.manual_seed(seed)
+    _worker["env"].seed(seed)
+
+    acting_net(_worker["agent"]).load_state_dict(weights)
+
+    c = copy.copy(_worker["c"])
+    c.eval_episodes = n_episodes
+    return _worker["evaluate_fn"](test_env=_worker["env"], agent=_worker["agent"], c=c)
+
+
+class AsyncEvaluator:
+    """Evaluates weight snapshots of 'agent' in 'n_workers' processes with 'evaluate_fn' (evaluate_policy() of the training
+    script). 'log_fn' is called as log_fn(c, agent, eval_ret, epoch, total_steps, runtime, weights) for each finished
+    evaluation, with the logger holding the training statistics of that epoch."""
+
+    def __init__(self, c: ConfigFile, agent: _Agent, agent_cls: type, n_workers: int, evaluate_fn, log_fn):
+        self.c         = c
+        self.agent     = agent
+        self.n_workers = n_workers
+        self.log_fn    = log_fn
+        self.pending   = deque()
+        self.pool      = ProcessPoolExecutor(max_workers=n_workers, mp_context=mp.get_context(), initializer=_init_worker,
+                                             initargs=(c, agent_cls, agent.name, evaluate_fn))
+
+    def submit(self, epoch: int, total_steps: int, runtime: float) -> None:
+        """Starts the evaluation of the current weights. The episodes of an epoch use seeds derived from 'seed' and 'epoch'."""
+        weights = snapshot_weights(self.agent)
+
+        # the training statistics of this epoch are logged together with its evaluation
+        stats = self.agent.logger.epoch_dict
+        self.agent.logger.epoch_dict = dict()
+
+        self._start(stats, weights, epoch, total_steps, runtime)
+
+    def _start(self, stats: dict, weights: dict, epoch: int, total_steps: int, runtime: float) -> None:
+        acting     = weights["" if "" in weights else "_actor"]
+        n_episodes = [len(x) for x in np.array_split(np.arange(self.c.eval_episodes), self.n_workers)]
+        futures    = [self.pool.submit(_evaluate, acting, n, self.c.seed + 1 + epoch * self.n_workers + i)
+                      for i, n in enumerate(n_episodes) if n > 0]
+
+        self.pending.append((futures, stats, weights, epoch, total_steps, runtime))
+
+    def state(self) -> list:
+        """The evaluations which are not logged yet as list of (stats, weights, epoch, total_steps, runtime), stored with
+        the training state so that a resumed run can evaluate them again."""
+        return [(stats, weights, epoch, total_steps, runtime) for _, stats, weights, epoch, total_steps, runtime in self.pending]
+
+    def resubmit(self, evaluations: list) -> None:
+        """Starts the evaluations returned by state()."""
+        for evaluation in evaluations:
+            self._start(*evaluation)
+
+    def poll(self, wait: bool = False) -> None:
+        """Logs the finished evaluations, in order of their epochs. Waits for all of them if 'wait'."""
+        while self.pending and (wait or all(f.done() for f in self.pending[0][0])):
+            futures, stats, weights, epoch, total_steps, runtime = self.pending.popleft()
+            eval_ret = [ret for f in futures for ret in f.result()]
+
+            current = self.agent.logger.epoch_dict
+            self.agent.logger.epoch_dict = stats
+            self.log_fn(self.c, self.agent, eval_ret, epoch, total_steps, runtime, weights)
+            self.agent.logger.epoch_dict = current
+
+    def close(self) -> None:
+        """Logs the remaining evaluations and shuts the pool down."""
+        self.poll(wait=True)
+        self.pool.shutdown()
+
+
+def resume_evaluations(c: ConfigFile, agent: _Agent, agent_cls: type, evaluations: list, evaluate_fn, log_fn) -> None:
+    """Evaluates the 'evaluations' which were pending at the checkpoint of an interrupted run and whose epochs are not in
+    its 'progress.txt'. They are resubmitted to the evaluator of the agent, or evaluated in a temporary pool before training
+    continues if the resumed run evaluates synchronously."""
+    logged      = set(agent.logger.history.get("Epoch", []))
+    evaluations = [evaluation for evaluation in evaluations if evaluation[2] not in logged]
+    if not evaluations:
+        return
+
+    evaluator = agent.evaluator or AsyncEvaluator(c, agent, agent_cls, 1, evaluate_fn=evaluate_fn, log_fn=log_fn)
+    evaluator.resubmit(evaluations)
+
+    if evaluator is not agent.evaluator:
+        evaluator.close()
@@ -1,21 +1,27 @@
-import csv
-import pickle
 import random
 import shutil
 import time
 
 import gym
 import numpy as np
-import pandas as pd
 import torch
 
 import tud_rl.agents.discrete as agents
 from tud_rl import logger
 from tud_rl.agents._discrete.BootDQN import BootDQNAgent
 from tud_rl.agents.base import _Agent
+from tud_rl.common.buffer import PrefetchSampler
+from tud_rl.common.buffer_checkpoint import BufferCheckpointer, load_prior_buffer
+from tud_rl.common.checkpoint import (load_checkpoint, read_checkpoint, restore_buffer, save_checkpoint,
+                                      set_aside_memmap, store_buffer, truncate_progress)
 from tud_rl.common.configparser import ConfigFile
+from tud_rl.common.history import HistoryTracker
 from tud_rl.common.logging_func import EpochLogger
-from tud_rl.common.logging_plot import plot_from_progress
+from tud_rl.common.logging_plot import ProgressPlotter
+from tud_rl.common.timing import PhaseTimer
+from tud_rl.common.vec_env import SubprocVecEnv
+from tud_rl.run.async_eval import AsyncEvaluator, resume_evaluations, snapshot_weights
+from tud_rl.run.train_distributed import EPISODE_CHUNK_LENGTH, train_distributed
 from tud_rl.wrappers import get_wrapper
 
 
@@ -26,13 +32,17 @@ def evaluate_policy(test_env: gym.Env, agent: _Agent, c: ConfigFile):
 
     rets = []
 
+    # LSTM: init history
+    if agent.needs_history:
+        s_hist = HistoryTracker(agent.history_length, agent.state_shape)
+        a_hist = HistoryTracker(agent.history_length, 1, dtype=np.int64)
+
     for _ in range(c.eval_episodes):
 
-        # LSTM: init history
+        # LSTM: reset history
         if agent.needs_history:
-            s_hist = np.zeros((agent.history_length, agent.state_shape))
-            a_hist = np.zeros((agent.history_length, 1), dtype=np.int64)
-            hist_len = 0
+            s_hist.reset()
+            a_hist.reset()
 
         # get initial state
         s = test_env.reset()
@@ -47,7 +57,7 @@ def evaluate_policy(test_env: gym.Env, agent: _Agent, c: ConfigFile):
 
             # select action
             if agent.needs_history:
-                a = agent.select_action(s=s, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len)
+                a = agent.select_action(s=s, s_hist=s_hist.view(), a_hist=a_hist.view(), hist_len=s_hist.hist_len)
             else:
                 a = agent.select_action(s)
 
@@ -56,16 +66,8 @@ def evaluate_policy(test_env: gym.Env, agent: _Agent, c: ConfigFile):
 
             # LSTM: update history
             if agent.needs_history:
-                if hist_len == agent.history_length:
-                    s_hist = np.roll(s_hist, shift=-1, axis=0)
-                    s_hist[agent.history_length - 1, :] = s
-
-                    a_hist = np.roll(a_hist, shift=-1, axis=0)
-                    a_hist[agent.history_length - 1, :] = a
-                else:
-                    s_hist[hist_len] = s
-                    a_hist[hist_len] = a
-                    hist_len += 1
+                s_hist.push(s)
+                a_hist.push(a)
 
             # s becomes s2
             s = s2
@@ -122,22 +124,59 @@ def train(c: ConfigFile, agent_name: str):
     else:
         agent_name_red = agent_name + "Agent"
 
+    # continue an interrupted run in its directory, epochs after the last checkpoint are logged again
+    resume = getattr(c, "resume", None)
+    if resume is not None:
+        c.output_dir = resume
+        ckpt = read_checkpoint(resume)
+        truncate_progress(resume, ckpt["epoch"])
+
+    # initialize logging
+    epoch_logger = EpochLogger(alg_str    = agent_name,
+                               seed       = c.seed,
+                               env_str    = c.Env.name,
+                               info       = c.Env.info,
+                               output_dir = c.output_dir if hasattr(c, "output_dir") else None,
+                               resume     = resume is not None)
+
+    # memory-mapped replay buffers are placed in the run directory unless specified otherwise
+    if getattr(c, "buffer_storage", "numpy") == "memmap":
+        if getattr(c, "buffer_dir", None) is None:
+            c.buffer_dir = f"{epoch_logger.output_dir}/buffer"
+        if resume is not None:
+            set_aside_memmap(c.buffer_dir)
+
     # init agent
     agent_ = getattr(agents, agent_name_red)  # get agent class by name
     agent: _Agent = agent_(c, agent_name)  # instantiate agent
+    agent.logger = epoch_logger
+
+    # plot 'progress.txt' in a background process
+    agent.plotter = ProgressPlotter(dir=epoch_logger.output_dir, alg=agent.name, env_str=c.Env.name, info=c.Env.info,
+                                    history=epoch_logger.history)
 
     # possibly load replay buffer for continued training
-    if hasattr(c, "prior_buffer"):
+    if hasattr(c, "prior_buffer") and resume is None:
         if c.prior_buffer is not None:
-            with open(c.prior_buffer, "rb") as f:
-                agent.replay_buffer = pickle.load(f)
-
-    # initialize logging
-    agent.logger = EpochLogger(alg_str    = agent.name,
-                               seed       = c.seed,
-                               env_str    = c.Env.name,
-                               info       = c.Env.info,
-                               output_dir = c.output_dir if hasattr(c, "output_dir") else None)
+            agent.replay_buffer = load_prior_buffer(agent.replay_buffer, c.prior_buffer)
+
+    # incremental replay buffer checkpoints, memory-mapped buffers are flushed instead
+    if agent.buffer_ckpt == "incremental" and agent.buffer_storage != "memmap":
+        agent.buffer_checkpointer = BufferCheckpointer(agent.replay_buffer, f"{agent.logger.output_dir}/buffer_ckpt")
+
+    # restore replay buffer, agent state and random number generators of the interrupted run
+    start_step = 0
+    if resume is not None:
+        restore_buffer(agent)
+        start_step = load_checkpoint(agent, ckpt)
+        start_time = time.time() - ckpt["runtime"]
+        env.seed(c.seed + start_step)
+        test_env.seed(c.seed + start_step)
+        logger.info(f"Resuming {resume} at epoch {ckpt['epoch']}, timestep {start_step}.")
+
+    # sample batches in a background thread
+    if agent.prefetch_batches > 0:
+        agent.replay_buffer = PrefetchSampler(agent.replay_buffer, agent.prefetch_batches)
 
     agent.logger.save_config({"agent_name": agent.name, **c.config_dict})
     agent.print_params(agent.n_params, case=0)
@@ -151,11 +190,35 @@ def train(c: ConfigFile, agent_name: str):
             f"Could not find the env file. Make sure that the file name matches the class name. Skipping..."
         )
 
+    # evaluation in worker processes while training continues
+    if agent.eval_workers > 0:
+        assert not agent.is_multi, "Asynchronous evaluation is currently not available for multi-agent problems."
+        agent.evaluator = AsyncEvaluator(c, agent, agent_, agent.eval_workers, evaluate_fn=evaluate_policy, log_fn=log_epoch)
+
+    # evaluations which were pending at the checkpoint of the interrupted run
+    if resume is not None and ckpt.get("evaluations"):
+        resume_evaluations(c, agent, agent_, ckpt["evaluations"], evaluate_fn=evaluate_policy, log_fn=log_epoch)
+
+    # wall time of the training phases, a resumed run keeps the columns of its 'progress.txt'
+    if agent.logger.log_headers:
+        agent.phase_timing = "Steps_per_s" in agent.logger.log_headers
+
+    agent.timer = PhaseTimer(agent.phase_timing, start_step)
+    if agent.phase_timing:
+        agent.timer.instrument(agent)
+
+    # vectorized envs
+    if agent.n_envs > 1:
+        return train_vec(c, agent, env, test_env, start_time, start_step)
+
+    # asynchronous actor processes
+    if agent.n_actors > 0:
+        return train_distributed(c, agent, agent_, test_env, start_time, end_of_epoch, start_step)
+
     # LSTM: init history
     if agent.needs_history:
-        s_hist = np.zeros((agent.history_length, agent.state_shape))
-        a_hist = np.zeros((agent.history_length, 1), dtype=np.int64)
-        hist_len = 0
+        s_hist = HistoryTracker(agent.history_length, agent.state_shape)
+        a_hist = HistoryTracker(agent.history_length, 1, dtype=np.int64)
 
     # get initial state
     s = env.reset()
@@ -165,24 +228,26 @@ def train(c: ConfigFile, agent_name: str):
     epi_ret = np.zeros((agent.N_agents, 1)) if agent.is_multi else 0.0
 
     # main loop
-    for total_steps in range(c.timesteps):
+    for total_steps in range(start_step, c.timesteps):
 
         epi_steps += 1
 
         # select action
-        if total_steps < c.act_start_step:
-            if agent.is_multi:
-                a = np.random.randint(low=0, high=agent.num_actions, size=agent.N_agents, dtype=int)
-            else:
-                a = np.random.randint(low=0, high=agent.num_actions, size=1, dtype=int).item()
-        else:
-            if agent.needs_history:
-                a = agent.select_action(s=s, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len)
+        with agent.timer("act"):
+            if total_steps < c.act_start_step:
+                if agent.is_multi:
+                    a = np.random.randint(low=0, high=agent.num_actions, size=agent.N_agents, dtype=int)
+                else:
+                    a = np.random.randint(low=0, high=agent.num_actions, size=1, dtype=int).item()
             else:
-                a = agent.select_action(s)
+                if agent.needs_history:
+                    a = agent.select_action(s=s, s_hist=s_hist.view(), a_hist=a_hist.view(), hist_len=s_hist.hist_len)
+                else:
+                    a = agent.select_action(s)
 
         # perform step
-        s2, r, d, _ = env.step(a)
+        with agent.timer("env_step"):
+            s2, r, d, _ = env.step(a)
 
         # Ignore "done" if it comes from hitting the time horizon of the environment
         d = False if epi_steps == c.Env.max_episode_steps else d
@@ -191,24 +256,18 @@ def train(c: ConfigFile, agent_name: str):
         epi_ret += r
 
         # memorize
-        agent.memorize(s, a, r, s2, d)
+        with agent.timer("memorize"):
+            agent.memorize(s, a, r, s2, d)
 
         # LSTM: update history
         if agent.needs_history:
-            if hist_len == agent.history_length:
-                s_hist = np.roll(s_hist, shift=-1, axis=0)
-                s_hist[agent.history_length - 1, :] = s
-
-                a_hist = np.roll(a_hist, shift=-1, axis=0)
-                a_hist[agent.history_length - 1, :] = a
-            else:
-                s_hist[hist_len] = s
-                a_hist[hist_len] = a
-                hist_len += 1
+            s_hist.push(s)
+            a_hist.push(a)
 
         # train
         if (total_steps >= c.upd_start_step) and (total_steps % c.upd_every == 0):
-            agent.train()
+            with agent.timer("update"):
+                agent.train()
 
         # s becomes s2
         s = s2
@@ -222,9 +281,8 @@ def train(c: ConfigFile, agent_name: str):
 
             # LSTM: reset history
             if agent.needs_history:
-                s_hist = np.zeros((agent.history_length, agent.state_shape))
-                a_hist = np.zeros((agent.history_length, 1), dtype=np.int64)
-                hist_len = 0
+                s_hist.reset()
+                a_hist.reset()
 
             # reset to initial state
             s = env.reset()
@@ -240,89 +298,220 @@ def train(c: ConfigFile, agent_name: str):
             epi_steps = 0
             epi_ret = np.zeros((agent.N_agents, 1)) if agent.is_multi else 0.0
 
+        # log finished asynchronous evaluations
+        if agent.evaluator is not None:
+            agent.evaluator.poll()
+
         # end of epoch handling
         if (total_steps + 1) % c.epoch_length == 0 and (total_steps + 1) > c.upd_start_step:
+            end_of_epoch(c, agent, test_env, epoch=(total_steps + 1) // c.epoch_length, total_steps=total_steps,
+                         start_time=start_time)
+
+    if agent.evaluator is not None:
+        agent.evaluator.close()
+
 
-            epoch = (total_steps + 1) // c.epoch_length
+def train_vec(c: ConfigFile, agent: _Agent, env: gym.Env, test_env: gym.Env, start_time: float, start_step: int = 0):
+    """Training loop for 'n_envs' > 1: the env copies are stepped in worker processes and actions are selected for all of
+    them in one forward pass. Episode bookkeeping and histories are kept per env. 'env' only provides the spaces.
+    Training starts at 'start_step' when resuming."""
+    N = agent.n_envs
 
-            # evaluate agent with deterministic policy
+    assert not agent.is_multi, "Vectorized envs are currently not available for multi-agent problems."
+
+    vec_env = SubprocVecEnv.from_config(c, N, env.observation_space, env.action_space, seed=c.seed + start_step)
+
+    # LSTM: init histories
+    if agent.needs_history:
+        s_hist = HistoryTracker(agent.history_length, agent.state_shape, n_envs=N)
+        a_hist = HistoryTracker(agent.history_length, 1, n_envs=N, dtype=np.int64)
+
+    # buffers relying on consecutive transitions (histories, n-step returns, compact storage) receive whole episodes,
+    # or segments of EPISODE_CHUNK_LENGTH transitions of longer ones
+    per_episode = agent.needs_history or agent.n_steps > 1 or agent.buffer_compact
+    episodes = [[] for _ in range(N)]
+
+    # get initial states
+    s = vec_env.reset()
+
+    # init episode step counters and episode returns
+    epi_steps = np.zeros(N, dtype=np.int64)
+    epi_ret = np.zeros(N)
+
+    try:
+        # main loop, each iteration performs one step in every env
+        for total_steps in range(start_step, c.timesteps, N):
+
+            epi_steps += 1
+
+            # select actions
+            with agent.timer("act"):
+                if total_steps < c.act_start_step:
+                    a = np.random.randint(low=0, high=agent.num_actions, size=N, dtype=int)
+                else:
+                    if agent.needs_history:
+                        a = agent.select_actions(s=s, s_hist=s_hist.batch(), a_hist=a_hist.batch(), hist_len=s_hist.hist_len)
+                    else:
+                        a = agent.select_actions(s)
+
+            # perform steps, envs whose episode ended are reset by the workers
+            with agent.timer("env_step"):
+                s2, r, d, s_next = vec_env.step(a)
+
+            # an episode ends with 'done' or at the time horizon, "done" is ignored if it comes from the latter
+            ended = d | (epi_steps == c.Env.max_episode_steps)
+            d = d & (epi_steps != c.Env.max_episode_steps)
+
+            # add epi rets
+            epi_ret += r
+
+            # memorize
+            with agent.timer("memorize"):
+                if per_episode:
+                    for i in range(N):
+                        episodes[i].append((s[i], a[i], r[i], s2[i], d[i]))
+
+                    full = np.array([len(episode) == EPISODE_CHUNK_LENGTH for episode in episodes])
+
+                    for i in np.flatnonzero(ended | full):
+                        agent.memorize_batch(*[np.array(x) for x in zip(*episodes[i])])
+                        episodes[i] = []
+                else:
+                    agent.memorize_batch(s, a, r, s2, d)
+
+            # LSTM: update histories
+            if agent.needs_history:
+                s_hist.push(s)
+                a_hist.push(a)
+
+            # train as often as the single-env loop would during these N steps, once the buffer can be sampled
+            ready = agent.replay_buffer.size >= agent.batch_size + getattr(agent, "history_length", 0)
+
+            for step in range(total_steps, total_steps + N):
+                if (step >= c.upd_start_step) and (step % c.upd_every == 0) and ready:
+                    with agent.timer("update"):
+                        agent.train()
+
+            # s becomes s_next
+            s = s_next
+
+            # end of episode handling
+            for i in np.flatnonzero(ended):
+
+                # reset active head for BootDQN and its modifications
+                if isinstance(agent, BootDQNAgent):
+                    agent.reset_active_head(i)
+
+                # LSTM: reset history
+                if agent.needs_history:
+                    s_hist.reset(i)
+                    a_hist.reset(i)
+
+                # log episode return
+                agent.logger.store(Epi_Ret=epi_ret[i])
+
+                # reset epi steps and epi ret
+                epi_steps[i] = 0
+                epi_ret[i] = 0.0
+
+            # log finished asynchronous evaluations
+            if agent.evaluator is not None:
+                agent.evaluator.poll()
+
+            # end of epoch handling
+            steps_done = total_steps + N
+            if steps_done // c.epoch_length > total_steps // c.epoch_length and steps_done > c.upd_start_step:
+                end_of_epoch(c, agent, test_env, epoch=steps_done // c.epoch_length, total_steps=steps_done - 1,
+                             start_time=start_time)
+
+        if agent.evaluator is not None:
+            agent.evaluator.close()
+    finally:
+        vec_env.close()
+
+
+def end_of_epoch(c: ConfigFile, agent: _Agent, test_env: gym.Env, epoch: int, total_steps: int, start_time: float) -> None:
+    """Evaluates the agent with deterministic policy, logs the epoch and saves weights, replay buffer and training state.
+    With an asynchronous evaluator, the evaluation is only started and the epoch is logged once it has finished."""
+    runtime = time.time() - start_time
+
+    # wall time of the training phases during this epoch
+    if agent.timer.enabled:
+        agent.logger.store(**agent.timer.report(total_steps + 1))
+
+    if agent.evaluator is not None:
+        with agent.timer("eval"):
+            agent.evaluator.submit(epoch=epoch, total_steps=total_steps, runtime=runtime)
+    else:
+        # evaluate agent with deterministic policy
+        with agent.timer("eval"):
             eval_ret = evaluate_policy(test_env=test_env, agent=agent, c=c)
+        log_epoch(c, agent, eval_ret, epoch=epoch, total_steps=total_steps, runtime=runtime)
+
+    # stores the replay buffer and the training state to resume from
+    with agent.timer("checkpoint"):
+        store_buffer(agent)
+        if agent.state_ckpt:
+            save_checkpoint(agent, epoch, total_steps + 1, runtime)
+
+
+def log_epoch(c: ConfigFile, agent: _Agent, eval_ret, epoch: int, total_steps: int, runtime: float, weights=None) -> None:
+    """Logs the evaluation returns and training statistics of an epoch and saves weights. 'weights' are the evaluated
+    weights as returned by snapshot_weights(), defaults to the current weights of the agent."""
 
-            if agent.is_multi:
-                for ret_list in eval_ret:
-                    for i in range(agent.N_agents):
-                        agent.logger.store(**{f"Eval_ret_{i}" : ret_list[i].item()})
-            else:
-                for ret in eval_ret:
-                    agent.logger.store(Eval_ret=ret)
-
-            # log and dump tabular
-            agent.logger.log_tabular("Epoch", epoch)
-            agent.logger.log_tabular("Timestep", total_steps)
-            agent.logger.log_tabular("Runtime_in_h", (time.time() - start_time) / 3600)
-            
-            if agent.is_multi:
-                for i in range(agent.N_agents):
-                    agent.logger.log_tabular(f"Epi_Ret_{i}", with_min_and_max=True)
-                    agent.logger.log_tabular(f"Eval_ret_{i}", with_min_and_max=True)
-                    agent.logger.log_tabular(f"Q_val_{i}", average_only=True)
-                    agent.logger.log_tabular(f"Critic_loss_{i}", average_only=True)
-                    agent.logger.log_tabular(f"Actor_loss_{i}", average_only=True)
-            else:
-                agent.logger.log_tabular("Epi_Ret", with_min_and_max=True)
-                agent.logger.log_tabular("Eval_ret", with_min_and_max=True)
-                agent.logger.log_tabular("Q_val", with_min_and_max=True)
-                agent.logger.log_tabular("Loss", average_only=True)
-
-            agent.logger.dump_tabular()
-
-            # create evaluation plot based on current 'progress.txt'
-            plot_from_progress(dir     = agent.logger.output_dir,
-                               alg     = agent.name,
-                               env_str = c.Env.name,
-                               info    = c.Env.info)
-            # save weights
-            save_weights(agent, eval_ret)
-
-def save_weights(agent: _Agent, eval_ret) -> None:
-
-    # check whether this was the best evaluation epoch so far
-    with open(f"{agent.logger.output_dir}/progress.txt") as f:
-        reader = csv.reader(f, delimiter="\t")
-        d = list(reader)
-
-    df = pd.DataFrame(d)
-    df.columns = df.iloc[0]
-    df = df.iloc[1:]
-    df = df.astype(float)
-
-    # no best-weight-saving for multi-agent problems since the definition of best weights is not straightforward anymore
     if agent.is_multi:
-        best_weights = False
-    elif len(df["Avg_Eval_ret"]) == 1:
-        best_weights = True
+        for ret_list in eval_ret:
+            for i in range(agent.N_agents):
+                agent.logger.store(**{f"Eval_ret_{i}" : ret_list[i].item()})
     else:
-        if np.mean(eval_ret) > max(df["Avg_Eval_ret"][:-1]):
-            best_weights = True
-        else:
-            best_weights = False
+        for ret in eval_ret:
+            agent.logger.store(Eval_ret=ret)
 
-    # save net
-    if hasattr(agent, "DQN"):
-        torch.save(agent.DQN.state_dict(),
-                    f"{agent.logger.output_dir}/{agent.name}_weights.pth")
+    # log and dump tabular
+    agent.logger.log_tabular("Epoch", epoch)
+    agent.logger.log_tabular("Timestep", total_steps)
+    agent.logger.log_tabular("Runtime_in_h", runtime / 3600)
 
-        if best_weights:
-            torch.save(agent.DQN.state_dict(),
-                        f"{agent.logger.output_dir}/{agent.name}_best_weights.pth")
+    if agent.is_multi:
+        for i in range(agent.N_agents):
+            agent.logger.log_tabular(f"Epi_Ret_{i}", with_min_and_max=True)
+            agent.logger.log_tabular(f"Eval_ret_{i}", with_min_and_max=True)
+            agent.logger.log_tabular(f"Q_val_{i}", average_only=True)
+            agent.logger.log_tabular(f"Critic_loss_{i}", average_only=True)
+            agent.logger.log_tabular(f"Actor_loss_{i}", average_only=True)
     else:
-        torch.save(agent.actor.state_dict(), f"{agent.logger.output_dir}/{agent.name}_actor_weights.pth")
-        torch.save(agent.critic.state_dict(), f"{agent.logger.output_dir}/{agent.name}_critic_weights.pth")
+        agent.logger.log_tabular("Epi_Ret", with_min_and_max=True)
+        agent.logger.log_tabular("Eval_ret", with_min_and_max=True)
+        agent.logger.log_tabular("Q_val", with_min_and_max=True)
+        agent.logger.log_tabular("Loss", average_only=True)
+
+    # wall time of the training phases
+    for key in agent.timer.keys():
+        agent.logger.log_tabular(key, average_only=True)
+
+    with agent.timer("log"):
+        agent.logger.dump_tabular()
+
+        # update evaluation plot
+        agent.plotter.append(agent.logger.last_row())
+
+    # save weights
+    with agent.timer("checkpoint"):
+        save_weights(agent, weights)
 
-        if best_weights:
-            torch.save(agent.actor.state_dict(), f"{agent.logger.output_dir}/{agent.name}_actor_best_weights.pth")
-            torch.save(agent.critic.state_dict(), f"{agent.logger.output_dir}/{agent.name}_critic_best_weights.pth")
 
-    # stores the replay buffer
-    with open(f"{agent.logger.output_dir}/buffer.pickle", "wb") as handle:
-        pickle.dump(agent.replay_buffer, handle)
+def save_weights(agent: _Agent, weights=None) -> None:
+
+    # check whether this was the best evaluation epoch so far, no best-weight-saving for multi-agent problems since the
+    # definition of best weights is not straightforward anymore
+    best_weights = not agent.is_multi and "Avg_Eval_ret" in agent.logger.improved
+
+    # save nets, i.e., the DQN or actor and critic
+    if weights is None:
+        weights = snapshot_weights(agent)
+
+    for key, state_dict in weights.items():
+        torch.save(state_dict, f"{agent.logger.output_dir}/{agent.name}{key}_weights.pth")
+
+        if best_weights:
+            torch.save(state_dict, f"{agent.logger.output_dir}/{agent.name}{key}_best_weights.pth")
@@ -0,0 +1,270 @@
+"""
+Asynchronous actor-learner training in the style of Ape-X (Horgan et al. 2018). Several actor processes act with local
+copies of the policy in their own envs and stream the collected transitions to the learner, i.e., the training process:
+
+    actors  -> learner    chunks of transitions and the returns of finished episodes via a bounded queue
+    learner -> actors     the weights of the acting net (DQN or actor) via shared memory every 'weight_sync_every' updates
+
+The learner owns the replay buffer and is the only process computing gradients. Since all updates are computed from
+replayed transitions, the lag between the learner's policy and the behaviour policies of the actors is unproblematic for
+the off-policy agents. Updates are limited to the ratio of one update per 'upd_every' env steps as in the sequential loop.
+"""
+import copy
+import multiprocessing as mp
+import queue as queue_lib
+import random
+
+import gym
+import numpy as np
+import torch
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+
+from tud_rl.agents.base import _Agent
+from tud_rl.common.configparser import ConfigFile
+from tud_rl.common.history import HistoryTracker
+from tud_rl.common.vec_env import make_env
+
+# transitions are sent in chunks of this length unless whole episodes are needed
+CHUNK_LENGTH = 50
+
+# episodes are stored in segments of at most this many consecutive transitions, e.g., without a time limit
+EPISODE_CHUNK_LENGTH = 1000
+
+
+def acting_net(agent: _Agent) -> torch.nn.Module:
+    """The net whose weights determine the behaviour policy."""
+    return agent.DQN if hasattr(agent, "DQN") else agent.actor
+
+
+class SharedWeights:
+    """Flat float32 copy of the parameters of a net in shared memory, written by the learner and read by the actors. The
+    version counter lets actors skip copying when nothing changed."""
+
+    def __init__(self, net: torch.nn.Module, ctx):
+        n = len(parameters_to_vector(net.parameters()))
+        self.raw     = ctx.RawArray("f", n)
+        self.version = ctx.Value("q", 0)
+        self.lock    = ctx.Lock()
+        self.push(net)
+
+    def push(self, net: torch.nn.Module) -> None:
+        with self.lock:
+            np.frombuffer(self.raw, dtype=np.float32)[:] = parameters_to_vector(net.parameters()).detach().cpu().numpy()
+            self.version.value += 1
+
+    def pull(self, net: torch.nn.Module, version: int) -> int:
+        """Loads the weights into 'net' if they are newer than 'version'. Returns the loaded version."""
+        if self.version.value == version:
+            return version
+
+        with self.lock:
+            vec     = torch.tensor(np.frombuffer(self.raw, dtype=np.float32).copy())
+            version = self.version.value
+
+        vector_to_parameters(vec.to(next(net.parameters()).device), net.parameters())
+        return version
+
+
+def acting_config(c: ConfigFile) -> ConfigFile:
+    """Config for the agents of the actors, which act on the cpu and need no replay buffer of their own."""
+    c = copy.copy(c)
+    c.device         = "cpu"
+    c.buffer_length  = 1
+    c.buffer_type    = "uniform"
+    c.buffer_storage = "numpy"
+    c.buffer_compact = False
+    return c
+
+
+def _put(q, item, stop) -> None:
+    """Blocking put, which gives up once training stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue_lib.Full:
+            pass
+
+
+def _actor(index, c, agent_cls, agent_name, n_actors, q, weights, stop, per_episode, start_step):
+    """Acts in a local env with the latest weights of the learner and sends the transitions, as in the sequential loop.
+    Schedules continue from 'start_step' env steps of all actors."""
+    torch.set_num_threads(1)
+    q.cancel_join_thread()
+
+    seed = c.seed + start_step + index
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+
+    env = make_env(c.Env.name, c.Env.env_kwargs, c.Env.wrappers, c.Env.wrapper_kwargs)
+    env.seed(seed)
+
+    agent   = agent_cls(acting_config(c), agent_name)
+    net     = acting_net(agent)
+    version = weights.pull(net, version=-1)
+    disc    = isinstance(env.action_space, gym.spaces.Discrete)
+
+    # epsilon schedules are defined in env steps of all actors
+    steps = start_step // n_actors
+    if hasattr(agent, "exploration"):
+        agent.exploration.eps_inc *= n_actors
+        agent.exploration.eps_t    = steps
+
+    # LSTM: init history
+    if agent.needs_history:
+        s_hist = HistoryTracker(agent.history_length, agent.state_shape)
+        a_hist = HistoryTracker(agent.history_length, 1 if disc else agent.num_actions, dtype=np.int64 if disc else np.float64)
+
+    s = env.reset()
+    epi_steps, epi_ret = 0, 0.0
+    chunk, rets = [], []
+
+    while not stop.is_set():
+
+        epi_steps += 1
+        steps += 1
+
+        # select action, random actions are spread over the actors
+        if steps * n_actors <= c.act_start_step:
+            a = np.random.randint(low=0, high=agent.num_actions) if disc else np.random.uniform(-1.0, 1.0, size=agent.num_actions)
+        else:
+            if agent.needs_history:
+                a = agent.select_action(s=s, s_hist=s_hist.view(), a_hist=a_hist.view(), hist_len=s_hist.hist_len)
+            else:
+                a = agent.select_action(s)
+
+        # perform step
+        if "UAM" in c.Env.name and agent.name == "LSTMRecTD3":
+            s2, r, d, _ = env.step(agent)
+        else:
+            s2, r, d, _ = env.step(a)
+
+        # Ignore "done" if it comes from hitting the time horizon of the environment
+        d = False if epi_steps == c.Env.max_episode_steps else d
+
+        epi_ret += r
+        chunk.append((s, a, r, s2, d))
+
+        # LSTM: update history
+        if agent.needs_history:
+            s_hist.push(s)
+            a_hist.push(a)
+
+        s = s2
+        ended = d or (epi_steps == c.Env.max_episode_steps)
+
+        # end of episode handling
+        if ended:
+            if hasattr(agent, "noise"):
+                agent.noise.reset()
+
+            if hasattr(agent, "reset_active_head"):
+                agent.reset_active_head()
+
+            if agent.needs_history:
+                s_hist.reset()
+                a_hist.reset()
+
+            s = env.reset()
+            rets.append(epi_ret)
+            epi_steps, epi_ret = 0, 0.0
+
+        # send transitions
+        if ended or len(chunk) == (EPISODE_CHUNK_LENGTH if per_episode else CHUNK_LENGTH):
+            _put(q, ([np.array(x) for x in zip(*chunk)], rets), stop)
+            chunk, rets = [], []
+
+        # fetch the latest weights
+        if steps % CHUNK_LENGTH == 0:
+            version = weights.pull(net, version)
+
+
+def train_distributed(c: ConfigFile, agent: _Agent, agent_cls: type, test_env: gym.Env, start_time: float, end_of_epoch,
+                      start_step: int = 0):
+    """Learner loop for 'n_actors' > 0. 'agent' is the learner, the actors build their own instances of 'agent_cls'.
+    'end_of_epoch' is the evaluation and logging function of the calling training script. Training starts at
+    'start_step' when resuming."""
+    n_actors = agent.n_actors
+
+    assert not agent.is_multi, "The actor-learner mode is currently not available for multi-agent problems."
+
+    ctx     = mp.get_context()
+    q       = ctx.Queue(maxsize=4 * n_actors)
+    stop    = ctx.Event()
+    net     = acting_net(agent)
+    weights = SharedWeights(net, ctx)
+
+    # buffers relying on consecutive transitions (histories, n-step returns, compact storage) receive whole episodes,
+    # or segments of EPISODE_CHUNK_LENGTH transitions of longer ones
+    per_episode = agent.needs_history or agent.n_steps > 1 or agent.buffer_compact
+
+    procs = [ctx.Process(target=_actor, args=(i, c, agent_cls, agent.name, n_actors, q, weights, stop, per_episode,
+                                              start_step), daemon=True) for i in range(n_actors)]
+    for p in procs:
+        p.start()
+
+    # updates done before resuming follow the ratio of the sequential loop
+    total_steps = start_step
+    n_updates   = (start_step - c.upd_start_step - 1) // c.upd_every + 1 if start_step > c.upd_start_step else 0
+
+    try:
+        while total_steps < c.timesteps:
+
+            # updates due so far, at most one per 'upd_every' env steps after 'upd_start_step'
+            due = (total_steps - c.upd_start_step) // c.upd_every + 1 if total_steps >= c.upd_start_step else 0
+            ready = agent.replay_buffer.size >= agent.batch_size + getattr(agent, "history_length", 0)
+            train = n_updates < due and ready
+
+            # receive transitions, waiting only if there is nothing to train
+            try:
+                item = q.get_nowait() if train else q.get(timeout=1.0)
+            except queue_lib.Empty:
+                item = None
+                dead = [i for i, p in enumerate(procs) if not p.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Actor process {dead[0]} terminated with exit code {procs[dead[0]].exitcode}.")
+
+            if item is not None:
+                (s, a, r, s2, d), rets = item
+                with agent.timer("memorize"):
+                    agent.memorize_batch(s, a, r, s2, d)
+
+                for ret in rets:
+                    agent.logger.store(Epi_Ret=ret)
+
+                prev_steps = total_steps
+                total_steps += len(s)
+
+                # end of epoch handling
+                if total_steps // c.epoch_length > prev_steps // c.epoch_length and total_steps > c.upd_start_step:
+                    end_of_epoch(c, agent, test_env, epoch=total_steps // c.epoch_length, total_steps=total_steps - 1,
+                                 start_time=start_time)
+
+            # train and publish the weights to the actors
+            if train:
+                with agent.timer("update"):
+                    agent.train()
+                n_updates += 1
+
+                if n_updates % agent.weight_sync_every == 0:
+                    weights.push(net)
+
+            # log finished asynchronous evaluations
+            if agent.evaluator is not None:
+                agent.evaluator.poll()
+
+        if agent.evaluator is not None:
+            agent.evaluator.close()
+    finally:
+        stop.set()
+
+        # drain the queue so that no actor blocks on a full queue
+        while any(p.is_alive() for p in procs):
+            try:
+                while True:
+                    q.get_nowait()
+            except queue_lib.Empty:
+                pass
+            for p in procs:
+                p.join(timeout=0.1)
@@ -7,18 +7,23 @@ import torch
 import tud_rl.agents.discrete as agents
 from tud_rl.agents.base import _Agent
 from tud_rl.common.configparser import ConfigFile
+from tud_rl.common.history import HistoryTracker
 from tud_rl.wrappers import get_wrapper
 
 
 def visualize_policy(env: gym.Env, agent: _Agent, c: ConfigFile):
 
+    # LSTM: init history
+    if agent.needs_history:
+        s_hist = HistoryTracker(agent.history_length, agent.state_shape)
+        a_hist = HistoryTracker(agent.history_length, 1, dtype=np.int64)
+
     for _ in range(c.eval_episodes):
 
-        # LSTM: init history
+        # LSTM: reset history
         if agent.needs_history:
-            s_hist = np.zeros((agent.history_length, agent.state_shape))
-            a_hist = np.zeros((agent.history_length, 1), dtype=np.int64)
-            hist_len = 0
+            s_hist.reset()
+            a_hist.reset()
 
         # get initial state
         s = env.reset()
@@ -36,7 +41,7 @@ def visualize_policy(env: gym.Env, agent: _Agent, c: ConfigFile):
 
             # select action
             if agent.needs_history:
-                a = agent.select_action(s=s, s_hist=s_hist, a_hist=a_hist, hist_len=hist_len)
+                a = agent.select_action(s=s, s_hist=s_hist.view(), a_hist=a_hist.view(), hist_len=s_hist.hist_len)
             else:
                 a = agent.select_action(s)
 
@@ -45,16 +50,8 @@ def visualize_policy(env: gym.Env, agent: _Agent, c: ConfigFile):
 
             # LSTM: update history
             if agent.needs_history:
-                if hist_len == agent.history_length:
-                    s_hist = np.roll(s_hist, shift=-1, axis=0)
-                    s_hist[agent.history_length - 1, :] = s
-
-                    a_hist = np.roll(a_hist, shift=-1, axis=0)
-                    a_hist[agent.history_length - 1, :] = a
-                else:
-                    s_hist[hist_len] = s
-                    a_hist[hist_len] = a
-                    hist_len += 1
+                s_hist.push(s)
+                a_hist.push(a)
 
             # s becomes s2
             s = s2
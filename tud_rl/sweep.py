@@ -0,0 +1,210 @@
+"""
+Hyperparameter sweeps on top of the launcher. A sweep is specified in a yaml file:
+
+    config: ski.yaml            # config file, name in the config folders or path
+    agent: TD3
+    seeds: [1]                  # each trial is trained once per seed
+    search: random              # 'grid' (all combinations of 'values') or 'random'
+    n_trials: 20                # number of sampled configurations for random search
+    sweep_seed: 0               # seed of the random search
+    params:
+      lr_actor: {low: 0.00001, high: 0.001, log: true}
+      tau: {values: [0.001, 0.005]}
+      batch_size: {values: [32, 64, 128]}
+      history_length: {low: 2, high: 10, int: true}   # entries of the agent's section are overwritten there
+    asha:                       # optional early stopping, omit to train all trials fully
+      grace_epochs: 2
+      eta: 3
+
+Trials are trained in parallel with the launcher and written to '<out>/trial_<i>/seed_<seed>'. With 'asha', runs are
+stopped by asynchronous successive halving (Li et al. 2020) based on their 'Avg_Eval_ret' in 'progress.txt': whenever a
+run reaches a rung, i.e., the epochs grace_epochs * eta^k, it continues only if its evaluation return is in the top
+1 / eta of all returns recorded at that rung so far. The sampled trials are stored in '<out>/trials.yaml', so that an
+interrupted sweep can be continued with the same command. A summary ranked by the best evaluation return is written to
+'<out>/summary.csv'.
+
+Usage:
+    python -m tud_rl.sweep sweep.yaml -n 1 -w 4
+"""
+import csv
+import itertools
+import os
+import sys
+from argparse import ArgumentParser
+
+import numpy as np
+import yaml
+
+from tud_rl.common.configparser import ConfigFile
+from tud_rl.launch import Run, config_path, launch
+
+
+def sample_trials(spec: dict) -> list:
+    """Expands the search space of 'spec' into a list of config overrides."""
+    params = spec["params"]
+    search = spec.get("search", "grid")
+
+    assert search in ["grid", "random"], "Pick 'grid' or 'random' as search, please."
+
+    if search == "grid":
+        assert all("values" in p for p in params.values()), "Grid search needs 'values' for all params."
+        return [dict(zip(params.keys(), vals)) for vals in itertools.product(*[p["values"] for p in params.values()])]
+
+    rng = np.random.default_rng(spec.get("sweep_seed", 0))
+    trials = []
+
+    for _ in range(spec["n_trials"]):
+        trial = {}
+
+        for key, p in params.items():
+            if "values" in p:
+                val = p["values"][rng.integers(len(p["values"]))]
+            elif p.get("log", False):
+                val = float(np.exp(rng.uniform(np.log(p["low"]), np.log(p["high"]))))
+            else:
+                val = float(rng.uniform(p["low"], p["high"]))
+
+            trial[key] = int(round(val)) if p.get("int", False) else val
+        trials.append(trial)
+
+    return trials
+
+
+class ASHA:
+    """Asynchronous successive halving: a run reaching rung k (epoch grace_epochs * eta^k) is stopped if its evaluation
+    return is below the (1 - 1 / eta) quantile of the returns recorded at this rung, once at least 'eta' are recorded."""
+
+    def __init__(self, grace_epochs: int, eta: int, max_epochs: int):
+        assert grace_epochs >= 1, "'grace_epochs' must be a positive integer."
+        assert eta >= 2, "'eta' must be at least 2."
+
+        self.eta   = eta
+        self.rungs = []
+
+        rung = grace_epochs
+        while rung < max_epochs:
+            self.rungs.append(rung)
+            rung *= eta
+
+        # rung -> {run directory: evaluation return}
+        self.records = {rung: {} for rung in self.rungs}
+
+    def stop(self, run: Run) -> bool:
+        """Records the returns of 'run' at the rungs it reached and decides whether it is stopped."""
+        h = run.history()
+        if not h or "Avg_Eval_ret" not in h:
+            return False
+
+        for rung in self.rungs:
+            if run.dir in self.records[rung]:
+                continue
+
+            idx = np.flatnonzero(h["Epoch"] == rung)
+            if len(idx) == 0:
+                return False
+
+            ret = h["Avg_Eval_ret"][idx[0]]
+            rec = self.records[rung]
+            rec[run.dir] = ret
+
+            if len(rec) >= self.eta and ret < np.quantile(list(rec.values()), 1 - 1 / self.eta):
+                return True
+        return False
+
+
+def write_summary(path: str, runs: list, trials: list) -> None:
+    """Writes the params, status and returns of all runs to 'path', ranked by the best evaluation return."""
+    rows = []
+
+    for run, trial in zip(runs, trials):
+        p = run.progress()
+        rows.append({"trial": run.label, "seed": run.seed, **trial, "status": run.status, "epoch": p.get("Epoch"),
+                     "eval_ret": p.get("Eval_ret"), "best_ret": p.get("Best_ret")})
+
+    rows.sort(key=lambda row: -np.inf if row["best_ret"] is None else row["best_ret"], reverse=True)
+
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    best   = rows[0]
+    params = ", ".join(f"{key}={best[key]}" for key in trials[0])
+    print(f"Best run: {best['trial']} (seed {best['seed']}), best return {best['best_ret']}, {params}", flush=True)
+
+
+def main():
+    parser = ArgumentParser()
+
+    parser.add_argument(
+        "spec", type=str,
+        help="Sweep specification as `.yaml` file.")
+
+    parser.add_argument(
+        "-n", "--threads", type=int, default=1,
+        help="Cores and torch/BLAS threads per run.")
+
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="Number of concurrent runs. Defaults to the number of available cores divided by `threads`.")
+
+    parser.add_argument(
+        "-o", "--out", type=str, default=None,
+        help="Folder of the sweep. Defaults to `experiments/sweep_<spec name>`.")
+
+    parser.add_argument(
+        "-i", "--interval", type=float, default=60.0,
+        help="Seconds between two progress tables.")
+
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        spec = yaml.safe_load(f)
+
+    out = args.out or f"experiments/sweep_{os.path.splitext(os.path.basename(args.spec))[0]}"
+    os.makedirs(out, exist_ok=True)
+
+    # trials are sampled once, a continued sweep reuses them
+    trials_file = f"{out}/trials.yaml"
+    if os.path.isfile(trials_file):
+        with open(trials_file) as f:
+            trials = yaml.safe_load(f)
+    else:
+        trials = sample_trials(spec)
+        with open(trials_file, "w") as f:
+            yaml.safe_dump(trials, f)
+
+    config = ConfigFile(config_path(spec["config"], spec["agent"]))
+    seeds  = spec.get("seeds", [config.seed])
+
+    runs, run_trials = [], []
+    for i, trial in enumerate(trials):
+        for seed in seeds:
+            runs.append(Run(spec["config"], spec["agent"], seed, out, overrides=trial, dir=f"{out}/trial_{i}/seed_{seed}",
+                            label=f"trial_{i}"))
+            run_trials.append(trial)
+
+    stop_fn = None
+    if "asha" in spec:
+        timesteps  = max(run.timesteps for run in runs)
+        epoch_len  = min(run.overrides.get("epoch_length", config.epoch_length) for run in runs)
+        asha       = ASHA(spec["asha"].get("grace_epochs", 1), spec["asha"].get("eta", 3), timesteps // epoch_len)
+
+        # restore the rung records of a continued sweep
+        for run in runs:
+            if run.status != "pending":
+                asha.stop(run)
+        stop_fn = asha.stop
+
+    n_cores   = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    n_workers = args.workers or max(1, n_cores // args.threads)
+
+    ok = launch(runs, n_workers=n_workers, threads=args.threads, interval=args.interval, stop_fn=stop_fn)
+    write_summary(f"{out}/summary.csv", runs, run_trials)
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
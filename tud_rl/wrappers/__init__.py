@@ -1,5 +1,6 @@
 import tud_rl.wrappers.gym_POMDP_wrapper as gw
 import tud_rl.wrappers.MinAtar_wrapper as Min
+import tud_rl.wrappers.profiling_wrapper as pw
 
 
 def get_wrapper(*, name: str, **kwargs) -> type:
@@ -8,3 +9,5 @@ def get_wrapper(*, name: str, **kwargs) -> type:
         return Min.MinAtar_wrapper(**kwargs)
     elif "POMDP" in name:
         return gw.gym_POMDP_wrapper(**kwargs)
+    elif "Profiling" in name:
+        return pw.EnvProfiler(**kwargs)
@@ -0,0 +1,148 @@
+import time
+from collections import defaultdict
+
+import gym
+import numpy as np
+
+from tud_rl import logger
+
+# internal methods timed by default, keyed by the name of an env class in the method resolution order of the env;
+# 'attr.method' times 'method' of the object(s) in the env attribute 'attr', e.g., of every target ship in 'TSs'
+DEFAULT_METHODS = {
+    "HHOS_Base_Env" : ["sense_LiDAR", "_update_disturbances", "_set_state", "_calculate_reward", "_init_wps",
+                       "_handle_respawn", "TSs.river_control", "TSs.opensea_control"],
+    "MMG_Env"       : ["_set_COLREGs", "_get_CR", "_handle_respawn", "_set_state", "_calculate_reward"],
+    "UAM_Modular"   : ["_get_state", "_set_state", "_handle_respawn", "_calculate_reward"],
+}
+
+
+class EnvProfiler(gym.Wrapper):
+    """Times internal methods of the wrapped env during step(). The time of a method is summed over its calls within a
+    step and includes the methods it calls. The last 'window' steps are kept, and every step adds
+
+        info["profile"]     dict of method: seconds spent in this step, including the whole 'step'
+
+    to the info dict. At the end of an episode, info["profile_hist"] holds the histograms of the window, see
+    histograms(). report() summarizes the window and is logged when the env is closed.
+
+    Args:
+        methods (list): names of the methods to time, defaults to the DEFAULT_METHODS of the env class
+        window (int):   number of steps kept for the statistics
+        bins (int):     number of bins of the histograms
+    """
+    def __init__(self, env, methods=None, window=1000, bins=20):
+        super().__init__(env)
+
+        if methods is None:
+            classes = [cls.__name__ for cls in type(env.unwrapped).__mro__]
+            methods = next((DEFAULT_METHODS[name] for name in classes if name in DEFAULT_METHODS), [])
+            if not methods:
+                logger.warning(f"No default methods to profile for {type(env.unwrapped).__name__}, only 'step' is timed.")
+
+        self.methods = list(methods)
+        self.window  = window
+        self.bins    = bins
+        self.names   = ["step"] + self.methods
+
+        # ring buffer of per-step times and calls, one column per name
+        self.times = np.zeros((window, len(self.names)))
+        self.calls = np.zeros((window, len(self.names)), dtype=np.int64)
+        self.ptr   = 0
+        self.size  = 0
+
+        self._step_times = defaultdict(float)
+        self._step_calls = defaultdict(int)
+
+        # methods of the env are replaced on the instance, methods of member objects are patched every step since
+        # members such as target ships are respawned
+        env = self.env.unwrapped
+        self._members = []
+
+        for name in self.methods:
+            if "." in name:
+                self._members.append(tuple(name.split(".", 1)))
+            elif hasattr(env, name):
+                setattr(env, name, self._timed(name, getattr(env, name)))
+            else:
+                logger.warning(f"{type(env).__name__} has no method '{name}' to profile.")
+
+    def _timed(self, name, fn):
+        times, calls = self._step_times, self._step_calls
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                times[name] += time.perf_counter() - start
+                calls[name] += 1
+        timed._profiled = True
+        return timed
+
+    def _patch_members(self):
+        env = self.env.unwrapped
+
+        for attr, method in self._members:
+            objs = getattr(env, attr, [])
+            for obj in (objs if isinstance(objs, (list, tuple)) else [objs]):
+                fn = getattr(obj, method, None)
+                if fn is not None and not getattr(fn, "_profiled", False):
+                    setattr(obj, method, self._timed(f"{attr}.{method}", fn))
+
+    def step(self, action):
+        self._patch_members()
+        self._step_times.clear()
+        self._step_calls.clear()
+
+        start = time.perf_counter()
+        s2, r, d, info = self.env.step(action)
+        self._step_times["step"] = time.perf_counter() - start
+        self._step_calls["step"] = 1
+
+        self.times[self.ptr] = [self._step_times[name] for name in self.names]
+        self.calls[self.ptr] = [self._step_calls[name] for name in self.names]
+        self.ptr  = (self.ptr + 1) % self.window
+        self.size = min(self.size + 1, self.window)
+
+        info = dict(info) if info is not None else {}
+        info["profile"] = dict(zip(self.names, self.times[self.ptr - 1].tolist()))
+        if d:
+            info["profile_hist"] = self.histograms()
+        return s2, r, d, info
+
+    def histograms(self) -> dict:
+        """Histograms of the seconds per step of each method over the window, as dict of method: (counts, bin_edges)."""
+        return {name: np.histogram(self.times[:self.size, j], bins=self.bins) for j, name in enumerate(self.names)}
+
+    def summary(self) -> dict:
+        """Statistics of each method over the window: calls per step, mean, median, 95th percentile and maximum of the
+        milliseconds per step, and the share of the step time in percent."""
+        if self.size == 0:
+            return {}
+
+        times, calls = self.times[:self.size] * 1000, self.calls[:self.size]
+        step_total   = max(times[:, 0].sum(), 1e-12)
+        stats = {}
+
+        for j, name in enumerate(self.names):
+            t = times[:, j]
+            stats[name] = {"calls": calls[:, j].mean(), "mean_ms": t.mean(), "p50_ms": np.percentile(t, 50),
+                           "p95_ms": np.percentile(t, 95), "max_ms": t.max(), "share": 100 * t.sum() / step_total}
+        return stats
+
+    def report(self) -> str:
+        """The summary() as table."""
+        stats = self.summary()
+        width = max([len(name) for name in self.names] + [6])
+        lines = [f"Profile of {type(self.env.unwrapped).__name__} over the last {self.size} steps:",
+                 f"{'method':<{width}}  {'calls':>7}  {'mean ms':>9}  {'p50 ms':>9}  {'p95 ms':>9}  {'max ms':>9}  {'% step':>7}"]
+
+        for name, s in stats.items():
+            lines.append(f"{name:<{width}}  {s['calls']:>7.2f}  {s['mean_ms']:>9.4f}  {s['p50_ms']:>9.4f}  {s['p95_ms']:>9.4f}"
+                         f"  {s['max_ms']:>9.4f}  {s['share']:>7.2f}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self.size > 0:
+            logger.info(self.report())
+        return super().close()